@@ -0,0 +1,110 @@
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import bindparam, text
+
+# Outbox writes and reads used on the request path. Kept free of web3 so the API
+# can import them at startup; the worker that drains the outbox lives in anchor_worker.
+
+# Runs after the proof's INSERT_PROMPT in the same transaction and links the entry to that row:
+# the newest row with this hash that no outbox entry claims yet. Anchoring then only ever
+# touches its own row, never earlier proofs of the same text anchored under another root
+ENQUEUE_ANCHOR = text("""
+    INSERT INTO anchor_outbox (local_hash, prompt_id, status, group_id, group_open, created_at, updated_at)
+    VALUES (
+        :h,
+        (SELECT MAX(p.id) FROM prompts p
+         WHERE p.local_hash = :h AND NOT EXISTS (SELECT 1 FROM anchor_outbox o WHERE o.prompt_id = p.id)),
+        'pending', :g, :open, :now, :now
+    )
+""")
+
+def outbox_entry(local_hash: str, group_id: Optional[str] = None, group_open: bool = False) -> Dict[str, Any]:
+    """Parameters for ENQUEUE_ANCHOR, for callers that batch their own writes"""
+    return {"h": local_hash, "g": group_id, "open": int(group_open), "now": datetime.utcnow().isoformat()}
+
+def enqueue_anchor(db, local_hash: str):
+    """Add a hash to the anchor outbox; commits together with the caller's session"""
+    enqueue_anchors(db, [local_hash])
+
+def enqueue_anchors(db, local_hashes: List[str], group_id: Optional[str] = None, group_open: bool = False):
+    """
+    Bulk version of enqueue_anchor. Hashes sharing a group_id are anchored
+    together under one Merkle root; an open group is held back until
+    close_anchor_group() is called (or it has been idle for ANCHOR_GROUP_MAX_IDLE).
+    """
+    db.execute(ENQUEUE_ANCHOR, [outbox_entry(h, group_id, group_open) for h in local_hashes])
+
+CLOSE_ANCHOR_GROUP = text("UPDATE anchor_outbox SET group_open = 0 WHERE group_id = :g")
+
+def close_anchor_group(db, group_id: str):
+    db.execute(CLOSE_ANCHOR_GROUP, {"g": group_id})
+
+def get_anchor_status(db, local_hash: str) -> Optional[Dict[str, Any]]:
+    """Latest anchoring state for a hash, including its Merkle proof when batch-anchored"""
+    # Joined to the row the entry anchors; entries queued before prompt_id existed fall back to the newest row
+    row = db.execute(
+        text("""
+            SELECT o.status, o.attempts, o.tx_hash, o.block_number, o.gas_used, o.error, o.created_at, o.updated_at,
+                   p.merkle_root, p.leaf_index, p.merkle_proof
+            FROM anchor_outbox o
+            LEFT JOIN prompts p ON p.id = COALESCE(
+                o.prompt_id, (SELECT id FROM prompts WHERE local_hash = o.local_hash ORDER BY id DESC LIMIT 1)
+            )
+            WHERE o.local_hash = :h
+            ORDER BY o.id DESC LIMIT 1
+        """),
+        {"h": local_hash}
+    ).fetchone()
+    if not row:
+        return None
+
+    result = {
+        "local_hash": local_hash,
+        "status": row.status,
+        "attempts": row.attempts,
+        "queued_at": row.created_at,
+        "updated_at": row.updated_at
+    }
+    if row.tx_hash:
+        tx_hash_hex = row.tx_hash if row.tx_hash.startswith('0x') else f"0x{row.tx_hash}"
+        result["tx_hash"] = tx_hash_hex
+        result["explorer_url"] = f"https://sepolia.etherscan.io/tx/{tx_hash_hex}"
+    if row.status == "confirmed":
+        result["block_number"] = row.block_number
+        result["gas_used"] = row.gas_used
+    if row.error and row.status != "confirmed":
+        result["error"] = row.error
+    if row.merkle_proof:
+        result["merkle_root"] = row.merkle_root
+        result["leaf_index"] = row.leaf_index
+        result["merkle_proof"] = json.loads(row.merkle_proof)
+    return result
+
+# Take a signer's lease if it is free or expired, or extend our own
+RENEW_SIGNER_LEASE = text("""
+    INSERT INTO signer_leases (address, owner, lease_until) VALUES (:a, :o, :until)
+    ON CONFLICT(address) DO UPDATE SET owner = excluded.owner, lease_until = excluded.lease_until
+    WHERE signer_leases.owner = excluded.owner OR signer_leases.lease_until < :now
+""")
+
+def renew_signer_leases(db, addresses: List[str], owner: str, ttl: float, now: float) -> Set[str]:
+    """
+    Lease signing accounts to one anchoring process. Nonces are counted in
+    process memory, so two processes sending from one account would reuse them;
+    the accounts returned are the ones this owner may send from until now + ttl.
+    """
+    db.execute(RENEW_SIGNER_LEASE, [{"a": a, "o": owner, "until": now + ttl, "now": now} for a in addresses])
+    db.commit()
+    held = db.execute(
+        text("SELECT address FROM signer_leases WHERE owner = :o AND address IN :addresses")
+        .bindparams(bindparam("addresses", expanding=True)),
+        {"o": owner, "addresses": addresses}
+    ).scalars()
+    return set(held)
+
+def release_signer_leases(db, owner: str):
+    """Hand the accounts over at shutdown instead of making the next process wait out the lease"""
+    db.execute(text("UPDATE signer_leases SET lease_until = 0 WHERE owner = :o"), {"o": owner})
+    db.commit()
@@ -0,0 +1,426 @@
+import os
+import json
+import time
+import uuid
+import socket
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import bindparam, text
+from web3.exceptions import TimeExhausted
+
+from blockchain import ChainClient, send_anchor_transaction, wait_for_anchor_receipt
+from database import get_db
+from merkle import build_merkle_tree, merkle_root, merkle_proof
+from metrics import ANCHOR_BATCH_SIZE, ANCHOR_GAS_USED, ANCHOR_TRANSACTIONS, STAGE_SECONDS
+from receipt_tracker import TransactionDropped
+from storage_writer import storage_writer
+
+# Outbox helpers, re-exported for existing callers
+from anchor_outbox import ENQUEUE_ANCHOR, close_anchor_group, enqueue_anchor, enqueue_anchors, get_anchor_status, outbox_entry
+from anchor_outbox import release_signer_leases, renew_signer_leases
+
+logger = logging.getLogger("AnchorWorker")
+
+# Outbox rows the worker may pick up now: new, or claimed by a process whose lease lapsed before sending
+CLAIMABLE = """
+    next_attempt_at <= :now
+    AND (status = 'pending' OR (status = 'submitted' AND tx_hash IS NULL AND lease_until < :now))
+"""
+CLAIM_COLUMNS = "id, local_hash, prompt_id, attempts, tx_hash, group_id"
+
+RECORD_TX = text("UPDATE anchor_outbox SET tx_hash = :tx, updated_at = :ts WHERE id = :id")
+
+CONFIRM_ANCHOR = text("""
+    UPDATE anchor_outbox
+    SET status = 'confirmed', block_number = :block, gas_used = :gas, error = NULL,
+        claim_id = NULL, lease_until = NULL, updated_at = :ts
+    WHERE id = :id
+""")
+
+# The claimed entry's own proof row. Entries queued before prompt_id existed fall back to
+# rows with the hash that are not anchored yet, leaving earlier anchors of the same text alone
+CLAIMED_PROMPT = "(id = :pid OR (:pid IS NULL AND local_hash = :h AND blockchain_tx IS NULL))"
+
+# Written only once the transaction is confirmed, so no row points at a Merkle root that never made it on chain
+SET_PROMPT_ANCHOR = text(f"""
+    UPDATE prompts SET blockchain_tx = :tx, merkle_root = :root, leaf_index = :idx, merkle_proof = :path
+    WHERE {CLAIMED_PROMPT}
+""")
+
+class AnchorWorker:
+    """
+    Background thread that drains the anchor outbox.
+    In "single" mode every hash gets its own transaction; in "batch" mode pending
+    hashes are anchored as one Merkle root once `max_size` are waiting or the
+    oldest has waited `max_wait` seconds. Claimed rows carry a lease, so rows left
+    behind by a crashed or restarted process are picked up again once it expires.
+    Up to `concurrency` transactions are in flight at once; nonces come from the
+    signer pool's local nonce managers. Rows enqueued with a group_id are always
+    anchored together once their group is closed.
+    Every web worker runs one of these, but a signing account is only used by the
+    process holding its lease in signer_leases; a worker without any leased
+    account claims nothing and takes over when a holder stops renewing.
+    """
+
+    def __init__(
+        self,
+        client: ChainClient,
+        mode: str = "single",
+        max_size: int = 256,
+        max_wait: float = 5.0,
+        poll_interval: float = 1.0,
+        max_attempts: int = 5,
+        receipt_timeout: int = 300,
+        concurrency: int = 1,
+        group_max_idle: float = 60.0,
+        signer_lease_seconds: float = 30.0
+    ):
+        self.client = client
+        self.mode = mode
+        self.max_size = max_size if mode == "batch" else 1
+        self.max_wait = max_wait if mode == "batch" else 0.0
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.receipt_timeout = receipt_timeout
+        self.lease_seconds = receipt_timeout + 60
+        self.concurrency = concurrency
+        self.group_max_idle = group_max_idle
+        self.signer_lease_seconds = signer_lease_seconds
+        self._owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._leases_renewed_at = 0.0
+        self._slots = threading.Semaphore(concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="anchor-send")
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="anchor-worker", daemon=True)
+
+    @classmethod
+    def from_env(cls, client: ChainClient, mode: str = "single") -> "AnchorWorker":
+        return cls(
+            client,
+            mode=mode,
+            max_size=int(os.getenv("ANCHOR_BATCH_MAX_SIZE", "256")),
+            max_wait=float(os.getenv("ANCHOR_BATCH_MAX_WAIT", "5")),
+            poll_interval=float(os.getenv("ANCHOR_POLL_INTERVAL", "1")),
+            max_attempts=int(os.getenv("ANCHOR_MAX_ATTEMPTS", "5")),
+            concurrency=int(os.getenv("ANCHOR_CONCURRENCY", "4")),
+            group_max_idle=float(os.getenv("ANCHOR_GROUP_MAX_IDLE", "60")),
+            signer_lease_seconds=float(os.getenv("ANCHOR_SIGNER_LEASE", "30")),
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._executor.shutdown(wait=False)
+        try:
+            with get_db() as db:
+                release_signer_leases(db, self._owner)
+        except Exception as e:
+            logger.warning(f"Could not release signer leases: {str(e)}")
+
+    def notify(self):
+        """Wake the worker early after new hashes were enqueued"""
+        self._wake.set()
+
+    def pending_count(self) -> int:
+        with get_db() as db:
+            return db.execute(
+                text("SELECT COUNT(*) FROM anchor_outbox WHERE status IN ('pending', 'submitted')")
+            ).scalar()
+
+    def _renew_signer_leases(self) -> bool:
+        """Renew at a third of the lease; True if this process holds any signing account"""
+        pool = self.client.signer_pool
+        now = time.time()
+        if now - self._leases_renewed_at >= self.signer_lease_seconds / 3:
+            try:
+                with get_db() as db:
+                    held = renew_signer_leases(db, pool.addresses, self._owner, self.signer_lease_seconds, now)
+                pool.set_active(held)
+                self._leases_renewed_at = now
+            except Exception as e:
+                logger.error(f"Failed to renew signer leases: {str(e)}")
+                if now - self._leases_renewed_at >= self.signer_lease_seconds:
+                    # Our leases have lapsed; another process may be sending from these accounts now
+                    pool.set_active(set())
+        return pool.has_active()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self._renew_signer_leases():
+                # Another process is anchoring with these accounts
+                self._stop.wait(self.poll_interval)
+                continue
+
+            # Only claim work when a send slot is free, so claimed rows never sit idle
+            if not self._slots.acquire(timeout=self.poll_interval):
+                continue
+
+            try:
+                rows = self._claim()
+            except Exception as e:
+                logger.error(f"Failed to claim outbox rows: {str(e)}")
+                rows = []
+
+            if not rows:
+                self._slots.release()
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+
+            self._executor.submit(self._process_claimed, rows)
+
+    def _process_claimed(self, rows: List[Any]):
+        try:
+            self._process(rows)
+        except Exception as e:
+            logger.exception("Unexpected error in anchor worker")
+            self._release(rows, str(e))
+        finally:
+            self._slots.release()
+            # More rows may have queued up while this slot was busy
+            self._wake.set()
+
+    def _claim(self) -> List[Any]:
+        now = time.time()
+        claim_id = uuid.uuid4().hex
+        with get_db() as db:
+            # Rows already sent by an expired claim are finalized before anything new
+            resumed = db.execute(
+                text("""
+                    UPDATE anchor_outbox SET claim_id = :c, lease_until = :lease
+                    WHERE id IN (
+                        SELECT id FROM anchor_outbox
+                        WHERE status = 'submitted' AND tx_hash IS NOT NULL AND lease_until < :now
+                        AND tx_hash = (
+                            SELECT tx_hash FROM anchor_outbox
+                            WHERE status = 'submitted' AND tx_hash IS NOT NULL AND lease_until < :now
+                            ORDER BY id LIMIT 1
+                        )
+                    )
+                """),
+                {"c": claim_id, "lease": now + self.lease_seconds, "now": now}
+            ).rowcount
+
+            if not resumed:
+                claimed = self._claim_group(db, claim_id, now) or self._claim_ungrouped(db, claim_id, now)
+                if not claimed:
+                    return []
+            db.commit()
+
+            return db.execute(
+                text(f"SELECT {CLAIM_COLUMNS} FROM anchor_outbox WHERE claim_id = :c ORDER BY id"),
+                {"c": claim_id}
+            ).fetchall()
+
+    def _claim_group(self, db, claim_id: str, now: float) -> int:
+        """Claim every pending row of the oldest closed (or abandoned) anchor group"""
+        idle_cutoff = (datetime.utcnow() - timedelta(seconds=self.group_max_idle)).isoformat()
+        group = db.execute(
+            text(f"""
+                SELECT group_id FROM anchor_outbox
+                WHERE {CLAIMABLE} AND group_id IS NOT NULL
+                GROUP BY group_id
+                HAVING MIN(group_open) = 0 OR MAX(created_at) < :idle_cutoff
+                ORDER BY MIN(id) LIMIT 1
+            """),
+            {"now": now, "idle_cutoff": idle_cutoff}
+        ).fetchone()
+        if not group:
+            return 0
+
+        return db.execute(
+            text(f"""
+                UPDATE anchor_outbox
+                SET status = 'submitted', claim_id = :c, lease_until = :lease, updated_at = :ts
+                WHERE {CLAIMABLE} AND group_id = :g
+            """),
+            {
+                "c": claim_id,
+                "lease": now + self.lease_seconds,
+                "now": now,
+                "g": group.group_id,
+                "ts": datetime.utcnow().isoformat()
+            }
+        ).rowcount
+
+    def _claim_ungrouped(self, db, claim_id: str, now: float) -> int:
+        pending = db.execute(
+            text(f"""
+                SELECT COUNT(*) AS n, MIN(created_at) AS oldest FROM anchor_outbox
+                WHERE {CLAIMABLE} AND group_id IS NULL
+            """),
+            {"now": now}
+        ).fetchone()
+        if not pending.n:
+            return 0
+        if pending.n < self.max_size:
+            age = (datetime.utcnow() - datetime.fromisoformat(pending.oldest)).total_seconds()
+            if age < self.max_wait:
+                return 0
+
+        return db.execute(
+            text(f"""
+                UPDATE anchor_outbox
+                SET status = 'submitted', claim_id = :c, lease_until = :lease, updated_at = :ts
+                WHERE id IN (
+                    SELECT id FROM anchor_outbox
+                    WHERE {CLAIMABLE} AND group_id IS NULL
+                    ORDER BY id LIMIT :n
+                )
+            """),
+            {
+                "c": claim_id,
+                "lease": now + self.lease_seconds,
+                "now": now,
+                "n": self.max_size,
+                "ts": datetime.utcnow().isoformat()
+            }
+        ).rowcount
+
+    def _process(self, rows: List[Any]):
+        if rows[0].tx_hash:
+            logger.info(f"Resuming anchor transaction {rows[0].tx_hash} for {len(rows)} proofs")
+            self._finalize(rows, bytes.fromhex(rows[0].tx_hash.removeprefix("0x")))
+            return
+
+        levels = self._merkle_levels(rows)
+        if levels:
+            anchor_hash = merkle_root(levels)
+            logger.info(f"Anchoring Merkle root {anchor_hash.hex()} for {len(rows)} proofs")
+        else:
+            anchor_hash = bytes.fromhex(rows[0].local_hash)
+
+        try:
+            tx_hash = send_anchor_transaction(anchor_hash, self.client)
+        except Exception as e:
+            ANCHOR_TRANSACTIONS.inc(outcome="send_failed")
+            self._release(rows, str(e))
+            return
+        ANCHOR_TRANSACTIONS.inc(outcome="sent")
+        ANCHOR_BATCH_SIZE.observe(len(rows))
+
+        # Shares a commit with concurrent sends and request writes
+        ts = datetime.utcnow().isoformat()
+        storage_writer.write([
+            (RECORD_TX, {"tx": tx_hash.hex(), "ts": ts, "id": row.id}) for row in rows
+        ])
+        with get_db() as db:
+            rows = db.execute(
+                text(f"SELECT {CLAIM_COLUMNS} FROM anchor_outbox WHERE id IN :ids ORDER BY id")
+                .bindparams(bindparam("ids", expanding=True)),
+                {"ids": [row.id for row in rows]}
+            ).fetchall()
+
+        self._finalize(rows, tx_hash)
+
+    def _finalize(self, rows: List[Any], tx_hash: bytes):
+        try:
+            receipt = wait_for_anchor_receipt(tx_hash, self.client, timeout=self.receipt_timeout)
+        except (TimeExhausted, TransactionDropped) as e:
+            ANCHOR_TRANSACTIONS.inc(outcome="not_mined")
+            # Never mined (dropped or replaced) - local nonces are stale, send again
+            self.client.signer_pool.resync_all()
+            self._release(rows, f"Not mined: {str(e)}", clear_tx=True)
+            return
+        except ValueError as e:
+            ANCHOR_TRANSACTIONS.inc(outcome="reverted")
+            self._fail(rows, str(e))
+            return
+        except Exception as e:
+            self._release(rows, str(e))
+            return
+
+        ANCHOR_TRANSACTIONS.inc(outcome="confirmed")
+        ANCHOR_GAS_USED.observe(receipt.gasUsed)
+
+        now = datetime.utcnow().isoformat()
+        tx = receipt.transactionHash.hex()
+        proofs = self._merkle_proofs(rows)
+        storage_writer.write(
+            [(CONFIRM_ANCHOR, {"block": receipt.blockNumber, "gas": receipt.gasUsed, "ts": now, "id": row.id}) for row in rows]
+            + [
+                (SET_PROMPT_ANCHOR, {"tx": tx, "pid": row.prompt_id, "h": row.local_hash, **proof})
+                for row, proof in zip(rows, proofs)
+            ]
+        )
+        logger.info(f"✅ Confirmed {len(rows)} anchored proofs in block {receipt.blockNumber}")
+
+    def _merkle_levels(self, rows: List[Any]) -> Optional[List[List[bytes]]]:
+        """
+        The tree a claim is anchored under, or None when its single hash is anchored directly.
+        Claims are read in id order, so a claim resumed after a restart rebuilds the same tree.
+        """
+        # Grouped rows (e.g. a batch job) always share one Merkle root, whatever the mode
+        if self.mode != "batch" and rows[0].group_id is None:
+            return None
+        with STAGE_SECONDS.time(stage="anchor.merkle"):
+            return build_merkle_tree([bytes.fromhex(row.local_hash) for row in rows])
+
+    def _merkle_proofs(self, rows: List[Any]) -> List[Dict[str, Any]]:
+        """Root and inclusion path of each row, all None for a directly anchored hash"""
+        levels = self._merkle_levels(rows)
+        if not levels:
+            return [{"root": None, "idx": None, "path": None} for _ in rows]
+        root = merkle_root(levels).hex()
+        return [
+            {"root": root, "idx": index, "path": json.dumps(merkle_proof(levels, index))}
+            for index in range(len(rows))
+        ]
+
+    def _release(self, rows: List[Any], error: str, clear_tx: bool = False):
+        """Return rows to the queue with exponential backoff, or fail them after max_attempts"""
+        logger.warning(f"Anchoring attempt failed for {len(rows)} proofs: {error}")
+        now = time.time()
+        params = []
+        for row in rows:
+            attempts = row.attempts + 1
+            retry_at = now + min(2 ** attempts, 300)
+            if attempts >= self.max_attempts:
+                status = "failed"
+            elif row.tx_hash and not clear_tx:
+                # Already broadcast: keep the tx and look for its receipt again once the lease lapses
+                status = "submitted"
+            else:
+                status = "pending"
+            params.append({
+                "status": status,
+                "attempts": attempts,
+                "next": retry_at,
+                "err": error,
+                "ts": datetime.utcnow().isoformat(),
+                "id": row.id
+            })
+        with get_db() as db:
+            db.execute(
+                text(f"""
+                    UPDATE anchor_outbox
+                    SET status = :status, attempts = :attempts, next_attempt_at = :next, error = :err,
+                        claim_id = NULL, lease_until = :next, updated_at = :ts
+                        {", tx_hash = NULL" if clear_tx else ""}
+                    WHERE id = :id
+                """),
+                params
+            )
+            db.commit()
+
+    def _fail(self, rows: List[Any], error: str):
+        logger.error(f"Anchoring failed permanently for {len(rows)} proofs: {error}")
+        with get_db() as db:
+            db.execute(
+                text("""
+                    UPDATE anchor_outbox
+                    SET status = 'failed', error = :err, claim_id = NULL, lease_until = NULL, updated_at = :ts
+                    WHERE id = :id
+                """),
+                [{"err": error, "ts": datetime.utcnow().isoformat(), "id": row.id} for row in rows]
+            )
+            db.commit()
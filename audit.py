@@ -0,0 +1,233 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import itertools
+import multiprocessing
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+logger = logging.getLogger("ProofAudit")
+
+# Transactions per JSON-RPC batch when checking receipts and calldata
+TX_BATCH_SIZE = 100
+
+AUDIT_ROWS = """
+    SELECT id, local_hash, prompt, response, prompt_ref, response_ref, blockchain_tx, merkle_root, merkle_proof
+    FROM prompts
+    WHERE id >= :lo AND id < :hi
+    ORDER BY id
+"""
+
+def mismatch(row: Dict[str, Any], check: str, detail: str) -> Dict[str, Any]:
+    return {"id": row["id"], "local_hash": row["local_hash"], "check": check, "detail": detail}
+
+def audit_range(bounds: Tuple[int, int]) -> Tuple[int, List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Runs in a pool process: load one id range, decompress bodies and recompute
+    every hash. Returns the row count, local mismatches and the anchored rows
+    left for the chain check.
+    """
+    from database import get_db
+    from blob_store import blob_store
+    from merkle import compute_merkle_root
+
+    lo, hi = bounds
+    with get_db() as db:
+        rows = [dict(row) for row in db.execute(text(AUDIT_ROWS), {"lo": lo, "hi": hi}).mappings()]
+        blob_store.fill_bodies(db, rows)
+
+    mismatches, anchored = [], []
+    for row in rows:
+        if row["prompt"] is None or row["response"] is None:
+            mismatches.append(mismatch(row, "body", "Referenced body is missing from the blob store"))
+            continue
+        computed = hashlib.sha256(f"{row['prompt']}{row['response']}".encode("utf-8")).hexdigest()
+        if computed != row["local_hash"]:
+            mismatches.append(mismatch(row, "hash", f"sha256(prompt + response) is {computed}"))
+            continue
+        if not row["blockchain_tx"]:
+            continue
+
+        # Batch-anchored proofs are on chain as the Merkle root their stored path leads to
+        anchor_hash = row["local_hash"]
+        if row["merkle_proof"]:
+            try:
+                anchor_hash = compute_merkle_root(bytes.fromhex(row["local_hash"]), json.loads(row["merkle_proof"])).hex()
+            except (KeyError, ValueError) as e:
+                mismatches.append(mismatch(row, "merkle_proof", f"Invalid Merkle proof: {str(e)}"))
+                continue
+            if anchor_hash != row["merkle_root"]:
+                mismatches.append(mismatch(row, "merkle_proof", f"Path leads to {anchor_hash}, not stored root {row['merkle_root']}"))
+                continue
+        anchored.append({
+            "id": row["id"],
+            "local_hash": row["local_hash"],
+            "tx": "0x" + row["blockchain_tx"].lower().removeprefix("0x"),
+            "anchor_hash": anchor_hash
+        })
+    return len(rows), mismatches, anchored
+
+def _quantity(value: Any) -> Optional[int]:
+    """Batched responses carry raw hex quantities; unbatched ones are already formatted"""
+    if value is None:
+        return None
+    return int(value, 16) if isinstance(value, str) else int(value)
+
+def _hex(value: Any) -> str:
+    if value is None:
+        return ""
+    return (value if isinstance(value, str) else bytes(value).hex()).lower().removeprefix("0x")
+
+class ChainAuditor:
+    """
+    Checks anchored rows against the chain in bulk: receipts and transactions
+    for each distinct tx hash go out as JSON-RPC batches, and the anchored
+    hashes are confirmed with aggregated verifyHash calls.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.contract_address = client.contract.address.lower()
+
+    @classmethod
+    def connect(cls) -> "ChainAuditor":
+        """Read-only connection: no signing keys needed"""
+        from web3 import Web3
+        from blockchain import ChainClient, get_contract
+        from rpc_pool import RpcPoolProvider
+
+        w3 = Web3(RpcPoolProvider.from_env())
+        return cls(ChainClient(w3, get_contract(w3), w3.eth.chain_id))
+
+    def check(self, anchored: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        from blockchain import encode_anchor_call, verify_many_on_chain
+        from receipt_tracker import request_all
+
+        if not anchored:
+            return []
+        mismatches = []
+        txs = list(dict.fromkeys(a["tx"] for a in anchored))
+        tx_results: Dict[str, Tuple[Any, Any]] = {}
+        for start in range(0, len(txs), TX_BATCH_SIZE):
+            chunk = txs[start:start + TX_BATCH_SIZE]
+            results = request_all(
+                self.client.w3,
+                [("eth_getTransactionReceipt", [tx]) for tx in chunk] + [("eth_getTransactionByHash", [tx]) for tx in chunk]
+            )
+            for i, tx in enumerate(chunk):
+                tx_results[tx] = (results[i], results[len(chunk) + i])
+
+        for a in anchored:
+            receipt, tx = tx_results[a["tx"]]
+            if not receipt:
+                mismatches.append(mismatch(a, "receipt", f"No receipt for {a['tx']}"))
+            elif _quantity(receipt.get("status")) != 1:
+                mismatches.append(mismatch(a, "receipt", f"Transaction {a['tx']} reverted"))
+            elif not tx or _hex(tx.get("to")) != self.contract_address.removeprefix("0x"):
+                mismatches.append(mismatch(a, "tx_input", f"Transaction {a['tx']} was not sent to the contract"))
+            elif _hex(tx.get("input") or tx.get("data")) != encode_anchor_call(bytes.fromhex(a["anchor_hash"])).hex():
+                mismatches.append(mismatch(a, "tx_input", f"Transaction {a['tx']} did not anchor {a['anchor_hash']}"))
+
+        hashes = list(dict.fromkeys(a["anchor_hash"] for a in anchored))
+        results = dict(zip(hashes, verify_many_on_chain([bytes.fromhex(h) for h in hashes], self.client)))
+        for a in anchored:
+            result = results[a["anchor_hash"]]
+            if result.get("status") != "success":
+                # Not a finding about the proof; stop so the range is checked again on resume
+                raise RuntimeError(f"verifyHash lookup failed: {result.get('error')}")
+            if not result["exists"]:
+                mismatches.append(mismatch(a, "verify_hash", f"{a['anchor_hash']} is not recorded by the contract"))
+        return mismatches
+
+def load_checkpoint(path: str) -> Dict[str, Any]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"next_id": 0, "rows": 0, "mismatches": {}}
+
+def save_checkpoint(path: str, state: Dict[str, Any]):
+    # Written to a temp file and renamed, so an interrupted audit never leaves a torn checkpoint
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+def run_audit(report_path: str, checkpoint_path: str, workers: int, chunk_size: int, chain: bool) -> Dict[str, Any]:
+    """
+    Audit every proof: id ranges are hashed in a process pool while the main
+    process checks each finished range against the chain. Progress is
+    checkpointed after every range in id order, so a rerun resumes where the
+    last one stopped; mismatches are appended to the NDJSON report.
+    """
+    from database import get_db
+
+    state = load_checkpoint(checkpoint_path)
+    with get_db() as db:
+        max_id = db.execute(text("SELECT COALESCE(MAX(id), 0) FROM prompts")).scalar()
+    ranges = [(lo, lo + chunk_size) for lo in range(state["next_id"], max_id + 1, chunk_size)]
+    if state["next_id"]:
+        logger.info(f"Resuming audit at id {state['next_id']} ({state['rows']} proofs already checked)")
+    auditor = ChainAuditor.connect() if chain else None
+
+    started = time.monotonic()
+    counts = Counter(state["mismatches"])
+    checked = done = 0
+    with open(report_path, "a") as report, ProcessPoolExecutor(
+        max_workers=workers,
+        # Fresh interpreters rather than forks of a parent holding RPC threads and SQLite connections
+        mp_context=multiprocessing.get_context("forkserver")
+    ) as pool:
+        # A few ranges per worker in flight: hashing runs ahead of the chain check without
+        # queueing the whole table's results in memory. Ranges finish in id order.
+        in_flight: Deque[Tuple[Tuple[int, int], Future]] = deque()
+        pending = iter(ranges)
+        for bounds in itertools.islice(pending, workers * 2):
+            in_flight.append((bounds, pool.submit(audit_range, bounds)))
+        while in_flight:
+            bounds, future = in_flight.popleft()
+            rows, mismatches, anchored = future.result()
+            for next_bounds in itertools.islice(pending, 1):
+                in_flight.append((next_bounds, pool.submit(audit_range, next_bounds)))
+            if auditor:
+                mismatches += auditor.check(anchored)
+            for m in mismatches:
+                report.write(json.dumps(m) + "\n")
+                counts[m["check"]] += 1
+            report.flush()
+            checked += rows
+            state.update({"next_id": bounds[1], "rows": state["rows"] + rows, "mismatches": dict(counts)})
+            save_checkpoint(checkpoint_path, state)
+            done += 1
+            if done % 20 == 0:
+                logger.info(f"Audited {state['rows']} proofs ({checked / (time.monotonic() - started):.0f}/s)")
+
+    elapsed = time.monotonic() - started
+    return {
+        "proofs": state["rows"],
+        "mismatches": dict(counts),
+        "elapsed_s": round(elapsed, 1),
+        "proofs_per_second": round(checked / elapsed) if elapsed else None,
+        "report": report_path
+    }
+
+if __name__ == "__main__":
+    # python audit.py --report audit_report.jsonl
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)s | %(name)s | %(message)s')
+    parser = argparse.ArgumentParser(description="Check stored proofs against their bodies and the chain")
+    parser.add_argument("--report", default="audit_report.jsonl", help="NDJSON file mismatches are appended to")
+    parser.add_argument("--checkpoint", default="audit_checkpoint.json", help="Progress file; delete it to start over")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Proof ids per work unit")
+    parser.add_argument("--skip-chain", action="store_true", help="Only recompute hashes and Merkle paths")
+    args = parser.parse_args()
+
+    summary = run_audit(args.report, args.checkpoint, args.workers, args.chunk_size, chain=not args.skip_chain)
+    print(json.dumps(summary, indent=2))
+    sys.exit(1 if summary["mismatches"] else 0)
@@ -0,0 +1,239 @@
+import os
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from sqlalchemy import text
+
+from anchor_outbox import CLOSE_ANCHOR_GROUP, ENQUEUE_ANCHOR, outbox_entry
+from blob_store import INSERT_BLOB, blob_store
+from database import INSERT_PROMPT, get_db
+from search_index import INDEX_PROOF, index_entry
+from storage_writer import WriteOps, storage_writer
+
+logger = logging.getLogger("BatchJobs")
+
+# Job writes go through the shared group-committing writer, like the interactive proof path
+INSERT_JOB = text("INSERT INTO batch_jobs (id, status, total, created_at, updated_at) VALUES (:id, 'running', :n, :now, :now)")
+INSERT_JOB_RESULT = text("""
+    INSERT INTO batch_job_results (job_id, item_index, status, local_hash, error, completed_at)
+    VALUES (:job, :idx, :status, :h, :err, :now)
+""")
+COUNT_JOB_RESULTS = text("UPDATE batch_jobs SET completed = completed + :c, failed = failed + :f, updated_at = :now WHERE id = :id")
+SET_JOB_STATUS = text("UPDATE batch_jobs SET status = :status, updated_at = :now WHERE id = :id")
+MARK_INTERRUPTED = text("UPDATE batch_jobs SET status = 'interrupted' WHERE id = :id AND status = 'running'")
+
+class BatchJobRunner:
+    """
+    Runs offline batches of prompts inside the API process.
+    Generation runs with bounded parallelism; finished items are written in
+    bulk transactions (prompt rows, outbox rows and job results together), and
+    the whole job is anchored under one Merkle root once it completes.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 16,
+        flush_size: int = 100,
+        flush_interval: float = 0.5,
+        stale_after: float = 300.0,
+        on_anchors_ready: Optional[Callable[[], None]] = None
+    ):
+        self.concurrency = concurrency
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.stale_after = stale_after
+        self.on_anchors_ready = on_anchors_ready
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @classmethod
+    def from_env(cls, on_anchors_ready: Optional[Callable[[], None]] = None) -> "BatchJobRunner":
+        return cls(
+            concurrency=int(os.getenv("BATCH_JOB_CONCURRENCY", "16")),
+            flush_size=int(os.getenv("BATCH_JOB_FLUSH_SIZE", "100")),
+            flush_interval=float(os.getenv("BATCH_JOB_FLUSH_INTERVAL", "0.5")),
+            on_anchors_ready=on_anchors_ready,
+        )
+
+    async def submit(self, items: List[Dict[str, Any]]) -> str:
+        """Record the job and start it on the running event loop; returns the job id"""
+        job_id = uuid.uuid4().hex
+        now = datetime.utcnow().isoformat()
+        await storage_writer.write_async([(INSERT_JOB, {"id": job_id, "n": len(items), "now": now})])
+
+        task = asyncio.get_running_loop().create_task(self._run(job_id, items))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+        logger.info(f"Started batch job {job_id} with {len(items)} prompts")
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Blocking; call it from a worker thread"""
+        with get_db() as db:
+            row = db.execute(text("SELECT * FROM batch_jobs WHERE id = :id"), {"id": job_id}).fetchone()
+        if not row:
+            return None
+
+        status = row.status
+        if status == "running" and job_id not in self._tasks and self._is_stale(row.updated_at):
+            # The process that ran it went away; finished items are kept and still anchored
+            status = "interrupted"
+            storage_writer.write([(MARK_INTERRUPTED, {"id": job_id})])
+
+        return {
+            "job_id": job_id,
+            "status": status,
+            "total": row.total,
+            "completed": row.completed,
+            "failed": row.failed,
+            "created_at": row.created_at,
+            "updated_at": row.updated_at
+        }
+
+    async def iter_results(self, job_id: str, poll_interval: float = 0.5) -> AsyncIterator[Dict[str, Any]]:
+        """Yield item results in completion order, following the job until it finishes"""
+        last_id = 0
+        while True:
+            rows = await asyncio.to_thread(self._fetch_results, job_id, last_id)
+            for row in rows:
+                last_id = row["id"]
+                result = {"index": row["item_index"], "status": row["status"]}
+                if row["status"] == "completed":
+                    result.update({
+                        "local_hash": row["local_hash"],
+                        "prompt": row["prompt"],
+                        "response": row["response"],
+                        "timestamp": row["timestamp"],
+                        "anchor_status_url": f"/api/anchors/{row['local_hash']}"
+                    })
+                else:
+                    result["error"] = row["error"]
+                yield result
+
+            if rows:
+                continue
+            job = await asyncio.to_thread(self.get_job, job_id)
+            if not job or job["status"] != "running":
+                return
+            await asyncio.sleep(poll_interval)
+
+    def _is_stale(self, updated_at: str) -> bool:
+        return datetime.fromisoformat(updated_at) < datetime.utcnow() - timedelta(seconds=self.stale_after)
+
+    def _fetch_results(self, job_id: str, after_id: int) -> List[Dict[str, Any]]:
+        with get_db() as db:
+            rows = [
+                dict(row) for row in db.execute(
+                    text("""
+                        SELECT r.id, r.item_index, r.status, r.local_hash, r.error,
+                               p.prompt, p.response, p.prompt_ref, p.response_ref, p.timestamp
+                        FROM batch_job_results r
+                        LEFT JOIN prompts p ON p.id = (SELECT id FROM prompts WHERE local_hash = r.local_hash ORDER BY id DESC LIMIT 1)
+                        WHERE r.job_id = :job AND r.id > :after
+                        ORDER BY r.id LIMIT 500
+                    """),
+                    {"job": job_id, "after": after_id}
+                ).mappings()
+            ]
+            blob_store.fill_bodies(db, rows)
+        return rows
+
+    async def _run(self, job_id: str, items: List[Dict[str, Any]]):
+        # Imported on first use so the API does not load the OpenAI SDK at startup
+        from prompt_handler import generate_proof_async
+        from llm_scheduler import PRIORITY_BATCH
+
+        slots = asyncio.Semaphore(self.concurrency)
+        finished: asyncio.Queue = asyncio.Queue()
+
+        async def generate(index: int, item: Dict[str, Any]):
+            async with slots:
+                try:
+                    response, proof_hash = await generate_proof_async(
+                        prompt=item["prompt"],
+                        model=item["model"],
+                        temperature=item["temperature"],
+                        # Behind interactive requests for RPM/TPM budget, and never shed
+                        priority=PRIORITY_BATCH
+                    )
+                    await finished.put({
+                        "index": index,
+                        "item": item,
+                        "response": response,
+                        "local_hash": proof_hash.hex(),
+                        "timestamp": datetime.utcnow().isoformat()
+                    })
+                except Exception as e:
+                    await finished.put({"index": index, "error": str(e)})
+
+        loop = asyncio.get_running_loop()
+        producers = asyncio.gather(*(generate(i, item) for i, item in enumerate(items)))
+        try:
+            remaining = len(items)
+            while remaining:
+                batch = [await finished.get()]
+                deadline = loop.time() + self.flush_interval
+                while len(batch) < self.flush_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(finished.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                await storage_writer.write_async(self._result_ops(job_id, batch))
+                remaining -= len(batch)
+
+            await producers
+            await self._finish(job_id, "completed")
+            logger.info(f"Batch job {job_id} completed")
+        except Exception:
+            logger.exception(f"Batch job {job_id} failed")
+            producers.cancel()
+            await self._finish(job_id, "failed")
+
+    def _result_ops(self, job_id: str, batch: List[Dict[str, Any]]) -> WriteOps:
+        """One transaction per flush: proof rows, their outbox entries and the job results"""
+        succeeded = [r for r in batch if "error" not in r]
+        now = datetime.utcnow().isoformat()
+        ops: WriteOps = []
+        blobs = {}
+        for r in succeeded:
+            (prompt_ref, response_ref), packed = blob_store.pack(r["item"]["prompt"], r["response"])
+            blobs.update((b["d"], b) for b in packed)
+            ops.append((INSERT_PROMPT, {
+                "pr": prompt_ref,
+                "rr": response_ref,
+                "t": r["timestamp"],
+                "h": r["local_hash"],
+                "m": r["item"]["model"],
+                "temp": r["item"]["temperature"]
+            }))
+        # Each statement runs once for the whole flush, in order of first appearance: prompt rows
+        # go in before the outbox and index entries that look them up
+        ops = [(INSERT_BLOB, blob) for blob in blobs.values()] + ops
+        ops += [(INDEX_PROOF, index_entry(r["item"]["prompt"], r["response"], r["local_hash"], r["timestamp"])) for r in succeeded]
+        ops += [(ENQUEUE_ANCHOR, outbox_entry(r["local_hash"], group_id=job_id, group_open=True)) for r in succeeded]
+        ops += [
+            (INSERT_JOB_RESULT, {
+                "job": job_id,
+                "idx": r["index"],
+                "status": "failed" if "error" in r else "completed",
+                "h": r.get("local_hash"),
+                "err": r.get("error"),
+                "now": now
+            })
+            for r in batch
+        ]
+        ops.append((COUNT_JOB_RESULTS, {"c": len(succeeded), "f": len(batch) - len(succeeded), "now": now, "id": job_id}))
+        return ops
+
+    async def _finish(self, job_id: str, status: str):
+        await storage_writer.write_async([
+            (CLOSE_ANCHOR_GROUP, {"g": job_id}),
+            (SET_JOB_STATUS, {"status": status, "now": datetime.utcnow().isoformat(), "id": job_id}),
+        ])
+        if self.on_anchors_ready:
+            self.on_anchors_ready()
@@ -0,0 +1,51 @@
+import threading
+
+from web3 import Web3, EthereumTesterProvider
+
+from blockchain import ChainClient, get_contract
+
+# Minimal ProofAnchor with the same interface as the deployed contract:
+#   anchorHash(bytes32 h)  -> anchored[h] = block.timestamp
+#   verifyHash(bytes32 h)  -> (anchored[h] != 0, anchored[h])
+# Hand-assembled so the benchmark needs no Solidity compiler.
+ANCHOR_SELECTOR = Web3.keccak(text="anchorHash(bytes32)")[:4].hex()
+VERIFY_SELECTOR = Web3.keccak(text="verifyHash(bytes32)")[:4].hex()
+RUNTIME_CODE = (
+    "600035" "60e01c"                       # selector = calldata[0:4]
+    "80" "63" + ANCHOR_SELECTOR + "14" "601d" "57"
+    "63" + VERIFY_SELECTOR + "14" "6024" "57"
+    "6000" "80" "fd"                        # unknown selector: revert
+    "5b" "42" "600435" "55" "00"            # 0x1d anchorHash: sstore(h, timestamp)
+    "5b" "600435" "54" "80" "15" "15"       # 0x24 verifyHash: t = sload(h), exists = t != 0
+    "600052" "602052" "6040" "6000" "f3"    # return abi.encode(exists, t)
+)
+INIT_CODE = "6037" "80" "600b" "6000" "39" "6000" "f3" + RUNTIME_CODE
+
+class _LockedTesterProvider(EthereumTesterProvider):
+    """py-evm is not thread-safe; the worker, receipt tracker and requests share one chain"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.RLock()
+
+    def make_request(self, method, params):
+        with self._lock:
+            return super().make_request(method, params)
+
+class LocalChain:
+    """In-process EVM (eth-tester + py-evm) with ProofAnchor deployed from a funded test account"""
+
+    def __init__(self):
+        self.w3 = Web3(_LockedTesterProvider())
+        backend = self.w3.provider.ethereum_tester.backend
+        self.private_key = backend.account_keys[0].to_hex()
+        deployer = self.w3.eth.accounts[0]
+
+        tx_hash = self.w3.eth.send_transaction({"from": deployer, "data": "0x" + INIT_CODE})
+        receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+        self.contract_address = receipt.contractAddress
+        assert len(RUNTIME_CODE) == 0x37 * 2, "runtime size is hard-coded in INIT_CODE"
+
+    def client(self) -> ChainClient:
+        """A ChainClient on this chain; CONTRACT_ADDRESS and PRIVATE_KEY must already point at it"""
+        return ChainClient(self.w3, get_contract(self.w3), self.w3.eth.chain_id)
@@ -0,0 +1,224 @@
+"""
+Offline end-to-end benchmark for the API.
+
+Runs main.app under uvicorn against a fake OpenAI server and an in-process
+EVM with ProofAnchor deployed, drives /prompt, /verify and
+/api/proofs/{tx_hash} at a fixed concurrency and reports latency
+percentiles and throughput. Run from the repository root:
+
+    python -m bench.run --requests 500 --concurrency 32 --save bench/baseline.json
+    python -m bench.run --compare bench/baseline.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import threading
+import warnings
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from bench.fake_openai import FakeOpenAI
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    values = sorted(latencies)
+    return {
+        "requests": len(values) + errors,
+        "errors": errors,
+        "rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+    }
+
+async def drive(client: httpx.AsyncClient, calls: List[Dict[str, Any]], concurrency: int):
+    """Send every call with at most `concurrency` in flight; returns (summary, responses)"""
+    slots = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    responses: List[Optional[dict]] = [None] * len(calls)
+    errors = 0
+
+    async def one(index: int, call: Dict[str, Any]):
+        nonlocal errors
+        async with slots:
+            started = time.perf_counter()
+            try:
+                r = await client.request(call["method"], call["url"], json=call.get("json"))
+                r.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+                responses[index] = r.json()
+            except Exception:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i, call) for i, call in enumerate(calls)))
+    return summarize(latencies, errors, time.perf_counter() - started), responses
+
+async def wait_for_anchors(client: httpx.AsyncClient, timeout: float) -> float:
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        health = (await client.get("/health")).json()
+        if health.get("anchor_queue") == 0:
+            break
+        await asyncio.sleep(0.1)
+    return round(time.perf_counter() - started, 3)
+
+async def run_scenarios(base_url: str, args) -> Dict[str, Any]:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        prompts = [f"Benchmark prompt {i}: summarize proof of prompt anchoring" for i in range(args.requests)]
+        results: Dict[str, Any] = {}
+
+        results["prompt"], proofs = await drive(
+            client,
+            [{"method": "POST", "url": "/prompt", "json": {"prompt": p, "model": "gpt-4o"}} for p in prompts],
+            args.concurrency
+        )
+        proofs = [p for p in proofs if p]
+        results["anchor_drain_s"] = await wait_for_anchors(client, args.anchor_timeout)
+
+        results["verify"], _ = await drive(
+            client,
+            [{"method": "POST", "url": "/verify", "json": {"prompt": p["prompt"], "response": p["response"]}} for p in proofs],
+            args.concurrency
+        )
+
+        anchors = [(await client.get(f"/api/anchors/{p['local_hash']}")).json() for p in proofs]
+        tx_hashes = [a["tx_hash"] for a in anchors if a.get("tx_hash")]
+        results["proofs"], _ = await drive(
+            client,
+            [{"method": "GET", "url": f"/api/proofs/{tx}"} for tx in tx_hashes],
+            args.concurrency
+        )
+        return results
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def run(args) -> Dict[str, Any]:
+    fake_openai = FakeOpenAI(latency=args.llm_latency, tokens_per_second=args.token_rate, response_tokens=args.response_tokens).start()
+    workdir = tempfile.mkdtemp(prefix="pop-bench-")
+
+    # Only imported after this, since these modules read their config at import time
+    from bench.local_chain import LocalChain
+    chain = LocalChain()
+    os.environ.update({
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": fake_openai.base_url,
+        "DATABASE_URL": f"sqlite:///{workdir}/bench.db",
+        "RATE_LIMIT_DB": f"{workdir}/rate_limits.db",
+        "WEB3_PROVIDER_URL": "local-eth-tester",
+        "CONTRACT_ADDRESS": chain.contract_address,
+        "PRIVATE_KEY": chain.private_key,
+        "PRIVATE_KEYS": "",
+        "ANCHOR_MODE": args.anchor_mode,
+        # py-evm applies transactions immediately and has no mempool to reorder nonces
+        "ANCHOR_CONCURRENCY": "1",
+        "RECEIPT_POLL_INTERVAL": "0.1",
+        "RESPONSE_CACHE_ENABLED": "false",
+    })
+
+    import uvicorn
+    import blockchain
+    blockchain._chain_client = chain.client()
+    import main
+    main.limiter.enabled = False
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    try:
+        results = asyncio.run(run_scenarios(f"http://127.0.0.1:{port}", args))
+    finally:
+        server.should_exit = True
+        thread.join(10)
+        fake_openai.stop()
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "anchor_mode": args.anchor_mode,
+            "llm_latency": args.llm_latency,
+            "token_rate": args.token_rate,
+            "response_tokens": args.response_tokens,
+        },
+        "results": results,
+    }
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> bool:
+    """Print deltas against the baseline; False if any scenario regressed beyond tolerance"""
+    ok = True
+    changed = [k for k, v in current["meta"].items() if k not in ("timestamp", "python") and baseline["meta"].get(k) != v]
+    if changed:
+        print(f"Warning: baseline was recorded with different settings ({', '.join(changed)})")
+    print(f"\n{'scenario':<10} {'metric':<8} {'baseline':>10} {'current':>10} {'delta':>8}")
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if not isinstance(result, dict) or not isinstance(before, dict):
+            continue
+        for metric, worse_if_higher in (("p50_ms", True), ("p95_ms", True), ("p99_ms", True), ("rps", False)):
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            delta = (new - old) / old
+            regressed = delta > tolerance if worse_if_higher else delta < -tolerance
+            ok = ok and not regressed
+            print(f"{name:<10} {metric:<8} {old:>10} {new:>10} {delta:>+7.1%}{'  REGRESSION' if regressed else ''}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline Proof-of-Prompt API benchmark")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--anchor-mode", choices=["single", "batch"], default="batch")
+    parser.add_argument("--anchor-timeout", type=float, default=120)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Fake OpenAI time to first token, seconds")
+    parser.add_argument("--token-rate", type=float, default=200, help="Fake OpenAI tokens per second")
+    parser.add_argument("--response-tokens", type=int, default=50)
+    parser.add_argument("--save", help="Write results to this JSON file as the new baseline")
+    parser.add_argument("--compare", help="Compare against a saved baseline; exits 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression for --compare")
+    args = parser.parse_args()
+
+    # The app's pooled HTTP clients are still open when the server loop closes at exit
+    warnings.filterwarnings("ignore", category=ResourceWarning)
+
+    report = run(args)
+    print(json.dumps(report, indent=2))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(report, baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+import os
+import sys
+import zlib
+import importlib.util
+import hashlib
+import logging
+import argparse
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, text
+
+from database import get_db
+
+logger = logging.getLogger("BlobStore")
+
+# Bodies shorter than this are stored as-is; compression headers would outweigh any gain
+MIN_COMPRESS_SIZE = 64
+
+# SQLite caps bound parameters per statement; stay well under it for IN (...) lookups
+LOOKUP_CHUNK_SIZE = 500
+
+INSERT_BLOB = text(
+    "INSERT OR IGNORE INTO blobs (digest, codec, dict_id, size, data) VALUES (:d, :codec, :dict, :size, :data)"
+)
+
+SELECT_BLOBS = text(
+    "SELECT digest, codec, dict_id, data FROM blobs WHERE digest IN :digests"
+).bindparams(bindparam("digests", expanding=True))
+
+# (body column, reference column) pairs on prompts
+BODY_COLUMNS = (("prompt", "prompt_ref"), ("response", "response_ref"))
+
+def body_digest(body: str) -> str:
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+class BlobStore:
+    """
+    Content-addressed store for prompt and response bodies.
+    Each distinct body is kept once in `blobs` under its SHA-256, compressed
+    with zstd (optionally with a dictionary trained on earlier bodies) or zlib;
+    `prompts` only holds the 64-character digests. Bodies are decompressed
+    only when a caller asks for them.
+    """
+
+    def __init__(self, codec: str = "zstd", level: int = 3):
+        # Only checked here; zstandard itself is imported on first use to keep startup fast
+        if codec == "zstd" and importlib.util.find_spec("zstandard") is None:
+            logger.warning("⚠️ zstandard is not installed, compressing bodies with zlib")
+            codec = "zlib"
+        self.codec = codec
+        self.level = level
+        self._dict_id: Optional[int] = None
+        self._dict_loaded = False
+        self._dicts: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+        # zstd (de)compressors are not thread-safe; keep one set per thread
+        self._local = threading.local()
+
+    @classmethod
+    def from_env(cls) -> "BlobStore":
+        return cls(
+            codec=os.getenv("BLOB_CODEC", "zstd").lower(),
+            level=int(os.getenv("BLOB_COMPRESSION_LEVEL", "3")),
+        )
+
+    def pack(self, *bodies: str) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """Digests for the bodies, plus INSERT_BLOB parameters for each distinct one"""
+        digests, rows = [], {}
+        for body in bodies:
+            digest = body_digest(body)
+            digests.append(digest)
+            if digest not in rows:
+                rows[digest] = self._encode(digest, body.encode("utf-8"))
+        return digests, list(rows.values())
+
+    def get(self, db, digest: str) -> Optional[str]:
+        return self.get_many(db, [digest]).get(digest)
+
+    def get_many(self, db, digests: Iterable[str]) -> Dict[str, str]:
+        digests = list(dict.fromkeys(d for d in digests if d))
+        bodies = {}
+        for start in range(0, len(digests), LOOKUP_CHUNK_SIZE):
+            rows = db.execute(SELECT_BLOBS, {"digests": digests[start:start + LOOKUP_CHUNK_SIZE]}).fetchall()
+            for row in rows:
+                bodies[row.digest] = self._decode(db, row.codec, row.dict_id, row.data).decode("utf-8")
+        return bodies
+
+    def fill_bodies(self, db, rows: List[Dict[str, Any]]):
+        """Replace references with bodies in place; rows written before the blob store keep their inline text"""
+        wanted = [row[ref] for row in rows for _, ref in BODY_COLUMNS if row.get(ref)]
+        bodies = self.get_many(db, wanted)
+        for row in rows:
+            for column, ref in BODY_COLUMNS:
+                if row.get(ref):
+                    row[column] = bodies.get(row[ref])
+
+    def _encode(self, digest: str, raw: bytes) -> Dict[str, Any]:
+        row = {"d": digest, "codec": "raw", "dict": None, "size": len(raw), "data": raw}
+        if len(raw) < MIN_COMPRESS_SIZE:
+            return row
+        if self.codec == "zstd":
+            dict_id = self._current_dict_id()
+            data = self._zstd_compressor(dict_id).compress(raw)
+        else:
+            dict_id, data = None, zlib.compress(raw, self.level)
+        if len(data) < len(raw):
+            row.update({"codec": self.codec, "dict": dict_id, "data": data})
+        return row
+
+    def _decode(self, db, codec: str, dict_id: Optional[int], data: bytes) -> bytes:
+        if codec == "raw":
+            return data
+        if codec == "zlib":
+            return zlib.decompress(data)
+        if codec == "zstd":
+            return self._zstd_decompressor(db, dict_id).decompress(data)
+        raise ValueError(f"Unknown blob codec: {codec}")
+
+    def _current_dict_id(self) -> Optional[int]:
+        """Newest trained dictionary, read once per process; workers pick up a new one on restart"""
+        if not self._dict_loaded:
+            with get_db() as db:
+                row = db.execute(text("SELECT id FROM blob_dicts ORDER BY id DESC LIMIT 1")).fetchone()
+                if row:
+                    self._dictionary(db, row.id)
+            self._dict_id = row.id if row else None
+            self._dict_loaded = True
+        return self._dict_id
+
+    def _dictionary(self, db, dict_id: int):
+        with self._lock:
+            if dict_id not in self._dicts:
+                import zstandard
+                row = db.execute(text("SELECT data FROM blob_dicts WHERE id = :id"), {"id": dict_id}).fetchone()
+                self._dicts[dict_id] = zstandard.ZstdCompressionDict(row.data)
+            return self._dicts[dict_id]
+
+    def _zstd_compressor(self, dict_id: Optional[int]):
+        import zstandard
+        compressors = getattr(self._local, "compressors", None)
+        if compressors is None:
+            compressors = self._local.compressors = {}
+        if dict_id not in compressors:
+            dict_data = self._dicts[dict_id] if dict_id is not None else None
+            compressors[dict_id] = zstandard.ZstdCompressor(level=self.level, dict_data=dict_data)
+        return compressors[dict_id]
+
+    def _zstd_decompressor(self, db, dict_id: Optional[int]):
+        import zstandard
+        decompressors = getattr(self._local, "decompressors", None)
+        if decompressors is None:
+            decompressors = self._local.decompressors = {}
+        if dict_id not in decompressors:
+            dict_data = self._dictionary(db, dict_id) if dict_id is not None else None
+            decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=dict_data)
+        return decompressors[dict_id]
+
+blob_store = BlobStore.from_env()
+
+def train_dictionary(sample_rows: int = 5000, dict_size: int = 112 * 1024) -> Optional[int]:
+    """Train a zstd dictionary on recent bodies; new blobs are compressed with it from the next start"""
+    import zstandard
+    with get_db() as db:
+        rows = [
+            dict(row) for row in db.execute(
+                text("SELECT prompt, response, prompt_ref, response_ref FROM prompts ORDER BY id DESC LIMIT :n"),
+                {"n": sample_rows}
+            ).mappings()
+        ]
+        blob_store.fill_bodies(db, rows)
+    samples = [row[column].encode("utf-8") for row in rows for column, _ in BODY_COLUMNS if row[column]]
+    if len(samples) < 100:
+        logger.warning(f"Only {len(samples)} bodies to sample, not training a dictionary")
+        return None
+    trained = zstandard.train_dictionary(dict_size, samples)
+    with get_db() as db:
+        dict_id = db.execute(
+            text("INSERT INTO blob_dicts (data, created_at) VALUES (:data, :ts) RETURNING id"),
+            {"data": trained.as_bytes(), "ts": datetime.utcnow().isoformat()}
+        ).scalar()
+        db.commit()
+    logger.info(f"📚 Trained blob dictionary {dict_id} from {len(samples)} bodies")
+    return dict_id
+
+def migrate_inline_bodies(batch_size: int = 1000) -> int:
+    """
+    Move bodies of rows written before the blob store into `blobs`, one short
+    transaction per batch so the API keeps writing. Run VACUUM afterwards to
+    give the freed pages back to the filesystem.
+    """
+    moved, after_id = 0, 0
+    while True:
+        with get_db() as db:
+            rows = db.execute(
+                text("""
+                    SELECT id, prompt, response FROM prompts
+                    WHERE id > :after AND prompt_ref IS NULL
+                    ORDER BY id LIMIT :n
+                """),
+                {"after": after_id, "n": batch_size}
+            ).fetchall()
+            if not rows:
+                return moved
+            updates, blobs = [], {}
+            for row in rows:
+                (prompt_ref, response_ref), packed = blob_store.pack(row.prompt, row.response)
+                blobs.update((b["d"], b) for b in packed)
+                updates.append({"id": row.id, "pr": prompt_ref, "rr": response_ref})
+            db.execute(INSERT_BLOB, list(blobs.values()))
+            db.execute(
+                text("UPDATE prompts SET prompt = '', response = '', prompt_ref = :pr, response_ref = :rr WHERE id = :id"),
+                updates
+            )
+            db.commit()
+        moved += len(rows)
+        after_id = rows[-1].id
+        logger.info(f"Moved bodies of {moved} proofs into the blob store")
+
+def blob_stats() -> Dict[str, Any]:
+    with get_db() as db:
+        blobs = db.execute(text("SELECT COUNT(*) AS n, SUM(size) AS raw, SUM(LENGTH(data)) AS stored FROM blobs")).fetchone()
+        refs = db.execute(text("SELECT COUNT(*) FROM prompts WHERE prompt_ref IS NOT NULL")).scalar()
+        inline = db.execute(text("SELECT COUNT(*) FROM prompts WHERE prompt_ref IS NULL")).scalar()
+    return {
+        "blobs": blobs.n,
+        "raw_bytes": blobs.raw or 0,
+        "stored_bytes": blobs.stored or 0,
+        "ratio": round((blobs.raw or 0) / blobs.stored, 2) if blobs.stored else None,
+        "proofs_by_reference": refs,
+        "proofs_inline": inline,
+    }
+
+if __name__ == "__main__":
+    # python blob_store.py migrate --vacuum | train | stats
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)s | %(name)s | %(message)s')
+    parser = argparse.ArgumentParser(description="Maintain the prompt/response blob store")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate = commands.add_parser("migrate", help="Move inline bodies of older proofs into the blob store")
+    migrate.add_argument("--batch-size", type=int, default=1000)
+    migrate.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to shrink the database file")
+    train = commands.add_parser("train", help="Train a zstd dictionary on recent bodies")
+    train.add_argument("--samples", type=int, default=5000)
+    commands.add_parser("stats", help="Blob counts and compression ratio")
+    args = parser.parse_args()
+
+    from database import engine, init_db
+    init_db()
+    if args.command == "migrate":
+        print(f"Migrated {migrate_inline_bodies(args.batch_size)} proofs")
+        if args.vacuum:
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.exec_driver_sql("VACUUM")
+    elif args.command == "train":
+        if train_dictionary(args.samples) is None:
+            sys.exit(1)
+    else:
+        print(blob_stats())
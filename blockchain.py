@@ -1,9 +1,18 @@
 import os
 import json
 import logging
+import threading
 from web3 import Web3, exceptions
+from web3.middleware import Web3Middleware
 from dotenv import load_dotenv
-from typing import Tuple, Optional, Dict, Any
+from typing import Tuple, Optional, Dict, Any, List
+from eth_abi import decode as abi_decode, encode as abi_encode
+
+from nonce_manager import SignerPool, is_nonce_error
+from receipt_tracker import ReceiptTracker
+from fee_oracle import FeeOracle
+from metrics import RPC_REQUESTS, RPC_SECONDS, STAGE_SECONDS, VERIFICATIONS
+from rpc_pool import RpcPoolProvider
 
 # Configure structured logging
 logging.basicConfig(
@@ -16,62 +25,144 @@ logger = logging.getLogger("ProofAnchor")
 Web3Instance = Web3
 Account = Any  # Would use web3.eth.Account if not for circular import
 
-def init_blockchain() -> Tuple[Web3Instance, Optional[Any]]:
+class RpcMetricsMiddleware(Web3Middleware):
+    """Counts and times every JSON-RPC request the Web3 instance makes"""
+
+    def wrap_make_request(self, make_request):
+        def middleware(method, params):
+            RPC_REQUESTS.inc(method=method)
+            with RPC_SECONDS.time(method=method):
+                return make_request(method, params)
+        return middleware
+
+    def wrap_make_batch_request(self, make_batch_request):
+        def middleware(requests_info):
+            for method, _ in requests_info:
+                RPC_REQUESTS.inc(method=method)
+            with RPC_SECONDS.time(method="batch"):
+                return make_batch_request(requests_info)
+        return middleware
+
+# anchorHash(bytes32) calldata is the selector followed by the raw 32-byte hash
+ANCHOR_HASH_SELECTOR = Web3.keccak(text="anchorHash(bytes32)")[:4]
+
+def encode_anchor_call(prompt_hash: bytes) -> bytes:
+    if len(prompt_hash) != 32:
+        raise ValueError("Anchor hash must be 32 bytes")
+    return ANCHOR_HASH_SELECTOR + prompt_hash
+
+class ChainClient:
     """
-    Secure blockchain initialization with enhanced error handling
-    Returns:
-        Tuple: (Web3 instance, Contract object or None)
+    Long-lived chain connection shared by the whole process.
+    The pooled keep-alive HTTP session, contract object, chain id, signer
+    pool, receipt tracker and fee oracle are set up once instead of on every
+    request.
     """
-    load_dotenv()
-    
-    # Validate critical env vars with descriptive errors
-    required_vars = {
-        'WEB3_PROVIDER_URL': 'Ethereum node RPC URL',
-        'CONTRACT_ADDRESS': 'Deployed contract address',
-        'PRIVATE_KEY': 'Wallet private key (optional in read-only mode)'
-    }
-    
-    missing = [var for var in required_vars if not os.getenv(var)]
-    if missing:
-        error_msg = f"Missing blockchain config: {', '.join(missing)}"
-        logger.error(error_msg)
-        raise EnvironmentError(error_msg)
 
-    try:
-        # Initialize Web3 with timeout (removed retries for newer web3.py)
-        w3 = Web3(Web3.HTTPProvider(
-            os.getenv('WEB3_PROVIDER_URL'),
-            request_kwargs={
-                'timeout': 30,  # Increased timeout for Railway
-            }
-        ))
-        
-        if not w3.is_connected():
-            raise ConnectionError("Web3 provider unreachable - check RPC URL")
+    def __init__(self, w3: Web3Instance, contract, chain_id: int):
+        self.w3 = w3
+        self.contract = contract
+        self.chain_id = chain_id
+        if "rpc_metrics" not in w3.middleware_onion:
+            w3.middleware_onion.add(RpcMetricsMiddleware, "rpc_metrics")
+        self._signer_pool: Optional[SignerPool] = None
+        self._receipt_tracker: Optional[ReceiptTracker] = None
+        self._fee_oracle: Optional[FeeOracle] = None
+        # Local chain index (chain_indexer.ChainIndexer), consulted before RPC when attached
+        self.indexer = None
+        self._lock = threading.Lock()
+
+    @property
+    def signer_pool(self) -> SignerPool:
+        with self._lock:
+            if self._signer_pool is None:
+                self._signer_pool = SignerPool.from_env(self.w3)
+            return self._signer_pool
+
+    @property
+    def receipt_tracker(self) -> ReceiptTracker:
+        with self._lock:
+            if self._receipt_tracker is None:
+                self._receipt_tracker = ReceiptTracker.from_env(self.w3)
+            return self._receipt_tracker
+
+    @property
+    def fee_oracle(self) -> FeeOracle:
+        with self._lock:
+            if self._fee_oracle is None:
+                self._fee_oracle = FeeOracle.from_env(self.w3)
+            return self._fee_oracle
+
+    @classmethod
+    def connect(cls) -> "ChainClient":
+        """Secure blockchain initialization with enhanced error handling"""
+        load_dotenv()
         
-        # Get contract instance
-        contract = get_contract(w3)
+        # Validate critical env vars with descriptive errors
+        required_vars = {
+            'WEB3_PROVIDER_URL': 'Ethereum node RPC URL',
+            'CONTRACT_ADDRESS': 'Deployed contract address',
+            'PRIVATE_KEY': 'Wallet private key (optional in read-only mode)'
+        }
         
-        # Secure account initialization with validation
-        account = None
-        if 'PRIVATE_KEY' in os.environ:
-            private_key = os.getenv('PRIVATE_KEY')
-            if not private_key.startswith('0x'):
-                private_key = '0x' + private_key
+        missing = [var for var in required_vars if not os.getenv(var)]
+        if 'PRIVATE_KEY' in missing and os.getenv('PRIVATE_KEYS'):
+            missing.remove('PRIVATE_KEY')
+        if 'WEB3_PROVIDER_URL' in missing and os.getenv('WEB3_PROVIDER_URLS'):
+            missing.remove('WEB3_PROVIDER_URL')
+        if missing:
+            error_msg = f"Missing blockchain config: {', '.join(missing)}"
+            logger.error(error_msg)
+            raise EnvironmentError(error_msg)
+
+        try:
+            # One or more RPC endpoints, each with a keep-alive session sized for the
+            # anchor worker plus concurrent /verify calls; reads are hedged across them
+            provider = RpcPoolProvider.from_env()
+            w3 = Web3(provider)
             
-            account = w3.eth.account.from_key(private_key)
-            logger.info(f"🔐 Account loaded: {account.address}")
-        
-        chain_id = w3.eth.chain_id
-        logger.info(f"✅ Connected to chain {chain_id} (Network ID: {chain_id})")
-        return w3, contract
-        
-    except ValueError as e:
-        logger.error(f"Invalid private key format: {str(e)}")
-        raise
-    except Exception as e:
-        logger.error(f"Blockchain init failed: {str(e)}")
-        raise
+            if not w3.is_connected():
+                raise ConnectionError("Web3 provider unreachable - check RPC URL")
+            logger.info(f"🌐 Using {provider}")
+            
+            # Get contract instance
+            contract = get_contract(w3)
+            chain_id = w3.eth.chain_id
+            client = cls(w3, contract, chain_id)
+            
+            # Secure account initialization with validation
+            if os.getenv('PRIVATE_KEY') or os.getenv('PRIVATE_KEYS'):
+                logger.info(f"🔐 Accounts loaded: {', '.join(s.address for s in client.signer_pool.signers)}")
+            
+            logger.info(f"✅ Connected to chain {chain_id} (Network ID: {chain_id})")
+            return client
+            
+        except ValueError as e:
+            logger.error(f"Invalid private key format: {str(e)}")
+            raise
+        except Exception as e:
+            logger.error(f"Blockchain init failed: {str(e)}")
+            raise
+
+_chain_client: Optional[ChainClient] = None
+_chain_client_lock = threading.Lock()
+
+def get_chain_client() -> ChainClient:
+    """Return the process-wide chain client, connecting on first use"""
+    global _chain_client
+    with _chain_client_lock:
+        if _chain_client is None:
+            _chain_client = ChainClient.connect()
+        return _chain_client
+
+def init_blockchain() -> Tuple[Web3Instance, Optional[Any]]:
+    """
+    Secure blockchain initialization with enhanced error handling
+    Returns:
+        Tuple: (Web3 instance, Contract object or None)
+    """
+    client = get_chain_client()
+    return client.w3, client.contract
 
 def get_contract(w3: Web3Instance):
     """Load contract with enhanced ABI handling and validation"""
@@ -123,73 +214,60 @@ def get_contract(w3: Web3Instance):
     
     return w3.eth.contract(address=contract_address, abi=abi)
 
-def anchor_prompt_hash(prompt_hash: bytes, w3: Web3Instance, contract) -> Dict[str, Any]:
-    """Secure hash anchoring with gas optimization"""
+def send_anchor_transaction(prompt_hash: bytes, client: Optional[ChainClient] = None) -> bytes:
+    """Sign and broadcast an anchorHash transaction without waiting for it to be mined"""
     try:
-        # Get account from environment
-        if 'PRIVATE_KEY' not in os.environ:
-            raise ValueError("No signing account configured")
-        
-        private_key = os.getenv('PRIVATE_KEY')
-        if not private_key.startswith('0x'):
-            private_key = '0x' + private_key
-        
-        account = w3.eth.account.from_key(private_key)
+        client = client or get_chain_client()
+        w3, contract = client.w3, client.contract
+        signer = client.signer_pool.acquire()
+        oracle = client.fee_oracle
+        data = encode_anchor_call(prompt_hash)
         
-        # Gas estimation with fallback
-        try:
-            gas_estimate = contract.functions.anchorHash(prompt_hash).estimate_gas({
-                'from': account.address
-            })
-            gas_limit = int(gas_estimate * 1.2)  # 20% buffer
-        except Exception as e:
-            logger.warning(f"Gas estimation failed, using default: {str(e)}")
-            gas_limit = 200000
-        
-        # Dynamic gas pricing
-        base_fee = w3.eth.get_block('latest').baseFeePerGas
-        max_priority = Web3.to_wei(os.getenv('MAX_PRIORITY_FEE_PER_GAS', '2'), 'gwei')
-        max_fee = base_fee * 2 + max_priority if base_fee else Web3.to_wei('25', 'gwei')
+        # Gas limit is estimated once per selector, fees once per block; no per-tx lookups
+        with STAGE_SECONDS.time(stage="anchor.gas_limit"):
+            gas_limit = oracle.gas_limit(
+                ANCHOR_HASH_SELECTOR,
+                lambda: w3.eth.estimate_gas({'from': signer.address, 'to': contract.address, 'data': data})
+            )
         
         tx = {
-            'chainId': w3.eth.chain_id,
-            'nonce': w3.eth.get_transaction_count(account.address),
+            'chainId': client.chain_id,
             'gas': gas_limit,
-            'maxFeePerGas': max_fee,
-            'maxPriorityFeePerGas': max_priority,
             'to': contract.address,
-            'data': contract.functions.anchorHash(prompt_hash).build_transaction()['data']
+            'data': data
         }
         
-        signed_tx = account.sign_transaction(tx)
-        tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-        
-        logger.info(f"Transaction sent: {tx_hash.hex()}")
-        
-        # Wait for receipt with timeout
-        try:
-            receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=300, poll_latency=5)
-            logger.info(f"Transaction receipt received: {receipt}")
-            
-            if receipt.status != 1:
-                logger.error(f"Transaction failed with status {receipt.status}")
-                raise ValueError(f"Transaction reverted: {tx_hash.hex()}")
-            
-            logger.info(f"✅ Anchored hash in block {receipt.blockNumber}")
-            return receipt
-            
-        except Exception as e:
-            logger.error(f"Error waiting for transaction receipt: {str(e)}")
-            # Check if transaction exists on blockchain
+        # Nonces come from the local counter; a nonce rejection resyncs it and the send is retried once
+        for attempt in range(2):
+            with STAGE_SECONDS.time(stage="anchor.nonce"):
+                tx['nonce'] = signer.nonces.next_nonce()
+            with STAGE_SECONDS.time(stage="anchor.fees"):
+                tx['maxFeePerGas'], tx['maxPriorityFeePerGas'] = oracle.fees()
+            with STAGE_SECONDS.time(stage="anchor.sign"):
+                signed_tx = signer.account.sign_transaction(tx)
             try:
-                tx_info = w3.eth.get_transaction(tx_hash)
-                if tx_info:
-                    logger.error(f"Transaction exists but failed: {tx_info}")
-                else:
-                    logger.error("Transaction not found on blockchain")
-            except Exception as check_error:
-                logger.error(f"Could not check transaction status: {str(check_error)}")
-            raise
+                with STAGE_SECONDS.time(stage="anchor.send"):
+                    tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+                break
+            except Exception as e:
+                if 'already known' in str(e).lower():
+                    # This very transaction is already in the pool; the counter is right
+                    tx_hash = signed_tx.hash
+                    break
+                if 'underpriced' in str(e).lower():
+                    oracle.invalidate()
+                if not is_nonce_error(e):
+                    # Resyncing here would rewind the counter under other in-flight sends
+                    signer.nonces.release(tx['nonce'])
+                    raise
+                signer.nonces.resync()
+                if attempt == 0:
+                    logger.warning(f"Nonce {tx['nonce']} rejected for {signer.address}, resyncing: {str(e)}")
+                    continue
+                raise
+        
+        logger.info(f"Transaction sent: {tx_hash.hex()} (from={signer.address}, nonce={tx['nonce']})")
+        return tx_hash
         
     except exceptions.ContractLogicError as e:
         error_msg = f"Contract error: {e}"
@@ -202,16 +280,52 @@ def anchor_prompt_hash(prompt_hash: bytes, w3: Web3Instance, contract) -> Dict[s
         logger.exception("Blockchain anchoring failed")
         raise RuntimeError("Internal server error")
 
-def verify_on_chain(prompt_hash: bytes) -> Dict[str, Any]:
+def wait_for_anchor_receipt(tx_hash: bytes, client: Optional[ChainClient] = None, timeout: int = 300):
+    """Block until an anchoring transaction is mined and check that it succeeded"""
+    client = client or get_chain_client()
+    try:
+        # Shared per-block batch poll instead of one polling loop per transaction
+        with STAGE_SECONDS.time(stage="anchor.receipt_wait"):
+            receipt = client.receipt_tracker.wait(tx_hash, timeout=timeout)
+        logger.info(f"Transaction receipt received: {receipt}")
+        
+        if receipt.status != 1:
+            logger.error(f"Transaction failed with status {receipt.status}")
+            raise ValueError(f"Transaction reverted: {tx_hash.hex()}")
+        
+        logger.info(f"✅ Anchored hash in block {receipt.blockNumber}")
+        return receipt
+        
+    except ValueError:
+        raise
+    except Exception as e:
+        logger.error(f"Error waiting for transaction receipt: {str(e)}")
+        raise
+
+def anchor_prompt_hash(prompt_hash: bytes, client: Optional[ChainClient] = None) -> Dict[str, Any]:
+    """Secure hash anchoring with gas optimization"""
+    client = client or get_chain_client()
+    tx_hash = send_anchor_transaction(prompt_hash, client)
+    return wait_for_anchor_receipt(tx_hash, client)
+
+def verify_on_chain(prompt_hash: bytes, client: Optional[ChainClient] = None) -> Dict[str, Any]:
     """Robust hash verification with enhanced error handling"""
     try:
-        w3, contract = init_blockchain()
+        client = client or get_chain_client()
+
+        if client.indexer:
+            with STAGE_SECONDS.time(stage="verify.index"):
+                indexed = client.indexer.lookup([prompt_hash]).get(prompt_hash)
+            if indexed:
+                VERIFICATIONS.inc(result="found" if indexed["exists"] else "not_found")
+                return indexed
         
-        # Call with timeout
-        exists, timestamp = contract.functions.verifyHash(prompt_hash).call(
-            block_identifier='latest',
-            timeout=30
-        )
+        # Single eth_call; the request timeout comes from the shared provider session
+        with STAGE_SECONDS.time(stage="verify.call"):
+            exists, timestamp = client.contract.functions.verifyHash(prompt_hash).call(
+                block_identifier='latest'
+            )
+        VERIFICATIONS.inc(result="found" if exists else "not_found")
         
         return {
             "exists": exists,
@@ -219,11 +333,118 @@ def verify_on_chain(prompt_hash: bytes) -> Dict[str, Any]:
             "status": "success"
         }
     except exceptions.ContractLogicError as e:
+        VERIFICATIONS.inc(result="error")
         return {"status": "failed", "error": f"Contract error: {e}"}
     except Exception as e:
+        VERIFICATIONS.inc(result="error")
         logger.error(f"Verification error: {str(e)}")
         return {"status": "failed", "error": "Verification service unavailable"}
 
+# Multicall3 is deployed at the same address on Sepolia, mainnet and most EVM chains
+MULTICALL3_ADDRESS = '0xcA11bde05977b3631167028862bE2a173976CA11'
+MULTICALL3_ABI = [
+    {
+        "inputs": [{
+            "components": [
+                {"internalType": "address", "name": "target", "type": "address"},
+                {"internalType": "bool", "name": "allowFailure", "type": "bool"},
+                {"internalType": "bytes", "name": "callData", "type": "bytes"}
+            ],
+            "internalType": "struct Multicall3.Call3[]",
+            "name": "calls",
+            "type": "tuple[]"
+        }],
+        "name": "aggregate3",
+        "outputs": [{
+            "components": [
+                {"internalType": "bool", "name": "success", "type": "bool"},
+                {"internalType": "bytes", "name": "returnData", "type": "bytes"}
+            ],
+            "internalType": "struct Multicall3.Result[]",
+            "name": "returnData",
+            "type": "tuple[]"
+        }],
+        "stateMutability": "payable",
+        "type": "function"
+    }
+]
+VERIFY_HASH_SELECTOR = Web3.keccak(text="verifyHash(bytes32)")[:4]
+
+def _verify_many_multicall(prompt_hashes: List[bytes], client: ChainClient) -> List[Dict[str, Any]]:
+    multicall = client.w3.eth.contract(
+        address=Web3.to_checksum_address(os.getenv('MULTICALL3_ADDRESS', MULTICALL3_ADDRESS)),
+        abi=MULTICALL3_ABI
+    )
+    chunk_size = int(os.getenv('VERIFY_MULTICALL_CHUNK', '500'))
+    results = []
+    for start in range(0, len(prompt_hashes), chunk_size):
+        chunk = prompt_hashes[start:start + chunk_size]
+        calls = [
+            (client.contract.address, True, VERIFY_HASH_SELECTOR + abi_encode(['bytes32'], [h]))
+            for h in chunk
+        ]
+        for success, data in multicall.functions.aggregate3(calls).call(block_identifier='latest'):
+            if success:
+                exists, timestamp = abi_decode(['bool', 'uint256'], data)
+                results.append({"exists": exists, "timestamp": timestamp, "status": "success"})
+            else:
+                results.append({"status": "failed", "error": "Contract call reverted"})
+    return results
+
+def _verify_many_rpc_batch(prompt_hashes: List[bytes], client: ChainClient) -> List[Dict[str, Any]]:
+    with client.w3.batch_requests() as batch:
+        for h in prompt_hashes:
+            batch.add(client.contract.functions.verifyHash(h))
+        responses = batch.execute()
+    return [
+        {"exists": exists, "timestamp": timestamp, "status": "success"}
+        for exists, timestamp in responses
+    ]
+
+def verify_many_on_chain(prompt_hashes: List[bytes], client: Optional[ChainClient] = None) -> List[Dict[str, Any]]:
+    """
+    Look up many hashes at once, results in input order.
+    Hashes the local chain index can answer skip RPC; the rest use one aggregated
+    Multicall3 eth_call per chunk, falling back to a single JSON-RPC batch of
+    verifyHash calls where Multicall3 is unavailable.
+    """
+    if not prompt_hashes:
+        return []
+    try:
+        client = client or get_chain_client()
+    except Exception as e:
+        logger.error(f"Verification error: {str(e)}")
+        return [{"status": "failed", "error": "Verification service unavailable"} for _ in prompt_hashes]
+
+    if client.indexer:
+        try:
+            with STAGE_SECONDS.time(stage="verify.index"):
+                indexed = client.indexer.lookup(prompt_hashes)
+        except Exception as e:
+            logger.warning(f"Chain index lookup failed, using RPC: {str(e)}")
+            indexed = {}
+        remaining = [h for h in prompt_hashes if h not in indexed]
+        if indexed:
+            fetched = dict(zip(remaining, _verify_many_remote(remaining, client)))
+            return [indexed.get(h) or fetched[h] for h in prompt_hashes]
+
+    return _verify_many_remote(prompt_hashes, client)
+
+def _verify_many_remote(prompt_hashes: List[bytes], client: ChainClient) -> List[Dict[str, Any]]:
+    if not prompt_hashes:
+        return []
+
+    try:
+        return _verify_many_multicall(prompt_hashes, client)
+    except Exception as e:
+        logger.warning(f"Multicall verification failed, falling back to JSON-RPC batch: {str(e)}")
+
+    try:
+        return _verify_many_rpc_batch(prompt_hashes, client)
+    except Exception as e:
+        logger.error(f"Batch verification error: {str(e)}")
+        return [{"status": "failed", "error": "Verification service unavailable"} for _ in prompt_hashes]
+
 # Railway-compatible test function
 def test_blockchain_connection():
     """Test function for deployment verification"""
@@ -252,8 +473,7 @@ if __name__ == "__main__":
     print("\n=== Anchoring Test ===")
     test_hash = hashlib.sha256(b"test").digest()
     try:
-        w3, contract = init_blockchain()
-        result = anchor_prompt_hash(test_hash, w3, contract)
+        result = anchor_prompt_hash(test_hash)
         pprint(result)
         
         print("\n=== Verification Test ===")
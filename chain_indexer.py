@@ -0,0 +1,309 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from hexbytes import HexBytes
+from sqlalchemy import bindparam, text
+
+from blockchain import ANCHOR_HASH_SELECTOR, ChainClient
+from database import get_db
+from receipt_tracker import request_all
+from storage_writer import storage_writer
+
+logger = logging.getLogger("ChainIndexer")
+
+# Hashes of this many recent blocks are kept; a deeper reorg rebuilds the index from scratch
+REORG_DEPTH = 128
+
+INDEX_ANCHOR = text("""
+    INSERT OR REPLACE INTO chain_anchors (tx_hash, anchor_hash, block_number, block_timestamp)
+    VALUES (:tx, :h, :block, :ts)
+""")
+INDEX_BLOCK = text("INSERT OR REPLACE INTO chain_index_blocks (number, hash) VALUES (:n, :h)")
+PRUNE_BLOCKS = text("DELETE FROM chain_index_blocks WHERE number <= :n")
+CHECKPOINT = text("UPDATE chain_index_state SET last_block = :n, updated_at = :ts WHERE id = 1")
+
+# Latest anchoring of each hash; a re-anchor overwrites the contract's timestamp too
+FIND_ANCHORS = text("""
+    SELECT anchor_hash, tx_hash, MAX(block_number) AS block_number, block_timestamp
+    FROM chain_anchors WHERE anchor_hash IN :hs GROUP BY anchor_hash
+""").bindparams(bindparam("hs", expanding=True))
+
+# Our own anchors (leaf hashes or Merkle roots) that may be on chain beyond the indexed head
+RECENT_OWN_ANCHORS = text("""
+    SELECT p.local_hash, p.merkle_root
+    FROM anchor_outbox o JOIN prompts p ON p.local_hash = o.local_hash
+    WHERE o.status IN ('submitted', 'confirmed') AND (o.block_number IS NULL OR o.block_number > :last)
+      AND (p.local_hash IN :hs OR p.merkle_root IN :roots)
+""").bindparams(bindparam("hs", expanding=True), bindparam("roots", expanding=True))
+
+def _int(value) -> int:
+    return int(value, 16) if isinstance(value, str) else int(value)
+
+def _hex(value) -> str:
+    return HexBytes(value).hex()
+
+class ChainIndexer:
+    """
+    Follows the chain from the ProofAnchor deployment block and records every
+    successful anchorHash call (hash, block, block timestamp, tx) in chain_anchors,
+    so verification can be answered locally.
+    ProofAnchor emits no events, so blocks are fetched with their transactions
+    (`batch_blocks` per JSON-RPC batch) and direct calls to the contract are
+    decoded from calldata. Progress is checkpointed in chain_index_state; the
+    hashes of the last REORG_DEPTH blocks are kept, and a block that does not
+    build on the checkpoint rolls the index back to the common ancestor.
+    """
+
+    def __init__(self, client: ChainClient, from_block: Optional[int] = None, batch_blocks: int = 50, poll_interval: float = 4.0, max_lag: int = 2):
+        self.client = client
+        self.from_block = from_block
+        self.batch_blocks = batch_blocks
+        self.poll_interval = poll_interval
+        self.max_lag = max_lag
+        self._contract = client.contract.address.lower()
+        self._start_block: Optional[int] = None
+        self._covers_deploy = False
+        self._last_block: Optional[int] = None
+        self._head: Optional[int] = None
+        self._polled_at = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls, client: ChainClient) -> "ChainIndexer":
+        from_block = os.getenv("CONTRACT_DEPLOY_BLOCK")
+        return cls(
+            client,
+            from_block=int(from_block) if from_block else None,
+            batch_blocks=int(os.getenv("CHAIN_INDEX_BATCH_BLOCKS", "50")),
+            poll_interval=float(os.getenv("CHAIN_INDEX_POLL_INTERVAL", "4")),
+            max_lag=int(os.getenv("CHAIN_INDEX_MAX_LAG", "2")),
+        )
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="chain-indexer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def lag(self) -> Optional[int]:
+        """Blocks between the chain head at the last poll and the indexed head"""
+        if self._head is None or self._last_block is None:
+            return None
+        return max(self._head - self._last_block, 0)
+
+    def is_caught_up(self) -> bool:
+        lag = self.lag()
+        fresh = time.monotonic() - self._polled_at <= max(3 * self.poll_interval, 30)
+        return lag is not None and lag <= self.max_lag and fresh
+
+    def lookup(self, hashes: List[bytes]) -> Dict[bytes, Dict[str, Any]]:
+        """
+        Index answers for the hashes it can vouch for; any hash missing from the
+        result must be checked over RPC. Nothing is answered while the index is
+        behind. A hash absent from the index only counts as not anchored when the
+        index covers the contract's whole history and none of our own anchors of
+        it may have landed after the indexed head.
+        """
+        if not hashes or not self.is_caught_up():
+            return {}
+        last_block = self._last_block
+        keys = {h.hex(): h for h in hashes}
+
+        answers: Dict[bytes, Dict[str, Any]] = {}
+        with get_db() as db:
+            for row in db.execute(FIND_ANCHORS, {"hs": list(keys)}):
+                answers[keys[row.anchor_hash]] = {
+                    "exists": True,
+                    "timestamp": row.block_timestamp,
+                    "block_number": row.block_number,
+                    "tx_hash": f"0x{row.tx_hash}",
+                    "status": "success",
+                    "source": "index"
+                }
+
+            missing = [k for k, h in keys.items() if h not in answers]
+            if not missing or not self._covers_deploy:
+                return answers
+            recent = set()
+            for row in db.execute(RECENT_OWN_ANCHORS, {"hs": missing, "roots": missing, "last": last_block}):
+                recent.update((row.local_hash, row.merkle_root))
+
+        for key in missing:
+            if key not in recent:
+                answers[keys[key]] = {
+                    "exists": False,
+                    "timestamp": 0,
+                    "indexed_block": last_block,
+                    "status": "success",
+                    "source": "index"
+                }
+        return answers
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self._last_block is None:
+                    self._load_state()
+                caught_up = self._step()
+            except Exception as e:
+                logger.warning(f"Index poll failed: {str(e)}")
+                caught_up = True
+            if caught_up:
+                self._stop.wait(self.poll_interval)
+
+    def _load_state(self):
+        w3 = self.client.w3
+        with get_db() as db:
+            state = db.execute(text("SELECT * FROM chain_index_state WHERE id = 1")).fetchone()
+
+        if state and (state.chain_id != self.client.chain_id or state.contract != self._contract):
+            logger.warning("⚠️ Contract or chain changed since the index was built, rebuilding it")
+            storage_writer.write([
+                (text("DELETE FROM chain_anchors"), {}),
+                (text("DELETE FROM chain_index_blocks"), {}),
+                (text("DELETE FROM chain_index_state"), {}),
+            ])
+            state = None
+
+        if state is None:
+            start_block, covers_deploy = self._find_start_block(w3.eth.block_number)
+            storage_writer.write([(
+                text("""
+                    INSERT INTO chain_index_state (id, chain_id, contract, from_block, covers_deploy, last_block, updated_at)
+                    VALUES (1, :chain, :contract, :start, :covers, :last, :ts)
+                """),
+                {"chain": self.client.chain_id, "contract": self._contract, "start": start_block,
+                 "covers": int(covers_deploy), "last": start_block - 1, "ts": datetime.utcnow().isoformat()}
+            )])
+            self._start_block, self._covers_deploy, self._last_block = start_block, covers_deploy, start_block - 1
+        else:
+            self._start_block, self._covers_deploy, self._last_block = state.from_block, bool(state.covers_deploy), state.last_block
+        logger.info(f"📚 Chain index at block {self._last_block} (from block {self._start_block})")
+
+    def _find_start_block(self, head: int) -> Tuple[int, bool]:
+        """Deployment block of the contract: CONTRACT_DEPLOY_BLOCK, else a binary search over eth_getCode"""
+        if self.from_block is not None:
+            return self.from_block, True
+        w3 = self.client.w3
+        address = self.client.contract.address
+        try:
+            if not w3.eth.get_code(address, head):
+                raise ValueError(f"No contract code at {address}")
+            low, high = 0, head
+            while low < high:
+                middle = (low + high) // 2
+                if w3.eth.get_code(address, middle):
+                    high = middle
+                else:
+                    low = middle + 1
+            logger.info(f"🔎 ProofAnchor deployed at block {low}")
+            return low, True
+        except Exception as e:
+            # Non-archive nodes cannot serve old state; only index from here and keep negatives on RPC
+            logger.warning(f"Could not find the deployment block, indexing from head {head}: {str(e)}")
+            return head, False
+
+    def _stored_hash(self, number: int) -> Optional[str]:
+        with get_db() as db:
+            row = db.execute(text("SELECT hash FROM chain_index_blocks WHERE number = :n"), {"n": number}).fetchone()
+        return row.hash if row else None
+
+    def _step(self) -> bool:
+        """Index the next batch of blocks; True once the indexed head has reached the chain head"""
+        w3 = self.client.w3
+        head = w3.eth.block_number
+        self._head, self._polled_at = head, time.monotonic()
+
+        start = self._last_block + 1
+        if start > head:
+            return True
+        end = min(head, start + self.batch_blocks - 1)
+        blocks = request_all(w3, [("eth_getBlockByNumber", [hex(n), True]) for n in range(start, end + 1)])
+
+        parent = self._stored_hash(self._last_block)
+        indexed = []
+        for block in blocks:
+            if not block:
+                break
+            if parent is not None and _hex(block["parentHash"]) != parent:
+                if not indexed:
+                    self._rewind()
+                    return False
+                # The node switched branches mid-batch; the rest is picked up next round
+                break
+            indexed.append(block)
+            parent = _hex(block["hash"])
+        if not indexed:
+            return False
+
+        calls = []
+        for block in indexed:
+            for tx in block["transactions"]:
+                # "input" per the JSON-RPC spec; some test backends call it "data"
+                data = HexBytes(tx.get("input") or tx.get("data") or "0x")
+                if (tx.get("to") or "").lower() == self._contract and len(data) == 36 and data[:4] == ANCHOR_HASH_SELECTOR:
+                    calls.append((block, tx, data[4:]))
+
+        anchors = []
+        if calls:
+            receipts = request_all(w3, [("eth_getTransactionReceipt", [HexBytes(tx["hash"]).to_0x_hex()]) for _, tx, _ in calls])
+            for (block, tx, anchor_hash), receipt in zip(calls, receipts):
+                if not receipt or _hex(receipt["blockHash"]) != _hex(block["hash"]):
+                    raise RuntimeError(f"Receipt for {_hex(tx['hash'])} not available yet")
+                if _int(receipt["status"]) == 1:
+                    anchors.append({
+                        "tx": _hex(tx["hash"]),
+                        "h": anchor_hash.hex(),
+                        "block": _int(block["number"]),
+                        "ts": _int(block["timestamp"])
+                    })
+
+        last = _int(indexed[-1]["number"])
+        ops = [(INDEX_ANCHOR, a) for a in anchors]
+        ops += [(INDEX_BLOCK, {"n": _int(b["number"]), "h": _hex(b["hash"])}) for b in indexed]
+        ops += [
+            (PRUNE_BLOCKS, {"n": last - REORG_DEPTH}),
+            (CHECKPOINT, {"n": last, "ts": datetime.utcnow().isoformat()}),
+        ]
+        storage_writer.write(ops)
+
+        was_caught_up = self.is_caught_up()
+        self._last_block = last
+        if anchors:
+            logger.info(f"Indexed {len(anchors)} anchors in blocks {start}-{last}")
+        if not was_caught_up and self.is_caught_up():
+            logger.info(f"✅ Chain index caught up at block {last}")
+        return last >= head
+
+    def _rewind(self):
+        """Roll the index back to the last block whose stored hash is still on the canonical chain"""
+        w3 = self.client.w3
+        with get_db() as db:
+            stored = db.execute(text("SELECT number, hash FROM chain_index_blocks ORDER BY number DESC")).fetchall()
+
+        ancestor = None
+        if stored:
+            canonical = request_all(w3, [("eth_getBlockByNumber", [hex(row.number), False]) for row in stored])
+            ancestor = next((row.number for row, block in zip(stored, canonical) if block and _hex(block["hash"]) == row.hash), None)
+        if ancestor is None:
+            logger.error(f"❌ Reorg deeper than {REORG_DEPTH} blocks, reindexing from block {self._start_block}")
+            ancestor = self._start_block - 1
+
+        logger.warning(f"🔀 Reorg at block {self._last_block + 1}, rewinding index to block {ancestor}")
+        storage_writer.write([
+            (text("DELETE FROM chain_anchors WHERE block_number > :n"), {"n": ancestor}),
+            (text("DELETE FROM chain_index_blocks WHERE number > :n"), {"n": ancestor}),
+            (CHECKPOINT, {"n": ancestor, "ts": datetime.utcnow().isoformat()}),
+        ])
+        self._last_block = ancestor
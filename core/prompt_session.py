@@ -1,35 +1,72 @@
 import os
 import sqlite3
 import hashlib
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI  # ✅ Modern SDK
 
+# SQLite caps bound parameters per statement; stay well under it for IN (...) lookups
+VERIFY_CHUNK_SIZE = 500
+
 class PromptSession:
     """
     Manages GPT interactions and logs prompt-response pairs into a local SQLite database.
+    Keeps one WAL-mode connection for the life of the session; it is shared across
+    threads behind a lock, so the session can be used from a thread pool.
     """
 
-    def __init__(self, api_key, db_path="db/logs.db"):
+    def __init__(self, api_key, db_path="db/logs.db", max_workers=8):
         self.client = OpenAI(api_key=api_key)
         self.db_path = db_path
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
         self._init_db()
 
     def _init_db(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS prompts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                prompt TEXT,
-                response TEXT,
-                hash TEXT,
-                timestamp TEXT
-            )
-        ''')
-        conn.commit()
-        conn.close()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS prompts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    prompt TEXT,
+                    response TEXT,
+                    hash TEXT,
+                    timestamp TEXT
+                )
+            ''')
+            # Non-unique: existing databases may hold the same proof more than once. See enforce_unique_hashes()
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_prompts_hash_lookup ON prompts(hash)")
+            self._conn.commit()
 
-    def ask_gpt(self, prompt):
+    def enforce_unique_hashes(self):
+        """
+        Opt-in migration to one row per proof hash. Returns the duplicated hashes
+        with their row counts; the unique index is only created when there are
+        none, so resolving existing duplicates stays a deliberate, manual step.
+        """
+        with self._lock:
+            duplicates = dict(self._conn.execute(
+                "SELECT hash, COUNT(*) FROM prompts WHERE hash IS NOT NULL GROUP BY hash HAVING COUNT(*) > 1"
+            ).fetchall())
+            if not duplicates:
+                self._conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_prompts_hash ON prompts(hash)")
+                self._conn.commit()
+        return duplicates
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _complete(self, prompt):
         response = self.client.chat.completions.create(
             model="gpt-4",
             messages=[{"role": "user", "content": prompt}]
@@ -40,40 +77,88 @@ class PromptSession:
         hash_hex = hashlib.sha256(combined.encode('utf-8')).hexdigest()
         timestamp = datetime.utcnow().isoformat()
 
-        self._log_to_db(prompt, result, hash_hex, timestamp)
-
         return {
+            "prompt": prompt,
             "response": result,
             "hash": hash_hex,
             "timestamp": timestamp
         }
 
-    def _log_to_db(self, prompt, response, hash_hex, timestamp):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO prompts (prompt, response, hash, timestamp) VALUES (?, ?, ?, ?)",
-            (prompt, response, hash_hex, timestamp)
-        )
-        conn.commit()
-        conn.close()
+    def ask_gpt(self, prompt):
+        record = self._complete(prompt)
+        self._log_to_db([record])
+
+        return {
+            "response": record["response"],
+            "hash": record["hash"],
+            "timestamp": record["timestamp"]
+        }
+
+    def ask_many(self, prompts):
+        """
+        Run completions for all prompts concurrently (up to max_workers at a time)
+        and store them in one transaction. Results are returned in input order;
+        a failed completion is returned as {"error": ...} and not stored.
+        """
+        def attempt(prompt):
+            try:
+                return self._complete(prompt)
+            except Exception as e:
+                return {"prompt": prompt, "error": str(e)}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            records = list(pool.map(attempt, prompts))
+
+        self._log_to_db([r for r in records if "error" not in r])
+
+        return [
+            r if "error" in r else {"response": r["response"], "hash": r["hash"], "timestamp": r["timestamp"]}
+            for r in records
+        ]
+
+    def _log_to_db(self, records):
+        """
+        Store the records, then set each one's timestamp to that of the proof's stored
+        record, which verify_hash returns: the first logged if the same prompt and
+        response were logged before.
+        """
+        if not records:
+            return
+        with self._lock:
+            # Ignored only once enforce_unique_hashes() has added the unique index
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO prompts (prompt, response, hash, timestamp) VALUES (?, ?, ?, ?)",
+                [(r["prompt"], r["response"], r["hash"], r["timestamp"]) for r in records]
+            )
+            self._conn.commit()
+            stored = self._lookup([r["hash"] for r in records])
+        for r in records:
+            r["timestamp"] = stored[r["hash"]]["timestamp"]
 
     def verify_hash(self, hash_val):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT prompt, response, timestamp FROM prompts WHERE hash = ?",
-            (hash_val,)
-        )
-        row = cursor.fetchone()
-        conn.close()
-
-        if row:
-            return {
-                "prompt": row[0],
-                "response": row[1],
-                "timestamp": row[2]
-            }
-        else:
-            return None
+        return self.verify_many([hash_val])[hash_val]
+
+    def verify_many(self, hashes):
+        """Look up many hashes with a few indexed IN queries; returns {hash: record or None}"""
+        with self._lock:
+            return self._lookup(hashes)
+
+    def _lookup(self, hashes):
+        hashes = list(dict.fromkeys(hashes))
+        found = {}
+        for start in range(0, len(hashes), VERIFY_CHUNK_SIZE):
+            chunk = hashes[start:start + VERIFY_CHUNK_SIZE]
+            placeholders = ", ".join("?" for _ in chunk)
+            rows = self._conn.execute(
+                f"SELECT hash, prompt, response, timestamp FROM prompts WHERE hash IN ({placeholders}) ORDER BY id",
+                chunk
+            ).fetchall()
+            for row in rows:
+                # With duplicate rows, the first logged is the proof's record
+                found.setdefault(row[0], {
+                    "prompt": row[1],
+                    "response": row[2],
+                    "timestamp": row[3]
+                })
 
+        return {h: found.get(h) for h in hashes}
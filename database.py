@@ -0,0 +1,207 @@
+import os
+import logging
+from contextlib import contextmanager
+from typing import Dict
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+logger = logging.getLogger("ProofOfPromptDB")
+
+load_dotenv()
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///proofs.db")
+engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# WAL lets readers run alongside the writer; synchronous=FULL keeps every commit durable
+SQLITE_PRAGMAS: Dict[str, str] = {
+    "journal_mode": "WAL",
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "FULL"),
+    "busy_timeout": "5000",
+    "temp_store": "MEMORY",
+    "cache_size": "-65536",
+    "mmap_size": "268435456",
+}
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+@contextmanager
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Columns added after the original schema; existing databases get them via ALTER TABLE
+PROMPT_COLUMNS: Dict[str, str] = {
+    "merkle_root": "TEXT NULL",
+    "leaf_index": "INTEGER NULL",
+    "merkle_proof": "TEXT NULL",
+    # SHA-256 of the body in `blobs`; prompt/response are left empty for rows stored by reference
+    "prompt_ref": "TEXT NULL",
+    "response_ref": "TEXT NULL",
+}
+
+OUTBOX_COLUMNS: Dict[str, str] = {
+    "group_id": "TEXT NULL",
+    "group_open": "INTEGER NOT NULL DEFAULT 0",
+    # prompts.id this entry anchors; NULL for entries queued before the link existed
+    "prompt_id": "INTEGER NULL",
+}
+
+INSERT_PROMPT = text(
+    "INSERT INTO prompts (prompt, response, prompt_ref, response_ref, timestamp, local_hash, model, temperature) "
+    "VALUES ('', '', :pr, :rr, :t, :h, :m, :temp)"
+)
+
+def _add_missing_columns(conn, table: str, columns: Dict[str, str]):
+    existing = {row[1] for row in conn.execute(text(f"PRAGMA table_info({table})"))}
+    for name, ddl in columns.items():
+        if name not in existing:
+            logger.info(f"Adding column {table}.{name}")
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+def init_db():
+    logger.info("Initializing database...")
+    with engine.begin() as conn:
+        conn.execute(text('''
+            CREATE TABLE IF NOT EXISTS prompts (
+                id INTEGER PRIMARY KEY,
+                prompt TEXT NOT NULL,
+                response TEXT NOT NULL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                local_hash TEXT NOT NULL,
+                blockchain_tx TEXT NULL,
+                model TEXT NOT NULL,
+                temperature REAL NULL
+            )
+        '''))
+        _add_missing_columns(conn, "prompts", PROMPT_COLUMNS)
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_hash ON prompts(local_hash)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_tx ON prompts(blockchain_tx)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_merkle_root ON prompts(merkle_root)"))
+        # Deduplicated, compressed prompt and response bodies keyed by SHA-256 (see blob_store.py)
+        conn.execute(text('''
+            CREATE TABLE IF NOT EXISTS blobs (
+                digest TEXT PRIMARY KEY,
+                codec TEXT NOT NULL,
+                dict_id INTEGER NULL,
+                size INTEGER NOT NULL,
+                data BLOB NOT NULL
+            )
+        '''))
+        conn.execute(text('''
+            CREATE TABLE IF NOT EXISTS blob_dicts (
+                id INTEGER PRIMARY KEY,
+                data BLOB NOT NULL,
+                created_at TEXT NOT NULL
+            )
+        '''))
+        # Durable outbox of hashes waiting to be anchored by the background worker
+        conn.execute(text('''
+            CREATE TABLE IF NOT EXISTS anchor_outbox (
+                id INTEGER PRIMARY KEY,
+                local_hash TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                claim_id TEXT NULL,
+                lease_until REAL NULL,
+                tx_hash TEXT NULL,
+                block_number INTEGER NULL,
+                gas_used INTEGER NULL,
+                error TEXT NULL,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        '''))
+        _add_missing_columns(conn, "anchor_outbox", OUTBOX_COLUMNS)
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_outbox_status ON anchor_outbox(status, next_attempt_at)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_outbox_hash ON anchor_outbox(local_hash)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_outbox_claim ON anchor_outbox(claim_id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_outbox_group ON anchor_outbox(group_id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_outbox_prompt ON anchor_outbox(prompt_id)"))
+        # Which process may send from each signing account (see anchor_outbox.renew_signer_leases)
+        conn.execute(text('''
+            CREATE TABLE IF NOT EXISTS signer_leases (
+                address TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                lease_until REAL NOT NULL
+            )
+        '''))
+        # Offline batch jobs and their per-item results, in completion order
+        conn.execute(text('''
+            CREATE TABLE IF NOT EXISTS batch_jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                completed INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        '''))
+        conn.execute(text('''
+            CREATE TABLE IF NOT EXISTS batch_job_results (
+                id INTEGER PRIMARY KEY,
+                job_id TEXT NOT NULL,
+                item_index INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                local_hash TEXT NULL,
+                error TEXT NULL,
+                completed_at TEXT NOT NULL
+            )
+        '''))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_job_results ON batch_job_results(job_id, id)"))
+        # Local index of anchorHash calls seen on chain, one row per transaction
+        conn.execute(text('''
+            CREATE TABLE IF NOT EXISTS chain_anchors (
+                tx_hash TEXT PRIMARY KEY,
+                anchor_hash TEXT NOT NULL,
+                block_number INTEGER NOT NULL,
+                block_timestamp INTEGER NOT NULL
+            )
+        '''))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_chain_anchor_hash ON chain_anchors(anchor_hash, block_number)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_chain_anchor_block ON chain_anchors(block_number)"))
+        # Hashes of recently indexed blocks, to detect reorgs and find the common ancestor
+        conn.execute(text('''
+            CREATE TABLE IF NOT EXISTS chain_index_blocks (
+                number INTEGER PRIMARY KEY,
+                hash TEXT NOT NULL
+            )
+        '''))
+        conn.execute(text('''
+            CREATE TABLE IF NOT EXISTS chain_index_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                chain_id INTEGER NOT NULL,
+                contract TEXT NOT NULL,
+                from_block INTEGER NOT NULL,
+                covers_deploy INTEGER NOT NULL,
+                last_block INTEGER NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        '''))
+        # Full-text index over prompt and response, keyed by prompts.id (see search_index.py).
+        # Contentless: the text already lives in `blobs`, so only the index itself is stored
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS proof_search USING fts5(prompt, response, content='', tokenize='unicode61 remove_diacritics 2')"
+        ))
+        conn.execute(text('''
+            CREATE TABLE IF NOT EXISTS search_index_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                next_id INTEGER NOT NULL,
+                end_id INTEGER NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        '''))
+    logger.info("Database initialized.")
@@ -0,0 +1,158 @@
+import sys
+import json
+import argparse
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import text
+
+from database import get_db
+from blob_store import blob_store
+
+EXPORT_FORMATS = ("ndjson", "parquet", "arrow")
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+# Rows per keyset page; also the row-group / record-batch size for columnar output
+EXPORT_PAGE_SIZE = 1000
+
+# Latest outbox entry per hash. Rows anchored before the outbox existed only have blockchain_tx.
+EXPORT_PAGE = """
+    SELECT p.id, p.local_hash, p.prompt, p.response, p.prompt_ref, p.response_ref, p.timestamp, p.model, p.temperature,
+           COALESCE(p.blockchain_tx, o.tx_hash) AS anchor_tx, o.block_number,
+           COALESCE(o.status, CASE WHEN p.blockchain_tx IS NOT NULL THEN 'confirmed' ELSE 'none' END) AS anchor_status,
+           p.merkle_root, p.leaf_index, p.merkle_proof
+    FROM prompts p
+    LEFT JOIN anchor_outbox o ON o.id = (SELECT MAX(id) FROM anchor_outbox WHERE local_hash = p.local_hash)
+    WHERE p.id > :after {filters}
+    ORDER BY p.id
+    LIMIT :limit
+"""
+
+def _page_query(since: Optional[str], until: Optional[str], model: Optional[str], anchor_status: Optional[str]):
+    filters = []
+    if since:
+        filters.append("AND p.timestamp >= :since")
+    if until:
+        filters.append("AND p.timestamp < :until")
+    if model:
+        filters.append("AND p.model = :model")
+    if anchor_status:
+        filters.append("AND COALESCE(o.status, CASE WHEN p.blockchain_tx IS NOT NULL THEN 'confirmed' ELSE 'none' END) = :status")
+    return text(EXPORT_PAGE.format(filters=" ".join(filters)))
+
+def iter_proof_pages(since: Optional[str] = None, until: Optional[str] = None, model: Optional[str] = None,
+                     anchor_status: Optional[str] = None, after_id: int = 0, bodies: bool = True,
+                     page_size: int = EXPORT_PAGE_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Walk `prompts` in id order, one page at a time, resuming from the last id seen.
+    Each page is its own short read transaction, so an export never pins an old
+    WAL snapshot or holds up the writer, and memory stays at one page.
+    With `bodies=False` only the body digests are exported and nothing is decompressed.
+    """
+    query = _page_query(since, until, model, anchor_status)
+    params = {"since": since, "until": until, "model": model, "status": anchor_status, "limit": page_size}
+    while True:
+        with get_db() as db:
+            rows = [dict(row) for row in db.execute(query, dict(params, after=after_id)).mappings()]
+            if bodies:
+                blob_store.fill_bodies(db, rows)
+        if not rows:
+            return
+        if not bodies:
+            for row in rows:
+                row["prompt"] = row["response"] = None
+        after_id = rows[-1]["id"]
+        yield rows
+
+def ndjson_chunks(pages: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    for page in pages:
+        lines = []
+        for row in page:
+            row["merkle_proof"] = json.loads(row["merkle_proof"]) if row["merkle_proof"] else None
+            lines.append(json.dumps(row, ensure_ascii=False))
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+class _ChunkSink:
+    """Write-only file object that hands back whatever was written since the last drain"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def columnar_chunks(pages: Iterator[List[Dict[str, Any]]], fmt: str) -> Iterator[bytes]:
+    """Parquet (one row group per page) or Arrow IPC stream (one record batch per page)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("id", pa.int64()), ("local_hash", pa.string()), ("prompt", pa.string()), ("response", pa.string()),
+        ("prompt_ref", pa.string()), ("response_ref", pa.string()),
+        ("timestamp", pa.string()), ("model", pa.string()), ("temperature", pa.float64()),
+        ("anchor_tx", pa.string()), ("block_number", pa.int64()), ("anchor_status", pa.string()),
+        ("merkle_root", pa.string()), ("leaf_index", pa.int64()), ("merkle_proof", pa.string()),
+    ])
+    sink = _ChunkSink()
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+        write = writer.write_table
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+        write = writer.write
+    for page in pages:
+        write(pa.Table.from_pylist(page, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+def export_chunks(fmt: str = "ndjson", **filters) -> Iterator[bytes]:
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if fmt != "ndjson":
+        # Checked up front: once a response has started streaming it can no longer report an error
+        try:
+            import pyarrow
+        except ImportError:
+            raise RuntimeError(f"{fmt} export needs pyarrow (pip install pyarrow)")
+    pages = iter_proof_pages(**filters)
+    return ndjson_chunks(pages) if fmt == "ndjson" else columnar_chunks(pages, fmt)
+
+if __name__ == "__main__":
+    # python export.py --format parquet --since 2025-01-01 --out proofs.parquet
+    parser = argparse.ArgumentParser(description="Stream proofs out of the database")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    parser.add_argument("--out", help="Output file (default: stdout)")
+    parser.add_argument("--since", help="Earliest timestamp, inclusive (ISO 8601, UTC)")
+    parser.add_argument("--until", help="Latest timestamp, exclusive (ISO 8601, UTC)")
+    parser.add_argument("--model")
+    parser.add_argument("--anchor-status", help="pending, submitted, confirmed, failed or none")
+    parser.add_argument("--after-id", type=int, default=0, help="Resume after this proof id")
+    parser.add_argument("--no-bodies", action="store_true", help="Export body digests only, without prompt and response text")
+    args = parser.parse_args()
+
+    out = open(args.out, "wb") if args.out else sys.stdout.buffer
+    written = 0
+    for chunk in export_chunks(args.format, since=args.since, until=args.until, model=args.model,
+                               anchor_status=args.anchor_status, after_id=args.after_id, bodies=not args.no_bodies):
+        out.write(chunk)
+        written += len(chunk)
+    if args.out:
+        out.close()
+        print(f"Exported {written} bytes to {args.out}", file=sys.stderr)
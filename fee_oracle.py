@@ -0,0 +1,69 @@
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from web3 import Web3
+
+logger = logging.getLogger("FeeOracle")
+
+class FeeOracle:
+    """
+    Fee and gas-limit cache for outgoing transactions.
+    Base fee is read at most once per `ttl` seconds (about one block) and
+    shared by every transaction signed in that window; gas limits are
+    estimated once per function selector and reused, since anchoring the
+    next hash costs the same as the last one.
+    """
+
+    def __init__(self, w3, ttl: float = 12.0, max_priority_gwei: str = "2", gas_buffer: float = 1.2, default_gas: int = 200000):
+        self.w3 = w3
+        self.ttl = ttl
+        self.max_priority = Web3.to_wei(max_priority_gwei, 'gwei')
+        self.gas_buffer = gas_buffer
+        self.default_gas = default_gas
+        self._fees: Optional[Tuple[int, int]] = None
+        self._fees_at = 0.0
+        self._gas_limits: Dict[bytes, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, w3) -> "FeeOracle":
+        return cls(
+            w3,
+            ttl=float(os.getenv("FEE_CACHE_TTL", "12")),
+            max_priority_gwei=os.getenv("MAX_PRIORITY_FEE_PER_GAS", "2"),
+        )
+
+    def fees(self) -> Tuple[int, int]:
+        """(maxFeePerGas, maxPriorityFeePerGas) for a transaction sent now"""
+        with self._lock:
+            if self._fees is None or time.monotonic() - self._fees_at > self.ttl:
+                base_fee = self.w3.eth.get_block('latest').baseFeePerGas
+                # Twice the base fee leaves headroom for several full blocks of increases
+                max_fee = base_fee * 2 + self.max_priority if base_fee else Web3.to_wei('25', 'gwei')
+                self._fees = (max_fee, self.max_priority)
+                self._fees_at = time.monotonic()
+            return self._fees
+
+    def gas_limit(self, selector: bytes, estimate: Callable[[], int]) -> int:
+        with self._lock:
+            cached = self._gas_limits.get(selector)
+        if cached is not None:
+            return cached
+        try:
+            limit = int(estimate() * self.gas_buffer)
+        except Exception as e:
+            # Not cached, so the next transaction tries the estimate again
+            logger.warning(f"Gas estimation failed, using default: {str(e)}")
+            return self.default_gas
+        with self._lock:
+            self._gas_limits[selector] = limit
+        logger.info(f"Gas limit for selector 0x{selector.hex()} cached at {limit}")
+        return limit
+
+    def invalidate(self):
+        """Forget cached fees, e.g. after the node rejected a transaction as underpriced"""
+        with self._lock:
+            self._fees = None
@@ -0,0 +1,248 @@
+import os
+import re
+import json
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from metrics import LLM_SHED, STAGE_SECONDS
+
+logger = logging.getLogger("LLMScheduler")
+
+# Lower runs first. Interactive requests are shed when they would wait too long; batch work waits its turn
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+# Rough tokens per character for English text, and per-message overhead in the chat format
+CHARS_PER_TOKEN = 4
+TOKENS_PER_MESSAGE = 4
+
+class Overloaded(Exception):
+    """No budget for this request within its wait limit; the caller should back off for `retry_after` seconds"""
+
+    def __init__(self, model: str, retry_after: float):
+        super().__init__(f"LLM capacity for {model} exhausted, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+def estimate_tokens(messages: List[Dict[str, str]], max_tokens: int) -> int:
+    """What the API charges against TPM up front: prompt length estimated from characters, plus max_tokens"""
+    prompt = sum(len(m.get("content") or "") for m in messages) // CHARS_PER_TOKEN
+    return prompt + TOKENS_PER_MESSAGE * len(messages) + max_tokens
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """OpenAI reset headers look like '1s', '6m0s' or '120ms'"""
+    if not value:
+        return None
+    seconds = 0.0
+    for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        seconds += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return seconds
+
+def _retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        # Retry-After may also be an HTTP date; fall back to the reset headers
+        pass
+    return None
+
+class _Budget:
+    """Per-minute allowance refilled continuously, the way the API replenishes it"""
+
+    def __init__(self, limit: Optional[float]):
+        self.limit = limit
+        self.level = limit
+        self.blocked_until = 0.0
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        if self.limit is not None:
+            self.level = min(self.limit, self.level + (now - self.updated) * self.limit / 60)
+        self.updated = now
+
+    def wait_for(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be spent; 0 while the limit is still unknown"""
+        blocked = max(self.blocked_until - now, 0)
+        if self.limit is None:
+            return blocked
+        # A request bigger than the whole allowance waits for a full bucket rather than forever
+        deficit = min(amount, self.limit) - self.level
+        return max(blocked, deficit * 60 / self.limit if deficit > 0 else 0)
+
+    def spend(self, amount: float):
+        if self.limit is not None:
+            self.level -= min(amount, self.limit)
+
+    def sync(self, limit: Optional[str], remaining: Optional[str]):
+        if limit:
+            if self.limit is None:
+                self.level = float(limit)
+            self.limit = float(limit)
+        if remaining and self.limit is not None:
+            # Never raise the level: the header may predate requests admitted since
+            self.level = min(self.level, float(remaining))
+
+class _ModelState:
+    def __init__(self, rpm: Optional[float], tpm: Optional[float]):
+        self.requests = _Budget(rpm)
+        self.tokens = _Budget(tpm)
+        # (priority, arrival, estimated tokens, waiter)
+        self.queue: List[Tuple[int, int, int, asyncio.Future]] = []
+        self.wake = asyncio.Event()
+        self.dispatcher: Optional[asyncio.Task] = None
+
+    def wait_for(self, requests: int, tokens: int) -> float:
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        return max(self.requests.wait_for(requests, now), self.tokens.wait_for(tokens, now))
+
+    def spend(self, tokens: int):
+        self.requests.spend(1)
+        self.tokens.spend(tokens)
+
+class LLMScheduler:
+    """
+    Admission control in front of the model client.
+    Each model has a requests-per-minute and a tokens-per-minute budget. They
+    start from LLM_RPM_LIMIT / LLM_TPM_LIMIT, or are learned from the first
+    response, and are corrected from the x-ratelimit-* headers on every
+    response, which also reflect what other workers on the same key used. A
+    request is admitted only when both budgets cover it; otherwise it queues
+    by priority. Interactive work that would wait longer than its limit, or
+    that finds the queue full, is rejected at once with Overloaded instead of
+    being sent into a 429 and retried.
+    """
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None,
+                 model_limits: Optional[Dict[str, Dict[str, float]]] = None,
+                 max_queue: int = 1000, max_wait: float = 30.0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.model_limits = model_limits or {}
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._models: Dict[str, _ModelState] = {}
+        self._seq = itertools.count()
+
+    @classmethod
+    def from_env(cls) -> "LLMScheduler":
+        rpm = float(os.getenv("LLM_RPM_LIMIT", "0"))
+        tpm = float(os.getenv("LLM_TPM_LIMIT", "0"))
+        return cls(
+            rpm=rpm or None,
+            tpm=tpm or None,
+            model_limits=json.loads(os.getenv("LLM_MODEL_LIMITS", "{}")),
+            max_queue=int(os.getenv("LLM_QUEUE_MAX", "1000")),
+            max_wait=float(os.getenv("LLM_QUEUE_MAX_WAIT", "30")),
+        )
+
+    def _state(self, model: str) -> _ModelState:
+        state = self._models.get(model)
+        if state is None:
+            limits = self.model_limits.get(model, {})
+            state = self._models[model] = _ModelState(limits.get("rpm", self.rpm), limits.get("tpm", self.tpm))
+        return state
+
+    async def acquire(self, model: str, tokens: int, priority: int = PRIORITY_INTERACTIVE):
+        """
+        Wait until the request fits the model's budgets and spend them.
+        Interactive requests give up with Overloaded after LLM_QUEUE_MAX_WAIT;
+        batch requests wait as long as it takes.
+        """
+        state = self._state(model)
+        if not state.queue and state.wait_for(1, tokens) == 0:
+            state.spend(tokens)
+            return
+
+        max_wait = self.max_wait if priority < PRIORITY_BATCH else None
+        if max_wait is not None:
+            # Time until everything queued ahead of this request, and then this request, fits the budgets
+            ahead = [queued for p, _, queued, waiter in state.queue if p <= priority and not waiter.done()]
+            expected = state.wait_for(len(ahead) + 1, sum(ahead) + tokens)
+            if len(state.queue) >= self.max_queue or expected > max_wait:
+                LLM_SHED.inc(model=model)
+                raise Overloaded(model, max(expected, 1.0))
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(state.queue, (priority, next(self._seq), tokens, waiter))
+        state.wake.set()
+        if state.dispatcher is None or state.dispatcher.done():
+            state.dispatcher = asyncio.create_task(self._dispatch(state))
+
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), max_wait)
+        except asyncio.TimeoutError:
+            waiter.cancel()
+            LLM_SHED.inc(model=model)
+            raise Overloaded(model, max(state.wait_for(1, tokens), 1.0))
+        except asyncio.CancelledError:
+            waiter.cancel()
+            raise
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage="llm.queue")
+
+    async def _dispatch(self, state: _ModelState):
+        """Admit queued requests in priority order as the budgets refill"""
+        while state.queue:
+            priority, seq, tokens, waiter = state.queue[0]
+            if waiter.done():
+                # Timed out or cancelled while queued
+                heapq.heappop(state.queue)
+                continue
+            delay = state.wait_for(1, tokens)
+            if delay == 0:
+                heapq.heappop(state.queue)
+                state.spend(tokens)
+                waiter.set_result(None)
+                continue
+            # Sleep until the head fits, or until a new arrival or header update changes the picture
+            state.wake.clear()
+            try:
+                await asyncio.wait_for(state.wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def observe(self, model: str, headers: Mapping[str, str]):
+        """Correct the budgets from a response's rate-limit headers"""
+        state = self._state(model)
+        state.requests.sync(headers.get("x-ratelimit-limit-requests"), headers.get("x-ratelimit-remaining-requests"))
+        state.tokens.sync(headers.get("x-ratelimit-limit-tokens"), headers.get("x-ratelimit-remaining-tokens"))
+        state.wake.set()
+
+    def throttled(self, model: str, headers: Mapping[str, str]):
+        """A 429 got through anyway: stop admitting for this model until the API says it has reset"""
+        self.observe(model, headers)
+        state = self._state(model)
+        now = time.monotonic()
+        pause = _retry_after(headers) or max(
+            parse_reset(headers.get("x-ratelimit-reset-requests")) or 0,
+            parse_reset(headers.get("x-ratelimit-reset-tokens")) or 0
+        ) or 1.0
+        for budget in (state.requests, state.tokens):
+            budget.blocked_until = max(budget.blocked_until, now + pause)
+            if budget.limit is not None:
+                budget.level = min(budget.level, 0)
+        logger.warning(f"⚠️ {model} rate limited, pausing admission for {pause:.1f}s")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            model: {
+                "queued": len(state.queue),
+                "rpm_limit": state.requests.limit,
+                "tpm_limit": state.tokens.limit,
+                "requests_available": round(state.requests.level, 1) if state.requests.level is not None else None,
+                "tokens_available": round(state.tokens.level) if state.tokens.level is not None else None,
+            }
+            for model, state in self._models.items()
+        }
+
+    def queue_depth(self) -> int:
+        return sum(len(state.queue) for state in self._models.values())
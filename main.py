@@ -1,23 +1,32 @@
 import os
+import json
+import asyncio
+import math
+import time
 import hashlib
 import logging
+import threading
 from datetime import datetime
-from typing import Optional
-from contextlib import contextmanager
+from typing import Dict, List, Optional
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field, confloat
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
-from slowapi import Limiter
-from slowapi.util import get_remote_address
-from slowapi.middleware import SlowAPIMiddleware
-from blockchain import anchor_prompt_hash, verify_on_chain, init_blockchain
+from sqlalchemy import bindparam, text
 from dotenv import load_dotenv
-from openai import OpenAI, APIConnectionError, RateLimitError, APIError
 
-from prompt_handler import generate_proof
+from database import INSERT_PROMPT, get_db, init_db as init_database
+from merkle import compute_merkle_root
+from anchor_outbox import ENQUEUE_ANCHOR, get_anchor_status, outbox_entry
+from blob_store import INSERT_BLOB, blob_store
+from storage_writer import storage_writer
+from metrics import HTTP_REQUESTS, HTTP_SECONDS, REGISTRY, STAGE_SECONDS
+from response_cache import ResponseCache
+from batch_jobs import BatchJobRunner
+from rate_limiter import RateLimiter
+from llm_scheduler import Overloaded
+from search_index import INDEX_PROOF, SearchBackfill, index_entry, search_proofs
 
 # Setup logging
 logging.basicConfig(
@@ -38,24 +47,47 @@ logger.info(f"Python version: {os.sys.version}")
 # Validate critical env vars
 required_env_vars = ['OPENAI_API_KEY', 'CONTRACT_ADDRESS', 'WEB3_PROVIDER_URL']
 missing_vars = [v for v in required_env_vars if not os.getenv(v)]
+if 'WEB3_PROVIDER_URL' in missing_vars and os.getenv('WEB3_PROVIDER_URLS'):
+    missing_vars.remove('WEB3_PROVIDER_URL')
 if missing_vars:
     logger.critical(f"Missing environment variables: {missing_vars}")
     # Don't crash immediately - might be running in test mode
     if os.environ.get("ENVIRONMENT") == "production":
         raise RuntimeError(f"Missing critical environment variables: {missing_vars}")
 
-# Database setup - just create engine here
-DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///proofs.db")
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# "fast" accepts traffic as soon as the database is ready and loads the OpenAI SDK and the
+# chain connection in a background thread; "blocking" finishes both before serving
+STARTUP_MODE = os.environ.get("STARTUP_MODE", "fast").lower()
 
-@contextmanager
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Anchoring mode: "single" sends one transaction per proof, "batch" anchors Merkle roots
+ANCHOR_MODE = os.environ.get("ANCHOR_MODE", "single").lower()
+
+# Upper bound on items per /verify/batch request
+VERIFY_BATCH_MAX = int(os.environ.get("VERIFY_BATCH_MAX", "100"))
+
+# Opt-in cache of stored proofs for repeated deterministic prompts
+response_cache = ResponseCache.from_env()
+
+REGISTRY.gauge("pop_storage_write_queue", "Writes waiting for the next group commit", storage_writer.queue_depth)
+REGISTRY.gauge("pop_response_cache_entries", "Entries in the in-memory response cache", lambda: response_cache.stats()["size"])
+
+# Indexes proofs stored before full-text search existed; new proofs are indexed on insert
+search_backfill = SearchBackfill.from_env()
+REGISTRY.gauge("pop_search_backfill_remaining", "Proof ids the search index backfill has yet to cover", search_backfill.remaining)
+
+# Upper bound on prompts per /prompt/batch job
+BATCH_JOB_MAX_ITEMS = int(os.environ.get("BATCH_JOB_MAX_ITEMS", "5000"))
+
+# Opt-in local index of on-chain anchors; verification answers from it before calling RPC
+CHAIN_INDEX_ENABLED = os.environ.get("CHAIN_INDEX_ENABLED", "false").lower() == "true"
+
+# Set by the startup thread once the chain is connected; anchors queue in the outbox until then
+chain_client, anchor_worker, chain_indexer = None, None, None
+readiness = {"database": False, "ai": False, "blockchain": "initializing"}
+shutting_down = threading.Event()
+
+# Finished jobs close their anchor group; wake the worker so it is anchored right away
+batch_runner = BatchJobRunner.from_env(on_anchors_ready=lambda: anchor_worker and anchor_worker.notify())
 
 app = FastAPI(
     title="Proof-of-Prompt API",
@@ -83,54 +115,122 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Rate limiter setup - moved after app creation
-limiter = Limiter(key_func=get_remote_address)
-app.state.limiter = limiter
-app.add_middleware(SlowAPIMiddleware)
+# Token buckets live in a shared store, so limits hold across all gunicorn workers
+limiter = RateLimiter.from_env()
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Route template, not the raw path, so ids in URLs don't explode label cardinality
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    HTTP_SECONDS.observe(time.perf_counter() - started, method=request.method, route=route)
+    HTTP_REQUESTS.inc(method=request.method, route=route, status=response.status_code)
+    return response
 
 # Initialize DB on startup
 @app.on_event("startup")
 def init_db():
-    logger.info("Initializing database...")
-    with engine.begin() as conn:
-        conn.execute(text('''
-            CREATE TABLE IF NOT EXISTS prompts (
-                id INTEGER PRIMARY KEY,
-                prompt TEXT NOT NULL,
-                response TEXT NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                local_hash TEXT NOT NULL,
-                blockchain_tx TEXT NULL,
-                model TEXT NOT NULL,
-                temperature REAL NULL
-            )
-        '''))
-        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_hash ON prompts(local_hash)"))
-        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_tx ON prompts(blockchain_tx)"))
-    logger.info("Database initialized.")
+    init_database()
+    storage_writer.start()
+    if response_cache.enabled:
+        response_cache.ensure_index()
+    search_backfill.start()
+    readiness["database"] = True
 
-# Initialize blockchain on startup with timeout
-@app.on_event("startup")
-def init_blockchain_app():
-    global w3, contract
-    w3, contract = None, None
-    
-    logger.info("Initializing blockchain connection...")
+def warm_ai_client():
+    """Import the OpenAI SDK and build the client before the first /prompt needs it"""
     try:
-        w3, contract = init_blockchain()
-        logger.info("✅ Blockchain initialized successfully")
+        from prompt_handler import get_async_client
+        get_async_client()
+        readiness["ai"] = True
     except Exception as e:
-        logger.error(f"❌ Blockchain initialization failed: {str(e)}")
+        logger.error(f"❌ AI client initialization failed: {str(e)}")
+
+def init_blockchain():
+    global chain_client, anchor_worker, chain_indexer
+
+    logger.info("Initializing blockchain connection...")
+    # web3 is imported here rather than at module level; it dominates import time
+    from blockchain import get_chain_client
+    from anchor_worker import AnchorWorker
+
+    delay = 1.0
+    while chain_client is None:
+        try:
+            chain_client = get_chain_client()
+            logger.info("✅ Blockchain initialized successfully")
+        except Exception as e:
+            logger.error(f"❌ Blockchain initialization failed: {str(e)}")
+            readiness["blockchain"] = "unavailable"
+            # Blocking mode keeps the old behaviour of starting without a chain
+            if STARTUP_MODE == "blocking" or shutting_down.wait(delay):
+                return
+            delay = min(delay * 2, 60.0)
+
+    # Drains the outbox, including anchors queued while the chain was still connecting
+    anchor_worker = AnchorWorker.from_env(chain_client, mode=ANCHOR_MODE)
+    anchor_worker.start()
+    readiness["blockchain"] = "ok"
+    REGISTRY.gauge("pop_anchor_queue_depth", "Outbox rows not yet confirmed or failed", anchor_worker.pending_count)
+    REGISTRY.gauge("pop_receipt_tracker_pending", "Transactions waiting for a receipt", chain_client.receipt_tracker.pending_count)
+    logger.info(f"📦 Anchor worker started (mode={ANCHOR_MODE}, max_size={anchor_worker.max_size}, max_wait={anchor_worker.max_wait}s)")
+
+    if CHAIN_INDEX_ENABLED:
+        from chain_indexer import ChainIndexer
+        chain_indexer = ChainIndexer.from_env(chain_client)
+        chain_client.indexer = chain_indexer
+        chain_indexer.start()
+        REGISTRY.gauge("pop_chain_index_lag_blocks", "Blocks the local chain index is behind the head", chain_indexer.lag)
+
+def warm_up():
+    warm_ai_client()
+    init_blockchain()
+
+@app.on_event("startup")
+def init_blockchain_app():
+    if STARTUP_MODE == "blocking":
+        warm_up()
+        return
+    threading.Thread(target=warm_up, name="startup-init", daemon=True).start()
+    logger.info("⚡ Serving while the AI client and blockchain initialize in the background")
+
+@app.on_event("shutdown")
+def stop_anchor_worker():
+    shutting_down.set()
+    if chain_indexer:
+        chain_indexer.stop(timeout=5)
+    if anchor_worker:
+        anchor_worker.stop(timeout=5)
+    search_backfill.stop(timeout=5)
+    storage_writer.stop(timeout=5)
 
 # Models
 class PromptRequest(BaseModel):
     prompt: str = Field(..., min_length=3, max_length=2000)
     model: str = Field("gpt-4o", pattern="^(gpt-4o|gpt-3.5-turbo|claude-3)$")
     temperature: Optional[confloat(ge=0, le=2)] = 0.7
+    # None caches only temperature 0; True/False force the cache on or off for this request
+    cache: Optional[bool] = None
 
 class VerificationRequest(BaseModel):
     prompt: str
     response: str
+    # Inclusion path for batch-anchored proofs; looked up in the DB when omitted
+    merkle_proof: Optional[List[Dict[str, str]]] = None
+
+class BatchVerificationItem(BaseModel):
+    # Either a prompt/response pair or the hex SHA-256 of prompt + response
+    prompt: Optional[str] = None
+    response: Optional[str] = None
+    hash: Optional[str] = None
+    merkle_proof: Optional[List[Dict[str, str]]] = None
+
+class BatchVerificationRequest(BaseModel):
+    items: List[BatchVerificationItem] = Field(..., min_length=1, max_length=VERIFY_BATCH_MAX)
+
+class BatchPromptRequest(BaseModel):
+    items: List[PromptRequest] = Field(..., min_length=1, max_length=BATCH_JOB_MAX_ITEMS)
 
 class ProofResponse(BaseModel):
     prompt: str
@@ -138,6 +238,7 @@ class ProofResponse(BaseModel):
     local_hash: str
     timestamp: str
     blockchain: dict
+    cached: bool = False
 
 # Add root endpoint
 @app.get("/")
@@ -150,23 +251,100 @@ async def root():
         "endpoints": {
             "docs": "/docs",
             "generate": "/prompt (POST)",
+            "generate_stream": "/prompt/stream (POST, text/event-stream)",
             "verify": "/verify (POST)",
-            "health": "/health"
+            "generate_batch": "/prompt/batch (POST)",
+            "batch_status": "/prompt/batch/{job_id}",
+            "batch_results": "/prompt/batch/{job_id}/results (application/x-ndjson)",
+            "verify_batch": "/verify/batch (POST)",
+            "anchor_status": "/api/anchors/{local_hash}",
+            "search": "/api/search",
+            "export": "/api/export (ndjson, parquet or arrow)",
+            "cache_stats": "/cache/stats",
+            "metrics": "/metrics",
+            "health": "/health",
+            "ready": "/ready"
         }
     }
 
+async def store_proof(request_data: PromptRequest, response: str, hex_hash: str):
+    """Persist a proof and queue its anchor; returns (timestamp, blockchain status)"""
+    timestamp = datetime.utcnow().isoformat()
+
+    # The proof row and its outbox entry commit together, so no accepted proof is left unanchored.
+    # The group-committing writer returns only once that transaction is durable.
+    try:
+        (prompt_ref, response_ref), blobs = blob_store.pack(request_data.prompt, response)
+        await storage_writer.write_async([(INSERT_BLOB, blob) for blob in blobs] + [
+            (INSERT_PROMPT, {"pr": prompt_ref, "rr": response_ref, "t": timestamp, "h": hex_hash, "m": request_data.model, "temp": request_data.temperature}),
+            (ENQUEUE_ANCHOR, outbox_entry(hex_hash)),
+            (INDEX_PROOF, index_entry(request_data.prompt, response, hex_hash, timestamp)),
+        ])
+    except Exception as e:
+        logger.error(f"Database insert failed: {str(e)}")
+        return timestamp, {"status": "failed", "error": "Could not queue proof for anchoring"}
+
+    if anchor_worker:
+        anchor_worker.notify()
+        return timestamp, {"status": "pending", "status_url": f"/api/anchors/{hex_hash}"}
+
+    logger.warning("Blockchain not initialized, anchor queued until it is available")
+    return timestamp, {"status": "blockchain_disabled", "status_url": f"/api/anchors/{hex_hash}"}
+
+def lookup_cached_proof(request_data: PromptRequest) -> Optional[dict]:
+    if not response_cache.applies(request_data.temperature, request_data.cache):
+        return None
+    return response_cache.get(request_data.prompt, request_data.model, request_data.temperature)
+
+def cached_blockchain_status(cached: dict) -> dict:
+    """Anchor status of a reused proof; it was anchored (or queued) when first generated"""
+    if cached["blockchain_tx"]:
+        tx_hash_hex = cached["blockchain_tx"]
+        if not tx_hash_hex.startswith('0x'):
+            tx_hash_hex = f"0x{tx_hash_hex}"
+        return {
+            "status": "confirmed",
+            "tx_hash": tx_hash_hex,
+            "explorer_url": f"https://sepolia.etherscan.io/tx/{tx_hash_hex}"
+        }
+
+    with get_db() as db:
+        anchor = get_anchor_status(db, cached["local_hash"])
+    return {
+        "status": anchor["status"] if anchor else "pending",
+        "status_url": f"/api/anchors/{cached['local_hash']}"
+    }
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @app.post("/prompt", response_model=ProofResponse)
 @limiter.limit("20/minute")
 async def create_proof(request_data: PromptRequest, request: Request):
+    from prompt_handler import generate_proof_async
+
+    with STAGE_SECONDS.time(stage="prompt.cache_lookup"):
+        cached = await asyncio.to_thread(lookup_cached_proof, request_data)
+    if cached:
+        return {
+            "prompt": request_data.prompt,
+            "response": cached["response"],
+            "local_hash": cached["local_hash"],
+            "timestamp": cached["timestamp"],
+            "blockchain": cached_blockchain_status(cached),
+            "cached": True
+        }
+
     try:
-        response, proof_hash = generate_proof(
-            prompt=request_data.prompt,
-            model=request_data.model,
-            temperature=request_data.temperature
-        )
-    except (APIConnectionError, RateLimitError, APIError) as e:
-        logger.error(f"OpenAI API error: {str(e)}")
-        raise HTTPException(500, detail=f"AI service error: {str(e)}")
+        with STAGE_SECONDS.time(stage="prompt.generate"):
+            response, proof_hash = await generate_proof_async(
+                prompt=request_data.prompt,
+                model=request_data.model,
+                temperature=request_data.temperature
+            )
+    except Overloaded as e:
+        logger.warning(f"Shedding proof request: {str(e)}")
+        raise HTTPException(503, detail="Model capacity exhausted, retry later", headers={"Retry-After": str(math.ceil(e.retry_after))})
     except RuntimeError as e:
         logger.error(f"Proof generation failed: {str(e)}")
         raise HTTPException(500, detail="Failed to generate proof")
@@ -175,62 +353,8 @@ async def create_proof(request_data: PromptRequest, request: Request):
         raise HTTPException(500, detail="Internal server error")
 
     hex_hash = proof_hash.hex()
-    timestamp = datetime.utcnow().isoformat()
-
-    try:
-        with get_db() as db:
-            db.execute(
-                text("INSERT INTO prompts (prompt, response, timestamp, local_hash, model, temperature) VALUES (:p, :r, :t, :h, :m, :temp)"),
-                {"p": request_data.prompt, "r": response, "t": timestamp, "h": hex_hash, "m": request_data.model, "temp": request_data.temperature}
-            )
-            db.commit()
-    except Exception as e:
-        logger.error(f"Database insert failed: {str(e)}")
-
-    blockchain_result = {"status": "pending"}
-    try:
-        if w3 and contract:
-            tx_receipt = anchor_prompt_hash(proof_hash, w3, contract)
-            
-            # Verify the transaction was successful
-            if tx_receipt and tx_receipt.status == 1:
-                tx_hash_hex = tx_receipt.transactionHash.hex()
-                # Ensure the hash has 0x prefix for Etherscan
-                if not tx_hash_hex.startswith('0x'):
-                    tx_hash_hex = f"0x{tx_hash_hex}"
-                
-                blockchain_result = {
-                    "status": "confirmed",
-                    "tx_hash": tx_hash_hex,
-                    "block_number": tx_receipt.blockNumber,
-                    "gas_used": tx_receipt.gasUsed,
-                    "explorer_url": f"https://sepolia.etherscan.io/tx/{tx_hash_hex}"
-                }
-                
-                try:
-                    with get_db() as db:
-                        db.execute(
-                            text("UPDATE prompts SET blockchain_tx = :tx WHERE local_hash = :h"),
-                            {"tx": tx_receipt.transactionHash.hex(), "h": hex_hash}
-                        )
-                        db.commit()
-                except Exception as e:
-                    logger.error(f"Failed to update blockchain_tx: {str(e)}")
-            else:
-                logger.error("Transaction failed on blockchain")
-                blockchain_result = {
-                    "status": "failed",
-                    "error": "Transaction failed on blockchain"
-                }
-        else:
-            logger.warning("Blockchain not initialized, skipping anchoring")
-            blockchain_result = {"status": "blockchain_disabled"}
-    except Exception as e:
-        logger.warning(f"Blockchain anchoring failed: {str(e)}")
-        blockchain_result = {
-            "status": "failed",
-            "error": str(e)
-        }
+    with STAGE_SECONDS.time(stage="prompt.store"):
+        timestamp, blockchain_result = await store_proof(request_data, response, hex_hash)
 
     return {
         "prompt": request_data.prompt,
@@ -240,72 +364,402 @@ async def create_proof(request_data: PromptRequest, request: Request):
         "blockchain": blockchain_result
     }
 
+@app.post("/prompt/stream")
+@limiter.limit("20/minute")
+async def create_proof_stream(request_data: PromptRequest, request: Request):
+    """Server-sent events: `token` events as they arrive, then a final `proof` event"""
+    from prompt_handler import stream_proof
+
+    async def events():
+        try:
+            cached = await asyncio.to_thread(lookup_cached_proof, request_data)
+            if cached:
+                yield sse_event("token", {"content": cached["response"]})
+                yield sse_event("proof", {
+                    "prompt": request_data.prompt,
+                    "local_hash": cached["local_hash"],
+                    "timestamp": cached["timestamp"],
+                    "blockchain": cached_blockchain_status(cached),
+                    "cached": True
+                })
+                return
+
+            async for event in stream_proof(
+                prompt=request_data.prompt,
+                model=request_data.model,
+                temperature=request_data.temperature
+            ):
+                if event["type"] == "token":
+                    yield sse_event("token", {"content": event["content"]})
+                    continue
+
+                hex_hash = event["proof_hash"].hex()
+                timestamp, blockchain_result = await store_proof(request_data, event["response"], hex_hash)
+                yield sse_event("proof", {
+                    "prompt": request_data.prompt,
+                    "local_hash": hex_hash,
+                    "timestamp": timestamp,
+                    "blockchain": blockchain_result
+                })
+        except Overloaded as e:
+            # Headers are already sent; the client gets the back-off in the error event instead
+            logger.warning(f"Shedding streaming proof request: {str(e)}")
+            yield sse_event("error", {"detail": "Model capacity exhausted, retry later", "retry_after": math.ceil(e.retry_after)})
+        except Exception as e:
+            logger.error(f"Streaming proof generation failed: {str(e)}")
+            yield sse_event("error", {"detail": "Failed to generate proof"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/prompt/batch", status_code=202)
+@limiter.limit("5/minute")
+async def create_proof_batch(request_data: BatchPromptRequest, request: Request):
+    try:
+        job_id = await batch_runner.submit([item.model_dump() for item in request_data.items])
+    except Exception as e:
+        logger.error(f"Batch job creation failed: {str(e)}")
+        raise HTTPException(500, detail="Database error")
+
+    return {
+        "job_id": job_id,
+        "status": "running",
+        "total": len(request_data.items),
+        "status_url": f"/prompt/batch/{job_id}",
+        "results_url": f"/prompt/batch/{job_id}/results"
+    }
+
+@app.get("/prompt/batch/{job_id}")
+async def get_proof_batch(job_id: str):
+    job = await asyncio.to_thread(batch_runner.get_job, job_id)
+    if not job:
+        raise HTTPException(404, detail="Batch job not found")
+    return job
+
+@app.get("/prompt/batch/{job_id}/results")
+async def stream_proof_batch_results(job_id: str):
+    """One JSON line per prompt as it completes; the stream ends when the job does"""
+    if not await asyncio.to_thread(batch_runner.get_job, job_id):
+        raise HTTPException(404, detail="Batch job not found")
+
+    async def lines():
+        async for result in batch_runner.iter_results(job_id):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 # Add missing /verify endpoint
 @app.post("/verify", response_model=dict)
 @limiter.limit("30/minute")
 async def verify_proof(request_data: VerificationRequest, request: Request):
+    from blockchain import verify_on_chain
+
     try:
         # Generate hash from prompt + response
         proof_data = f"{request_data.prompt}{request_data.response}".encode('utf-8')
         proof_hash = hashlib.sha256(proof_data).digest()
-        
-        # Verify on blockchain
-        verification_result = verify_on_chain(proof_hash)
+
+        # Batch-anchored proofs are verified against the Merkle root they belong to
+        path = request_data.merkle_proof
+        if path is None:
+            path = (await asyncio.to_thread(stored_merkle_paths, [proof_hash.hex()])).get(proof_hash.hex())
+
+        if path is not None:
+            try:
+                root = compute_merkle_root(proof_hash, path)
+            except (KeyError, ValueError) as e:
+                raise HTTPException(400, detail=f"Invalid Merkle proof: {str(e)}")
+            verification_result = await asyncio.to_thread(verify_on_chain, root)
+            verification_result["merkle_root"] = root.hex()
+        else:
+            # Verify on blockchain
+            verification_result = await asyncio.to_thread(verify_on_chain, proof_hash)
         
         return {
             "verified": verification_result.get("exists", False),
             "hash": proof_hash.hex(),
             "blockchain": verification_result
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Verification failed: {str(e)}")
         raise HTTPException(500, detail="Verification failed")
 
+def stored_merkle_paths(hex_hashes: List[str]) -> Dict[str, list]:
+    """
+    Inclusion paths of batch-anchored proofs, fetched in one query. When the same proof was
+    stored more than once, the earliest row with a confirmed anchor wins.
+    """
+    if not hex_hashes:
+        return {}
+    with get_db() as db:
+        rows = db.execute(
+            text("""
+                SELECT local_hash, merkle_proof FROM prompts
+                WHERE local_hash IN :hashes AND merkle_proof IS NOT NULL
+                ORDER BY blockchain_tx IS NULL, id
+            """)
+            .bindparams(bindparam("hashes", expanding=True)),
+            {"hashes": hex_hashes}
+        ).fetchall()
+    paths: Dict[str, list] = {}
+    for row in rows:
+        paths.setdefault(row.local_hash, json.loads(row.merkle_proof))
+    return paths
+
+@app.post("/verify/batch", response_model=dict)
+@limiter.limit("10/minute")
+async def verify_proof_batch(request_data: BatchVerificationRequest, request: Request):
+    """Verify many proofs with one aggregated chain lookup; results keep the input order"""
+    from blockchain import verify_many_on_chain
+
+    results: List[dict] = []
+    proof_hashes: List[Optional[bytes]] = []
+    for index, item in enumerate(request_data.items):
+        try:
+            if item.hash is not None:
+                try:
+                    proof_hash = bytes.fromhex(item.hash.lower().removeprefix("0x"))
+                except ValueError:
+                    proof_hash = b""
+                if len(proof_hash) != 32:
+                    raise ValueError("hash must be a 32-byte hex string")
+            elif item.prompt is not None and item.response is not None:
+                proof_hash = hashlib.sha256(f"{item.prompt}{item.response}".encode('utf-8')).digest()
+            else:
+                raise ValueError("provide either prompt and response, or hash")
+        except ValueError as e:
+            proof_hash = None
+            results.append({"index": index, "verified": False, "error": str(e)})
+        else:
+            results.append({"index": index, "verified": False, "hash": proof_hash.hex()})
+        proof_hashes.append(proof_hash)
+
+    try:
+        paths = await asyncio.to_thread(stored_merkle_paths, [h.hex() for h in proof_hashes if h is not None])
+
+        # Each proof is checked against its Merkle root if batch-anchored, else against its own hash
+        targets: Dict[int, bytes] = {}
+        for index, (item, proof_hash) in enumerate(zip(request_data.items, proof_hashes)):
+            if proof_hash is None:
+                continue
+            path = item.merkle_proof if item.merkle_proof is not None else paths.get(proof_hash.hex())
+            if path is None:
+                targets[index] = proof_hash
+                continue
+            try:
+                targets[index] = compute_merkle_root(proof_hash, path)
+                results[index]["merkle_root"] = targets[index].hex()
+            except (KeyError, ValueError) as e:
+                results[index]["error"] = f"Invalid Merkle proof: {str(e)}"
+
+        unique_targets = list(dict.fromkeys(targets.values()))
+        lookups = dict(zip(unique_targets, await asyncio.to_thread(verify_many_on_chain, unique_targets)))
+
+        for index, target in targets.items():
+            verification_result = lookups[target]
+            results[index]["verified"] = verification_result.get("exists", False)
+            results[index]["blockchain"] = verification_result
+    except Exception as e:
+        logger.error(f"Batch verification failed: {str(e)}")
+        raise HTTPException(500, detail="Verification failed")
+
+    return {
+        "count": len(results),
+        "verified": sum(1 for r in results if r["verified"]),
+        "results": results
+    }
+
 # Add missing /api/proofs/{txHash} endpoint
 @app.get("/api/proofs/{tx_hash}")
-async def get_proof_by_tx(tx_hash: str):
+async def get_proof_by_tx(tx_hash: str, local_hash: Optional[str] = None):
+    """
+    Every proof anchored by a transaction; in batch mode one transaction covers a whole Merkle batch.
+    The top-level fields describe the proof matching `local_hash` when given, else the first one
+    anchored; all of them are listed in `proofs`.
+    """
+    # Status URLs and explorer links hand out 0x-prefixed hashes; rows store them bare, or
+    # prefixed when written by hexbytes < 1.0
+    bare_tx = tx_hash.lower().removeprefix("0x")
     try:
         with get_db() as db:
-            result = db.execute(
-                text("SELECT * FROM prompts WHERE blockchain_tx = :tx"),
-                {"tx": tx_hash}
-            ).fetchone()
-            
-            if not result:
+            rows = [
+                dict(row) for row in db.execute(
+                    text("""
+                        SELECT id, prompt, response, prompt_ref, response_ref, local_hash, timestamp, blockchain_tx,
+                               model, merkle_root, leaf_index, merkle_proof
+                        FROM prompts WHERE blockchain_tx IN (:tx, :prefixed_tx)
+                        ORDER BY id
+                    """),
+                    {"tx": bare_tx, "prefixed_tx": f"0x{bare_tx}"}
+                ).mappings()
+            ]
+
+            if not rows or (local_hash and not any(row["local_hash"] == local_hash for row in rows)):
                 raise HTTPException(404, detail="Proof not found")
-            
-            return {
-                "prompt": result.prompt,
-                "response": result.response,
-                "local_hash": result.local_hash,
-                "timestamp": result.timestamp,
-                "blockchain_tx": result.blockchain_tx,
-                "model": result.model
+            blob_store.fill_bodies(db, rows)
+
+            # Independent confirmation from the chain index, when it has seen this transaction
+            indexed = db.execute(
+                text("SELECT anchor_hash, block_number, block_timestamp FROM chain_anchors WHERE tx_hash = :tx"),
+                {"tx": bare_tx}
+            ).fetchone()
+
+        proofs = [
+            {
+                "id": row["id"],
+                "prompt": row["prompt"],
+                "response": row["response"],
+                "local_hash": row["local_hash"],
+                "timestamp": row["timestamp"],
+                "blockchain_tx": row["blockchain_tx"],
+                "model": row["model"],
+                "merkle_root": row["merkle_root"],
+                "leaf_index": row["leaf_index"],
+                "merkle_proof": json.loads(row["merkle_proof"]) if row["merkle_proof"] else None
             }
+            for row in rows
+        ]
+        top = next((proof for proof in proofs if proof["local_hash"] == local_hash), proofs[0])
+        return {
+            **{key: value for key, value in top.items() if key != "id"},
+            "blockchain_tx": rows[0]["blockchain_tx"],
+            "proof_count": len(proofs),
+            "proofs": proofs,
+            "on_chain": {
+                "anchor_hash": indexed.anchor_hash,
+                "block_number": indexed.block_number,
+                "timestamp": indexed.block_timestamp
+            } if indexed else None
+        }
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Database query failed: {str(e)}")
         raise HTTPException(500, detail="Database error")
 
+@app.get("/api/export")
+@limiter.limit("2/minute")
+async def export_proofs(
+    request: Request,
+    format: str = "ndjson",
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    model: Optional[str] = None,
+    anchor_status: Optional[str] = None,
+    after_id: int = 0,
+    bodies: bool = True
+):
+    """Stream every matching proof in id order; resume an interrupted export with the last id received"""
+    from export import EXPORT_FORMATS, MEDIA_TYPES, export_chunks
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+
+    try:
+        chunks = export_chunks(
+            format, since=since, until=until, model=model, anchor_status=anchor_status, after_id=after_id, bodies=bodies
+        )
+    except RuntimeError as e:
+        raise HTTPException(501, detail=str(e))
+    # Sync iterator: Starlette runs it in a worker thread, so page queries never block the event loop
+    return StreamingResponse(
+        chunks,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="proofs.{format}"'}
+    )
+
+@app.get("/api/search")
+@limiter.limit("30/minute")
+async def search(
+    request: Request,
+    q: str,
+    model: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    field: str = "all",
+    order: str = "relevance",
+    cursor: Optional[str] = None,
+    limit: int = 20
+):
+    """Full-text search over prompts and responses; pass `next_cursor` back as `cursor` for the next page"""
+    try:
+        # A broad query ranks every match; keep that off the event loop
+        return await asyncio.to_thread(
+            search_proofs, q, model=model, since=since, until=until, field=field, order=order, cursor=cursor, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Search failed: {str(e)}")
+        raise HTTPException(500, detail="Database error")
+
+@app.get("/api/anchors/{local_hash}")
+async def get_anchor(local_hash: str):
+    try:
+        with get_db() as db:
+            result = get_anchor_status(db, local_hash.lower().removeprefix("0x"))
+    except Exception as e:
+        logger.error(f"Database query failed: {str(e)}")
+        raise HTTPException(500, detail="Database error")
+
+    if not result:
+        raise HTTPException(404, detail="Anchor not found")
+    return result
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of pipeline stage latencies, RPC calls and queue depths"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return response_cache.stats()
+
 # Health check endpoint with dependency checks
 @app.get("/health")
 async def health():
     status = {
         "status": "ok",
         "services": {
-            "database": "ok",
-            "blockchain": "ok" if w3 and contract else "disabled",
-            "ai": "ok"
+            "database": "ok" if readiness["database"] else "unavailable",
+            "blockchain": readiness["blockchain"],
+            # False until the startup thread has loaded the client, and for good if that failed
+            "ai": "ok" if readiness["ai"] else "unavailable"
         }
     }
     
-    # Add detailed checks if needed
-    if not w3 or not contract:
-        status["services"]["blockchain"] = "disabled"
+    endpoint_stats = getattr(chain_client.w3.provider, "endpoint_stats", None) if chain_client else None
+    if endpoint_stats:
+        status["rpc_endpoints"] = endpoint_stats()
+
+    if chain_indexer:
+        status["chain_index"] = {"lag_blocks": chain_indexer.lag(), "caught_up": chain_indexer.is_caught_up()}
+
+    # Search covers every proof once the backfill of older rows reaches 0
+    status["search_index"] = {"backfill_remaining": search_backfill.remaining()}
+
+    if anchor_worker:
+        try:
+            status["anchor_queue"] = anchor_worker.pending_count()
+        except Exception:
+            status["services"]["database"] = "error"
     
     return status
 
+@app.get("/ready")
+async def ready():
+    """Readiness for the load balancer: database up and AI client loaded. The chain is
+    reported but not required; proofs accepted before it connects are anchored afterwards."""
+    ready_now = readiness["database"] and readiness["ai"]
+    return JSONResponse(
+        {"status": "ready" if ready_now else "starting", "services": readiness},
+        status_code=200 if ready_now else 503
+    )
+
 # Run with uvicorn when executed directly
 if __name__ == "__main__":
     import uvicorn
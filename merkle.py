@@ -0,0 +1,64 @@
+import hashlib
+from typing import Dict, List
+
+# Domain separation so an interior node can never be passed off as a leaf
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+
+def hash_leaf(proof_hash: bytes) -> bytes:
+    return hashlib.sha256(LEAF_PREFIX + proof_hash).digest()
+
+def hash_node(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+def build_merkle_tree(proof_hashes: List[bytes]) -> List[List[bytes]]:
+    """
+    Build every level of the tree, leaves first and root last.
+    An unpaired node is promoted to the next level unchanged instead of being
+    duplicated, so two different batches can never share a root.
+    """
+    if not proof_hashes:
+        raise ValueError("Cannot build a Merkle tree without leaves")
+
+    levels = [[hash_leaf(h) for h in proof_hashes]]
+    while len(levels[-1]) > 1:
+        current = levels[-1]
+        parent = [hash_node(current[i], current[i + 1]) for i in range(0, len(current) - 1, 2)]
+        if len(current) % 2:
+            parent.append(current[-1])
+        levels.append(parent)
+    return levels
+
+def merkle_root(levels: List[List[bytes]]) -> bytes:
+    return levels[-1][0]
+
+def merkle_proof(levels: List[List[bytes]], index: int) -> List[Dict[str, str]]:
+    """Inclusion path for the leaf at `index`, ordered from leaf to root"""
+    if not 0 <= index < len(levels[0]):
+        raise IndexError(f"Leaf index {index} out of range")
+
+    path = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            path.append({
+                "position": "left" if sibling < index else "right",
+                "hash": level[sibling].hex()
+            })
+        index //= 2
+    return path
+
+def compute_merkle_root(proof_hash: bytes, path: List[Dict[str, str]]) -> bytes:
+    """Recompute the root a proof hash commits to by walking its inclusion path"""
+    node = hash_leaf(proof_hash)
+    for step in path:
+        sibling = bytes.fromhex(step["hash"].removeprefix("0x"))
+        if len(sibling) != 32:
+            raise ValueError("Merkle path entries must be 32-byte hashes")
+        if step["position"] == "left":
+            node = hash_node(sibling, node)
+        elif step["position"] == "right":
+            node = hash_node(node, sibling)
+        else:
+            raise ValueError(f"Invalid Merkle path position: {step['position']}")
+    return node
@@ -0,0 +1,187 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from a cached DB read up to a slow receipt wait
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+GAS_BUCKETS = (21000, 30000, 40000, 50000, 75000, 100000, 150000, 200000, 300000, 500000)
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+class Gauge(_Metric):
+    """Gauge whose value is read from a callback at scrape time, so the hot path pays nothing"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], Optional[float]]):
+        super().__init__(name, documentation)
+        self.read = read
+
+    def _samples(self) -> List[str]:
+        try:
+            value = self.read()
+        except Exception:
+            return []
+        return [] if value is None else [f"{self.name} {_format_value(value)}"]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (+Inf last), sum]
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(counts), total[0]) for k, (counts, total) in self._series.items()]
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', _format_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def gauge(self, name: str, documentation: str, read: Callable[[], Optional[float]]) -> Gauge:
+        """Register (or re-point) a scrape-time gauge"""
+        return self.register(Gauge(name, documentation, read))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+# Proof pipeline, one histogram for every stage so a slow request can be broken down
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "pop_stage_seconds", "Time spent in each proof pipeline stage", ["stage"]
+))
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "pop_http_requests_total", "HTTP requests by route and status", ["method", "route", "status"]
+))
+HTTP_SECONDS = REGISTRY.register(Histogram(
+    "pop_http_request_seconds", "HTTP request latency by route", ["method", "route"]
+))
+LLM_REQUESTS = REGISTRY.register(Counter(
+    "pop_llm_requests_total", "Model completions by model and outcome", ["model", "outcome"]
+))
+LLM_RETRIES = REGISTRY.register(Counter(
+    "pop_llm_retries_total", "Completion retries by error type", ["error"]
+))
+LLM_SHED = REGISTRY.register(Counter(
+    "pop_llm_shed_total", "Completions rejected by the LLM scheduler for lack of RPM/TPM budget", ["model"]
+))
+RPC_REQUESTS = REGISTRY.register(Counter(
+    "pop_rpc_requests_total", "JSON-RPC calls to the chain by method", ["method"]
+))
+RPC_SECONDS = REGISTRY.register(Histogram(
+    "pop_rpc_request_seconds", "JSON-RPC call latency by method", ["method"]
+))
+RPC_ENDPOINT_ERRORS = REGISTRY.register(Counter(
+    "pop_rpc_endpoint_errors_total", "Failed requests per RPC endpoint (transport errors and rate limits)", ["endpoint"]
+))
+RPC_HEDGED = REGISTRY.register(Counter(
+    "pop_rpc_hedged_requests_total", "Reads re-sent to a second endpoint after the hedge delay, by which answered first", ["winner"]
+))
+RATE_LIMITED = REGISTRY.register(Counter(
+    "pop_rate_limited_total", "Requests rejected with 429 by the shared rate limiter", ["route"]
+))
+ANCHOR_TRANSACTIONS = REGISTRY.register(Counter(
+    "pop_anchor_transactions_total", "Anchor transactions by outcome", ["outcome"]
+))
+ANCHOR_GAS_USED = REGISTRY.register(Histogram(
+    "pop_anchor_gas_used", "Gas used per confirmed anchor transaction", buckets=GAS_BUCKETS
+))
+ANCHOR_BATCH_SIZE = REGISTRY.register(Histogram(
+    "pop_anchor_batch_size", "Proofs covered by one anchor transaction", buckets=SIZE_BUCKETS
+))
+VERIFICATIONS = REGISTRY.register(Counter(
+    "pop_verifications_total", "On-chain verifications by result", ["result"]
+))
+DB_WRITE_SECONDS = REGISTRY.register(Histogram(
+    "pop_db_write_seconds", "Latency of one group-commit transaction"
+))
+DB_WRITE_BATCH = REGISTRY.register(Histogram(
+    "pop_db_writes_per_commit", "Write units committed per transaction", buckets=SIZE_BUCKETS
+))
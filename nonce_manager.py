@@ -0,0 +1,123 @@
+import os
+import logging
+import threading
+from typing import List, Optional, Set
+
+logger = logging.getLogger("NonceManager")
+
+# Node error messages that mean our local nonce view is out of date
+NONCE_ERRORS = (
+    "nonce too low",
+    "nonce too high",
+    "replacement transaction underpriced",
+    "already known",
+    "known transaction",
+)
+
+def is_nonce_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return any(fragment in message for fragment in NONCE_ERRORS)
+
+class NonceManager:
+    """
+    Hands out nonces for one account from a local counter so several
+    transactions can be in flight at once. The counter is seeded from the
+    node's pending transaction count and reseeded whenever a transaction is
+    rejected, dropped or replaced.
+    """
+
+    def __init__(self, w3, address: str):
+        self.w3 = w3
+        self.address = address
+        self._next: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def next_nonce(self) -> int:
+        with self._lock:
+            if self._next is None:
+                self._next = self.w3.eth.get_transaction_count(self.address, 'pending')
+                logger.info(f"Nonce for {self.address} synced at {self._next}")
+            nonce = self._next
+            self._next += 1
+            return nonce
+
+    def resync(self):
+        """Drop the local counter; the next call re-reads the pending count from the node"""
+        with self._lock:
+            self._next = None
+
+    def release(self, nonce: int):
+        """
+        Give back a nonce whose transaction never reached the node. Only the latest
+        one can be returned; an earlier one stays a gap, which stalls the later
+        transactions until they count as dropped and the worker resyncs.
+        """
+        with self._lock:
+            if self._next == nonce + 1:
+                self._next = nonce
+
+class Signer:
+    def __init__(self, w3, private_key: str):
+        if not private_key.startswith('0x'):
+            private_key = '0x' + private_key
+        self.account = w3.eth.account.from_key(private_key)
+        self.address = self.account.address
+        self.nonces = NonceManager(w3, self.address)
+
+class SignerPool:
+    """
+    Round-robin pool of signing accounts used to shard anchoring transactions.
+    Nonce counters live in process memory, so each account must be used by one
+    process at a time: the anchor worker leases accounts (see
+    anchor_outbox.renew_signer_leases) and passes the ones it holds to
+    set_active(). Until then every account is used, for single-process scripts.
+    """
+
+    def __init__(self, w3, private_keys: List[str]):
+        if not private_keys:
+            raise ValueError("No signing account configured")
+        self.signers = [Signer(w3, key) for key in private_keys]
+        self._active: Optional[List[Signer]] = None
+        self._index = 0
+        self._lock = threading.Lock()
+        logger.info(f"🔐 Signer pool loaded with {len(self.signers)} account(s)")
+
+    @classmethod
+    def from_env(cls, w3) -> "SignerPool":
+        # PRIVATE_KEYS is a comma-separated list; PRIVATE_KEY remains the single-account fallback
+        keys = [k.strip() for k in os.getenv('PRIVATE_KEYS', '').split(',') if k.strip()]
+        if not keys and os.getenv('PRIVATE_KEY'):
+            keys = [os.getenv('PRIVATE_KEY')]
+        return cls(w3, keys)
+
+    @property
+    def addresses(self) -> List[str]:
+        return [signer.address for signer in self.signers]
+
+    def set_active(self, addresses: Set[str]):
+        """Restrict sending to the accounts this process holds a lease on"""
+        with self._lock:
+            previous = {s.address for s in self._active} if self._active is not None else set()
+            self._active = [s for s in self.signers if s.address in addresses]
+            gained = [s for s in self._active if s.address not in previous]
+        for signer in gained:
+            # Another process may have sent from this account since we last did
+            signer.nonces.resync()
+            logger.info(f"🔐 Signing with {signer.address} in this process")
+
+    def has_active(self) -> bool:
+        with self._lock:
+            return self._active is None or bool(self._active)
+
+    def acquire(self) -> Signer:
+        with self._lock:
+            signers = self.signers if self._active is None else self._active
+            if not signers:
+                raise RuntimeError("No signing account is leased to this process")
+            signer = signers[self._index % len(signers)]
+            self._index = (self._index + 1) % len(self.signers)
+            return signer
+
+    def resync_all(self):
+        for signer in self.signers:
+            signer.nonces.resync()
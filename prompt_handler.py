@@ -1,11 +1,16 @@
-from openai import OpenAI
-from openai import OpenAIError, APIConnectionError, RateLimitError
+from openai import OpenAI, AsyncOpenAI
+from openai import OpenAIError, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
 from dotenv import load_dotenv
 import os
+import time
+import asyncio
 import hashlib
-from typing import Tuple
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
 import logging
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+
+from metrics import LLM_REQUESTS, LLM_RETRIES, REGISTRY, STAGE_SECONDS
+from llm_scheduler import PRIORITY_INTERACTIVE, LLMScheduler, Overloaded, estimate_tokens
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -18,13 +23,118 @@ load_dotenv()
 if not os.getenv("OPENAI_API_KEY"):
     raise EnvironmentError("Missing OPENAI_API_KEY in environment variables")
 
-client = OpenAI(timeout=15.0, max_retries=3)
+# Clients are built on first use rather than at import, keeping them off the cold-start path.
+# Retries live in one place (tenacity below), so the SDK's own retries are disabled
+_client: Optional[OpenAI] = None
+_async_client: Optional[AsyncOpenAI] = None
+
+def get_client() -> OpenAI:
+    global _client
+    if _client is None:
+        _client = OpenAI(timeout=15.0, max_retries=0)
+    return _client
+
+def get_async_client() -> AsyncOpenAI:
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncOpenAI(timeout=15.0, max_retries=0)
+    return _async_client
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "100"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+
+# Caps in-flight completions per worker; held only during a call, not while backing off
+_completion_slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+# Per-model RPM/TPM budgets; every attempt is admitted here before it reaches the API
+scheduler = LLMScheduler.from_env()
+REGISTRY.gauge("pop_llm_queue_depth", "Completions waiting for RPM/TPM budget", scheduler.queue_depth)
+
+# Transient failures worth retrying; anything else (bad request, auth) fails immediately
+RETRYABLE_ERRORS = (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError)
+
+def _count_retry(retry_state):
+    LLM_RETRIES.inc(error=type(retry_state.outcome.exception()).__name__)
 
-@retry(
-    stop=stop_after_attempt(3),
+completion_retry = retry(
+    stop=stop_after_attempt(LLM_MAX_ATTEMPTS),
     wait=wait_exponential(multiplier=1, min=4, max=10),
+    retry=retry_if_exception_type(RETRYABLE_ERRORS),
+    before_sleep=_count_retry,
     reraise=True
 )
+
+def _validate_prompt(prompt: str):
+    if not prompt.strip():
+        raise ValueError("Prompt cannot be empty")
+    if len(prompt) > 10000:
+        raise ValueError("Prompt exceeds 10,000 character limit")
+
+def _completion_params(prompt: str, model: str, temperature: float, max_tokens: int, stream: bool) -> Dict[str, Any]:
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": "You are a precise technical assistant. Respond concisely."},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "top_p": 0.9,
+        "stream": stream
+    }
+
+def _finish_proof(prompt: str, model: str, response_content: str) -> Tuple[str, bytes]:
+    proof_data = f"{prompt}{response_content}".encode('utf-8')
+    proof_hash = hashlib.sha256(proof_data).digest()
+
+    # Enhanced logging
+    logger.info(f"Generated proof for {model} (prompt_len={len(prompt)}, response_len={len(response_content)})")
+    logger.info(f"Prompt: {prompt[:50]}...")  # Log the first 50 characters of the prompt
+    logger.info(f"Response: {response_content[:50]}...")  # Log the first 50 characters of the response
+    logger.info(f"Proof hash: {proof_hash.hex()}")  # Log the proof hash in hexadecimal
+
+    return response_content, proof_hash
+
+@completion_retry
+def _create_completion(params: Dict[str, Any]):
+    return get_client().chat.completions.create(**params)
+
+async def _admit(params: Dict[str, Any], priority: int):
+    await scheduler.acquire(params["model"], estimate_tokens(params["messages"], params["max_tokens"]), priority)
+
+async def _create_observed(params: Dict[str, Any]):
+    """Call the API and feed its rate-limit headers back to the scheduler"""
+    try:
+        raw = await get_async_client().chat.completions.with_raw_response.create(**params)
+    except RateLimitError as e:
+        scheduler.throttled(params["model"], e.response.headers)
+        raise
+    scheduler.observe(params["model"], raw.headers)
+    return raw.parse()
+
+@completion_retry
+async def _create_completion_async(params: Dict[str, Any], priority: int = PRIORITY_INTERACTIVE):
+    # Every attempt, retries included, waits for budget first, and does so without holding a slot
+    await _admit(params, priority)
+    async with _completion_slots:
+        return await _create_observed(params)
+
+@completion_retry
+async def _open_stream_async(params: Dict[str, Any], priority: int = PRIORITY_INTERACTIVE):
+    """
+    Open a stream and return it holding a completion slot, which the caller
+    releases once the stream is consumed. Only opening is retried; a stream
+    that fails midway has already sent tokens.
+    """
+    await _admit(params, priority)
+    await _completion_slots.acquire()
+    try:
+        return await _create_observed(params)
+    except BaseException:
+        # Give the slot back before tenacity backs off
+        _completion_slots.release()
+        raise
+
 def generate_proof(
     prompt: str,
     model: str = "gpt-4o",
@@ -32,23 +142,12 @@ def generate_proof(
     max_tokens: int = 1000,
     stream: bool = False
 ) -> Tuple[str, bytes]:
-    if not prompt.strip():
-        raise ValueError("Prompt cannot be empty")
-    if len(prompt) > 10000:
-        raise ValueError("Prompt exceeds 10,000 character limit")
+    _validate_prompt(prompt)
 
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You are a precise technical assistant. Respond concisely."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=temperature,
-            max_tokens=max_tokens,
-            top_p=0.9,
-            stream=stream
-        )
+        with STAGE_SECONDS.time(stage="llm.completion"):
+            response = _create_completion(_completion_params(prompt, model, temperature, max_tokens, stream))
+        LLM_REQUESTS.inc(model=model, outcome="ok")
         if stream:
             collected_chunks = []
             for chunk in response:
@@ -58,20 +157,95 @@ def generate_proof(
         else:
             response_content = response.choices[0].message.content
 
-        proof_data = f"{prompt}{response_content}".encode('utf-8')
-        proof_hash = hashlib.sha256(proof_data).digest()
+        return _finish_proof(prompt, model, response_content)
 
-        # Enhanced logging
-        logger.info(f"Generated proof for {model} (prompt_len={len(prompt)}, response_len={len(response_content)})")
-        logger.info(f"Prompt: {prompt[:50]}...")  # Log the first 50 characters of the prompt
-        logger.info(f"Response: {response_content[:50]}...")  # Log the first 50 characters of the response
-        logger.info(f"Proof hash: {proof_hash.hex()}")  # Log the proof hash in hexadecimal
+    except (APIConnectionError, RateLimitError, OpenAIError) as e:
+        LLM_REQUESTS.inc(model=model, outcome="error")
+        logger.error(f"OpenAI error: {e}")
+        raise RuntimeError(f"AI processing failed: {str(e)}") from e
+    except Exception as e:
+        logger.exception("Unexpected error in generate_proof")
+        raise RuntimeError(f"AI processing failed: {str(e)}") from e
 
-        return response_content, proof_hash
+async def generate_proof_async(
+    prompt: str,
+    model: str = "gpt-4o",
+    temperature: float = 0.7,
+    max_tokens: int = 1000,
+    priority: int = PRIORITY_INTERACTIVE
+) -> Tuple[str, bytes]:
+    """
+    Event-loop friendly generate_proof: at most LLM_MAX_CONCURRENCY calls in flight, async backoff.
+    Raises Overloaded when the model's RPM/TPM budget cannot admit the call in time.
+    """
+    _validate_prompt(prompt)
 
+    try:
+        with STAGE_SECONDS.time(stage="llm.completion"):
+            response = await _create_completion_async(_completion_params(prompt, model, temperature, max_tokens, False), priority)
+        LLM_REQUESTS.inc(model=model, outcome="ok")
+        return _finish_proof(prompt, model, response.choices[0].message.content)
+
+    except Overloaded:
+        LLM_REQUESTS.inc(model=model, outcome="shed")
+        raise
     except (APIConnectionError, RateLimitError, OpenAIError) as e:
+        LLM_REQUESTS.inc(model=model, outcome="error")
         logger.error(f"OpenAI error: {e}")
         raise RuntimeError(f"AI processing failed: {str(e)}") from e
     except Exception as e:
-        logger.exception("Unexpected error in generate_proof")
-        raise RuntimeError(f"AI processing failed: {str(e)}") from e
\ No newline at end of file
+        logger.exception("Unexpected error in generate_proof_async")
+        raise RuntimeError(f"AI processing failed: {str(e)}") from e
+
+async def stream_proof(
+    prompt: str,
+    model: str = "gpt-4o",
+    temperature: float = 0.7,
+    max_tokens: int = 1000,
+    priority: int = PRIORITY_INTERACTIVE
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield {"type": "token", "content": ...} events as the model produces them,
+    then one {"type": "proof", "response": ..., "proof_hash": ...} event.
+    The proof hash is built incrementally, so it is ready as soon as the last token arrives.
+    """
+    _validate_prompt(prompt)
+
+    hasher = hashlib.sha256(prompt.encode('utf-8'))
+    collected_chunks = []
+    started = time.perf_counter()
+    try:
+        stream = await _open_stream_async(_completion_params(prompt, model, temperature, max_tokens, True), priority)
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    hasher.update(content.encode('utf-8'))
+                    collected_chunks.append(content)
+                    yield {"type": "token", "content": content}
+        finally:
+            try:
+                await stream.close()
+            finally:
+                _completion_slots.release()
+
+    except Overloaded:
+        LLM_REQUESTS.inc(model=model, outcome="shed")
+        raise
+    except (APIConnectionError, RateLimitError, OpenAIError) as e:
+        LLM_REQUESTS.inc(model=model, outcome="error")
+        logger.error(f"OpenAI error: {e}")
+        raise RuntimeError(f"AI processing failed: {str(e)}") from e
+    except Exception as e:
+        logger.exception("Unexpected error in stream_proof")
+        raise RuntimeError(f"AI processing failed: {str(e)}") from e
+
+    STAGE_SECONDS.observe(time.perf_counter() - started, stage="llm.stream")
+    LLM_REQUESTS.inc(model=model, outcome="ok")
+    response_content = "".join(collected_chunks)
+    proof_hash = hasher.digest()
+    logger.info(f"Streamed proof for {model} (prompt_len={len(prompt)}, response_len={len(response_content)})")
+    logger.info(f"Proof hash: {proof_hash.hex()}")
+    yield {"type": "proof", "response": response_content, "proof_hash": proof_hash}
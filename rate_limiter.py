@@ -0,0 +1,209 @@
+import os
+import re
+import json
+import time
+import math
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from functools import wraps
+from typing import Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request
+
+from metrics import RATE_LIMITED
+
+logger = logging.getLogger("RateLimiter")
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# Buckets idle this long are full again under any supported limit, so their rows can go
+BUCKET_IDLE_TTL = 86400
+
+def parse_limit(spec: str) -> Tuple[int, int]:
+    """'20/minute' -> (20, 60)"""
+    match = re.fullmatch(r"\s*(\d+)\s*/\s*(second|minute|hour|day)\s*", spec)
+    if not match:
+        raise ValueError(f"Invalid rate limit: {spec!r}")
+    return int(match.group(1)), PERIODS[match.group(2)]
+
+class MemoryBucketStore:
+    """Per-process buckets; only correct with a single worker"""
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: float, now: float) -> Tuple[bool, float]:
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + max(now - updated, 0) * rate)
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+            return allowed, tokens
+
+class SQLiteBucketStore:
+    """
+    Buckets in a small SQLite file shared by every worker on the host.
+    One UPSERT refills and spends a token atomically, so concurrent workers
+    cannot overspend. The file is separate from the proofs DB and runs with
+    synchronous=OFF: losing a few refills in a power cut is harmless, and it
+    keeps a check to tens of microseconds.
+    """
+
+    TAKE = """
+        INSERT INTO rate_limit_buckets (key, tokens, updated) VALUES (:key, :burst - 1, :now)
+        ON CONFLICT(key) DO UPDATE SET
+            tokens = MIN(:burst, tokens + MAX(:now - updated, 0) * :rate) - 1,
+            updated = :now
+        WHERE MIN(:burst, tokens + MAX(:now - updated, 0) * :rate) >= 1
+        RETURNING tokens
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._calls = 0
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit: each statement is its own short transaction
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, rate: float, burst: float, now: float) -> Tuple[bool, float]:
+        conn = self._conn()
+        row = conn.execute(self.TAKE, {"key": key, "rate": rate, "burst": burst, "now": now}).fetchone()
+        self._calls += 1
+        if self._calls % 10000 == 0:
+            conn.execute("DELETE FROM rate_limit_buckets WHERE updated < ?", (now - BUCKET_IDLE_TTL,))
+        if row:
+            return True, row[0] + 1
+        tokens, updated = conn.execute("SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?", (key,)).fetchone()
+        return False, min(burst, tokens + max(now - updated, 0) * rate)
+
+class RedisBucketStore:
+    """Buckets in Redis (or a compatible server), for workers spread over several hosts"""
+
+    TAKE = """
+        local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+        local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+        local tokens = tonumber(bucket[1]) or burst
+        local updated = tonumber(bucket[2]) or now
+        tokens = math.min(burst, tokens + math.max(now - updated, 0) * rate)
+        local allowed = 0
+        if tokens >= 1 then
+            allowed = 1
+            tokens = tokens - 1
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+        redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+        return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url: str):
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(self.TAKE)
+
+    def take(self, key: str, rate: float, burst: float, now: float) -> Tuple[bool, float]:
+        allowed, tokens = self._take(keys=[f"ratelimit:{key}"], args=[rate, burst, now])
+        tokens = float(tokens)
+        return bool(allowed), tokens + 1 if allowed else tokens
+
+class RateLimiter:
+    """
+    Token-bucket admission control shared by every worker.
+    `@limiter.limit("20/minute")` refills a bucket at 20 tokens a minute up to
+    `burst` (default: the count), one bucket per route and client. Clients
+    sending a known `X-API-Key` get their own bucket, with the route's rate and
+    burst scaled by that key's quota multiplier; everyone else is bucketed by IP.
+    """
+
+    def __init__(self, store, api_keys: Optional[Dict[str, float]] = None, enabled: bool = True):
+        self.store = store
+        self.enabled = enabled
+        # Hashed, so the raw keys are not kept around or written into bucket names
+        self._quotas = {self._digest(k): float(v) for k, v in (api_keys or {}).items()}
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        backend = os.getenv("RATE_LIMIT_BACKEND", "sqlite").lower()
+        if backend == "redis":
+            store = RedisBucketStore(os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0"))
+        elif backend == "memory":
+            store = MemoryBucketStore()
+        else:
+            store = SQLiteBucketStore(os.getenv("RATE_LIMIT_DB", "rate_limits.db"))
+        logger.info(f"🚦 Rate limiter using {backend} buckets")
+        return cls(
+            store,
+            api_keys=json.loads(os.getenv("RATE_LIMIT_API_KEYS", "{}")),
+            enabled=os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true",
+        )
+
+    @staticmethod
+    def _digest(api_key: str) -> str:
+        return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:32]
+
+    def _client(self, request: Request) -> Tuple[str, float]:
+        api_key = request.headers.get("x-api-key")
+        if api_key:
+            digest = self._digest(api_key)
+            if digest in self._quotas:
+                return f"key:{digest}", self._quotas[digest]
+        return f"ip:{request.client.host if request.client else 'unknown'}", 1.0
+
+    def check(self, request: Request, route: str, count: int, period: int, burst: Optional[int] = None):
+        """Spend one token or raise 429 with Retry-After"""
+        if not self.enabled:
+            return
+        client, quota = self._client(request)
+        rate = count * quota / period
+        capacity = (burst or count) * quota
+        try:
+            allowed, tokens = self.store.take(f"{route}:{client}", rate, capacity, time.time())
+        except Exception as e:
+            # Admission control should not take the API down with it
+            logger.error(f"Rate limit check failed, allowing request: {str(e)}")
+            return
+        if not allowed:
+            RATE_LIMITED.inc(route=route)
+            raise HTTPException(
+                429,
+                detail=f"Rate limit exceeded: {count} per {period} seconds",
+                headers={"Retry-After": str(math.ceil((1 - tokens) / rate))}
+            )
+
+    def limit(self, spec: str, burst: Optional[int] = None) -> Callable:
+        """Decorator for endpoints that take a `request: Request` argument"""
+        count, period = parse_limit(spec)
+
+        def decorator(endpoint: Callable) -> Callable:
+            route = endpoint.__name__
+
+            @wraps(endpoint)
+            async def wrapper(*args, **kwargs):
+                request = kwargs.get("request")
+                if request is None:
+                    request = next(a for a in args if isinstance(a, Request))
+                if self.enabled:
+                    # The SQLite and Redis stores block on I/O; keep it off the event loop
+                    await asyncio.to_thread(self.check, request, route, count, period, burst)
+                return await endpoint(*args, **kwargs)
+            return wrapper
+        return decorator
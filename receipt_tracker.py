@@ -0,0 +1,218 @@
+import os
+import logging
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Dict, List, Optional, Tuple
+
+from hexbytes import HexBytes
+from web3.datastructures import AttributeDict
+from web3.exceptions import TimeExhausted, TransactionNotFound
+
+from metrics import RPC_REQUESTS, RPC_SECONDS
+
+logger = logging.getLogger("ReceiptTracker")
+
+# Receipt fields returned as hex quantities by the node
+RECEIPT_INT_FIELDS = ("blockNumber", "gasUsed", "cumulativeGasUsed", "effectiveGasPrice", "status", "transactionIndex", "type")
+
+class TransactionDropped(Exception):
+    """The transaction left the mempool or its nonce was used by another transaction"""
+
+class _Pending:
+    def __init__(self, tx_hash: str, first_block: int):
+        self.tx_hash = tx_hash
+        self.first_block = first_block
+        self.future: Future = Future()
+        self.sender: Optional[str] = None
+        self.nonce: Optional[int] = None
+        self.suspect = 0
+        self.waiters = 0
+
+def _quantity(value) -> int:
+    return int(value, 16) if isinstance(value, str) else int(value)
+
+def _format_receipt(raw: Dict[str, Any]) -> AttributeDict:
+    receipt = dict(raw)
+    for field in RECEIPT_INT_FIELDS:
+        if receipt.get(field) is not None:
+            receipt[field] = _quantity(receipt[field])
+    for field in ("transactionHash", "blockHash"):
+        if receipt.get(field):
+            receipt[field] = HexBytes(receipt[field])
+    return AttributeDict(receipt)
+
+def request_all(w3, requests: List[Tuple[str, list]]) -> List[Any]:
+    """
+    Run raw JSON-RPC calls as one batch and return their results in order (None when missing).
+    Results are as the node sent them (hex quantities) when batched, formatted by web3 otherwise.
+    """
+    if hasattr(w3.provider, "make_batch_request"):
+        # Straight to the provider, so the web3 middleware does not see it; count here
+        for method, _ in requests:
+            RPC_REQUESTS.inc(method=method)
+        with RPC_SECONDS.time(method="batch"):
+            responses = w3.provider.make_batch_request(requests)
+        if isinstance(responses, dict):
+            raise RuntimeError(responses.get("error") or "Batch request rejected")
+        return [r.get("result") for r in responses]
+
+    # Providers without JSON-RPC batching (e.g. in-process test chains) get one call each
+    results = []
+    for method, params in requests:
+        try:
+            results.append(w3.manager.request_blocking(method, params))
+        except TransactionNotFound:
+            results.append(None)
+    return results
+
+class ReceiptTracker:
+    """
+    One receipt poller for every outstanding transaction.
+    A background thread watches the block number and, once per new block,
+    fetches the receipts of all tracked transactions in one JSON-RPC batch.
+    Transactions still unmined after `drop_after_blocks` blocks are checked in
+    the same batch: if the node no longer knows them, or the sender's nonce has
+    been used by another transaction, waiters get TransactionDropped.
+    """
+
+    def __init__(self, w3, poll_interval: float = 2.0, drop_after_blocks: int = 3):
+        self.w3 = w3
+        self.poll_interval = poll_interval
+        self.drop_after_blocks = drop_after_blocks
+        self._pending: Dict[str, _Pending] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_block: Optional[int] = None
+
+    @classmethod
+    def from_env(cls, w3) -> "ReceiptTracker":
+        return cls(
+            w3,
+            poll_interval=float(os.getenv("RECEIPT_POLL_INTERVAL", "2")),
+            drop_after_blocks=int(os.getenv("RECEIPT_DROP_AFTER_BLOCKS", "3")),
+        )
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="receipt-tracker", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def track(self, tx_hash: bytes) -> Future:
+        """Future resolving to the receipt, or failing with TransactionDropped"""
+        key = HexBytes(tx_hash).to_0x_hex()
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = _Pending(key, self._last_block or 0)
+            pending.waiters += 1
+        self.start()
+        self._wake.set()
+        return pending.future
+
+    def wait(self, tx_hash: bytes, timeout: float = 300):
+        """Block until the transaction's receipt arrives; raises TimeExhausted or TransactionDropped"""
+        future = self.track(tx_hash)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            raise TimeExhausted(f"Transaction {HexBytes(tx_hash).to_0x_hex()} is not in the chain after {timeout} seconds")
+        finally:
+            self._untrack(HexBytes(tx_hash).to_0x_hex())
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _untrack(self, key: str):
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                return
+            pending.waiters -= 1
+            if pending.waiters <= 0:
+                del self._pending[key]
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._lock:
+                idle = not self._pending
+            if idle:
+                # No RPC traffic at all while nothing is outstanding
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            try:
+                block = self.w3.eth.block_number
+                if self._last_block is None or block > self._last_block:
+                    self._last_block = block
+                    self._poll(block)
+            except Exception as e:
+                logger.warning(f"Receipt poll failed: {str(e)}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _poll(self, block: int):
+        with self._lock:
+            pending = [p for p in self._pending.values() if not p.future.done()]
+        if not pending:
+            return
+        for p in pending:
+            if not p.first_block:
+                p.first_block = block
+
+        stale = [p for p in pending if block - p.first_block >= self.drop_after_blocks]
+        senders = sorted({p.sender for p in stale if p.sender})
+
+        requests = [("eth_getTransactionReceipt", [p.tx_hash]) for p in pending]
+        requests += [("eth_getTransactionByHash", [p.tx_hash]) for p in stale]
+        requests += [("eth_getTransactionCount", [s, "latest"]) for s in senders]
+        results = self._request_all(requests)
+
+        receipts = results[:len(pending)]
+        transactions = results[len(pending):len(pending) + len(stale)]
+        mined_nonces = {
+            s: _quantity(n) for s, n in zip(senders, results[len(pending) + len(stale):]) if n is not None
+        }
+
+        resolved = 0
+        for p, receipt in zip(pending, receipts):
+            if receipt:
+                p.future.set_result(_format_receipt(receipt))
+                resolved += 1
+
+        for p, tx in zip(stale, transactions):
+            if p.future.done():
+                continue
+            if tx:
+                p.sender = tx["from"]
+                p.nonce = _quantity(tx["nonce"])
+            if tx and tx.get("blockNumber"):
+                p.suspect = 0  # mined after the receipt lookup; picked up next block
+            elif not tx:
+                p.suspect += 1
+            elif p.sender in mined_nonces and mined_nonces[p.sender] > p.nonce:
+                p.suspect += 1
+            else:
+                p.suspect = 0
+
+            # Two consecutive blocks, so a tx mined between the lookups is not misreported
+            if p.suspect >= 2:
+                reason = "replaced" if tx else "dropped"
+                logger.warning(f"Transaction {p.tx_hash} {reason} before being mined")
+                p.future.set_exception(TransactionDropped(f"Transaction {p.tx_hash} was {reason}"))
+
+        logger.info(f"Block {block}: {resolved}/{len(pending)} receipts in one batch ({len(requests)} calls)")
+
+    def _request_all(self, requests: List[Tuple[str, list]]) -> List[Any]:
+        return request_all(self.w3, requests)
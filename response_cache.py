@@ -0,0 +1,149 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import text
+
+from database import get_db
+from blob_store import blob_store, body_digest
+
+logger = logging.getLogger("ResponseCache")
+
+CacheKey = Tuple[str, str, Optional[float]]
+
+class ResponseCache:
+    """
+    In-memory LRU with TTL in front of the prompts table.
+    A miss in memory falls back to the newest stored proof for the same
+    (prompt digest, model, temperature), so previously generated proofs are reused
+    across restarts and workers without another model call or anchor. Rows
+    written before the blob store, which keep the prompt inline, are matched on
+    the prompt text until `blob_store.py migrate` gives them a digest.
+    """
+
+    def __init__(self, enabled: bool = False, max_entries: int = 1024, ttl: float = 3600.0):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        return cls(
+            enabled=os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() in ("1", "true", "yes"),
+            max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024")),
+            ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+        )
+
+    def ensure_index(self):
+        """Index for the table lookup; only built when the cache is switched on"""
+        with get_db() as db:
+            # Prompts are matched by digest. The text index is kept only for legacy inline rows, so it
+            # no longer duplicates every body and shrinks as migration moves them into the blob store
+            db.execute(text("DROP INDEX IF EXISTS idx_prompt_cache"))
+            db.execute(text("CREATE INDEX IF NOT EXISTS idx_prompt_ref_cache ON prompts(prompt_ref, model, temperature)"))
+            db.execute(text(
+                "CREATE INDEX IF NOT EXISTS idx_prompt_inline_cache ON prompts(prompt, model, temperature) WHERE prompt_ref IS NULL"
+            ))
+            db.commit()
+
+    def applies(self, temperature: Optional[float], override: Optional[bool] = None) -> bool:
+        """Only deterministic prompts are cached unless the request explicitly opts in or out"""
+        if not self.enabled:
+            return False
+        if override is not None:
+            return override
+        return temperature == 0
+
+    def get(self, prompt: str, model: str, temperature: Optional[float]) -> Optional[Dict[str, Any]]:
+        key = (prompt, model, temperature)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                expires_at, entry = cached
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                else:
+                    del self._entries[key]
+                    self.expirations += 1
+                    entry = None
+            else:
+                entry = None
+
+        if entry is not None:
+            if not entry["blockchain_tx"]:
+                # Anchoring finishes after the entry was cached; pick up the tx hash once it exists
+                entry = self._load(id=entry["id"]) or entry
+                self.put(key, entry)
+            return entry
+
+        entry = self._load(prompt_ref=body_digest(prompt), model=model, temperature=temperature)
+        if entry is None:
+            # Every row with a digest is newer than the inline ones, so these are only checked on a miss
+            entry = self._load(prompt=prompt, model=model, temperature=temperature)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self.put(key, entry)
+        return entry
+
+    def put(self, key: CacheKey, entry: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _load(self, id: Optional[int] = None, **lookup) -> Optional[Dict[str, Any]]:
+        if id is not None:
+            query, params = "SELECT id, response, response_ref, local_hash, timestamp, blockchain_tx FROM prompts WHERE id = :id", {"id": id}
+        else:
+            match = "prompt_ref = :prompt_ref" if "prompt_ref" in lookup else "prompt_ref IS NULL AND prompt = :prompt"
+            query = f"""
+                SELECT id, response, response_ref, local_hash, timestamp, blockchain_tx FROM prompts
+                WHERE {match} AND model = :model AND temperature IS :temperature
+                ORDER BY id DESC LIMIT 1
+            """
+            params = lookup
+        try:
+            with get_db() as db:
+                row = db.execute(text(query), params).fetchone()
+                response = blob_store.get(db, row.response_ref) if row and row.response_ref else None
+        except Exception as e:
+            logger.error(f"Cache lookup failed: {str(e)}")
+            return None
+        if not row:
+            return None
+        return {
+            "id": row.id,
+            "response": response if row.response_ref else row.response,
+            "local_hash": row.local_hash,
+            "timestamp": row.timestamp,
+            "blockchain_tx": row.blockchain_tx,
+        }
@@ -0,0 +1,213 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from web3.providers import HTTPProvider, JSONBaseProvider
+
+from metrics import RPC_ENDPOINT_ERRORS, RPC_HEDGED
+
+logger = logging.getLogger("RpcPool")
+
+# Only ever sent to the pinned primary, so one node sees every write and the pending nonce it implies
+WRITE_METHODS = {"eth_sendRawTransaction", "eth_sendTransaction"}
+
+# JSON-RPC errors that mean "this endpoint is throttling us", not "the request is invalid"
+RATE_LIMIT_CODES = {-32005, 429}
+
+# Consecutive failures before an endpoint is taken out of rotation, and the longest it stays out
+FAILURE_THRESHOLD = 3
+MAX_COOLDOWN = 60.0
+
+class RateLimited(Exception):
+    """The endpoint answered with a rate-limit error"""
+
+def _pinned(method: str, params: Any) -> bool:
+    return method in WRITE_METHODS or (method == "eth_getTransactionCount" and bool(params) and params[-1] == "pending")
+
+def _check_rate_limit(response: Any):
+    error = response.get("error") if isinstance(response, dict) else None
+    if isinstance(error, dict) and (error.get("code") in RATE_LIMIT_CODES or "rate limit" in str(error.get("message", "")).lower()):
+        raise RateLimited(error.get("message") or "rate limited")
+
+class Endpoint:
+    """One RPC URL with its own keep-alive session and running health statistics"""
+
+    def __init__(self, url: str, timeout: float, pool_size: int, retry: bool = False):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        provider_kwargs = {} if retry else {
+            # With a second endpoint to fail over to, retrying the same URL only adds latency
+            'exception_retry_configuration': None
+        }
+        self.provider = HTTPProvider(
+            url,
+            request_kwargs={'timeout': timeout},
+            session=session,
+            # Serve eth_chainId and other static lookups from the provider cache
+            cache_allowed_requests=True,
+            **provider_kwargs
+        )
+        # Host only: provider URLs usually carry an API key in the path
+        parsed = urlparse(url)
+        self.name = f"{parsed.hostname}:{parsed.port}" if parsed.port else (parsed.hostname or "rpc")
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.failures = 0
+        self.down_until = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, ok: bool):
+        with self._lock:
+            # Exponentially weighted, so a provider that degrades is noticed within a few calls
+            if ok:
+                self.latency = seconds if self.latency is None else 0.8 * self.latency + 0.2 * seconds
+                self.failures = 0
+            else:
+                self.failures += 1
+                if self.failures >= FAILURE_THRESHOLD:
+                    self.down_until = time.monotonic() + min(2 ** (self.failures - FAILURE_THRESHOLD) * 5, MAX_COOLDOWN)
+            self.error_rate = 0.8 * self.error_rate + (0.0 if ok else 0.2)
+
+    def available(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def score(self) -> float:
+        """Expected cost of a call here; lower is better. Unmeasured endpoints get a neutral 200 ms"""
+        latency = self.latency if self.latency is not None else 0.2
+        return latency * (1 + 4 * self.error_rate)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "endpoint": self.name,
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "up": self.available()
+        }
+
+class RpcPoolProvider(JSONBaseProvider):
+    """
+    Web3 provider over several RPC endpoints.
+    Reads go to the healthiest endpoint (lowest latency, weighted by recent
+    errors) and are hedged: if no answer arrives within `hedge_after` seconds
+    the same request goes to the next-best endpoint and the first success wins.
+    Writes and pending-nonce reads go to a pinned primary, which only moves
+    when it is taken out of rotation after repeated failures. Transport errors
+    and rate-limit responses count against an endpoint; ordinary JSON-RPC
+    errors (reverts, bad nonces) are returned as-is.
+    """
+
+    def __init__(self, urls: Sequence[str], timeout: float = 30, hedge_after: float = 0.5, pool_size: int = 20):
+        super().__init__()
+        if not urls:
+            raise ValueError("At least one RPC URL is required")
+        self.endpoints = [Endpoint(url, timeout, pool_size, retry=len(urls) == 1) for url in urls]
+        self.hedge_after = hedge_after
+        self._primary = self.endpoints[0]
+        self._primary_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="rpc-pool")
+
+    @classmethod
+    def from_env(cls) -> "RpcPoolProvider":
+        urls = os.getenv('WEB3_PROVIDER_URLS') or os.getenv('WEB3_PROVIDER_URL', '')
+        return cls(
+            [u.strip() for u in urls.split(',') if u.strip()],
+            timeout=float(os.getenv('WEB3_REQUEST_TIMEOUT', '30')),
+            hedge_after=float(os.getenv('RPC_HEDGE_AFTER', '0.5')),
+            pool_size=int(os.getenv('WEB3_HTTP_POOL_SIZE', '20')),
+        )
+
+    def __str__(self) -> str:
+        return f"RPC pool ({', '.join(e.name for e in self.endpoints)})"
+
+    def make_request(self, method, params):
+        call = lambda endpoint: endpoint.provider.make_request(method, params)
+        if _pinned(method, params):
+            return self._call_primary(call)
+        return self._call_hedged(call)
+
+    def make_batch_request(self, batch_requests):
+        call = lambda endpoint: endpoint.provider.make_batch_request(batch_requests)
+        if any(_pinned(method, params) for method, params in batch_requests):
+            return self._call_primary(call)
+        return self._call_hedged(call)
+
+    def endpoint_stats(self) -> List[Dict[str, Any]]:
+        return [dict(e.stats(), primary=e is self._primary) for e in self.endpoints]
+
+    def _ranked(self) -> List[Endpoint]:
+        up = sorted((e for e in self.endpoints if e.available()), key=Endpoint.score)
+        # With everything out of rotation, still try the least recently failed rather than nothing
+        return up or sorted(self.endpoints, key=lambda e: e.down_until)
+
+    def _timed(self, endpoint: Endpoint, call: Callable[[Endpoint], Any]) -> Any:
+        started = time.perf_counter()
+        try:
+            response = call(endpoint)
+            _check_rate_limit(response)
+        except Exception:
+            endpoint.record(time.perf_counter() - started, ok=False)
+            RPC_ENDPOINT_ERRORS.inc(endpoint=endpoint.name)
+            raise
+        endpoint.record(time.perf_counter() - started, ok=True)
+        return response
+
+    def _call_primary(self, call: Callable[[Endpoint], Any]) -> Any:
+        with self._primary_lock:
+            if not self._primary.available():
+                standby = self._ranked()[0]
+                if standby is not self._primary:
+                    logger.warning(f"⚠️ RPC primary {self._primary.name} is failing, pinning writes to {standby.name}")
+                    self._primary = standby
+            primary = self._primary
+
+        try:
+            return self._timed(primary, call)
+        except (requests.exceptions.ConnectionError, RateLimited) as e:
+            # The node never took the request, so resending elsewhere is safe. Read timeouts
+            # are not caught here: the transaction may already be in flight.
+            last_error: Exception = e
+
+        for endpoint in self._ranked():
+            if endpoint is primary:
+                continue
+            try:
+                return self._timed(endpoint, call)
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+    def _call_hedged(self, call: Callable[[Endpoint], Any]) -> Any:
+        ranked = self._ranked()
+        if len(ranked) == 1:
+            return self._timed(ranked[0], call)
+
+        futures: Dict[Future, str] = {self._executor.submit(self._timed, ranked[0], call): "primary"}
+        done, _ = wait(futures, timeout=self.hedge_after)
+        remaining = list(ranked[1:])
+        if not done:
+            futures[self._executor.submit(self._timed, remaining.pop(0), call)] = "hedge"
+
+        pending = set(futures)
+        last_error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if len(futures) > 1:
+                        RPC_HEDGED.inc(winner=futures[future])
+                    return future.result()
+                last_error = future.exception()
+            if not pending and remaining:
+                # Every request sent so far failed; move on to the next endpoint
+                future = self._executor.submit(self._timed, remaining.pop(0), call)
+                futures[future] = "failover"
+                pending.add(future)
+        raise last_error
@@ -0,0 +1,133 @@
+import os
+import sys
+import json
+import glob
+import gzip
+import shutil
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Optional
+
+class JsonlLogWriter:
+    """
+    Append-only JSON Lines log with size/age based rotation.
+    Each entry is one line written with a single append, so logging cost does
+    not grow with the log and a crash can at worst leave a torn last line
+    (which the reader skips). Full segments are renamed to
+    `<name>-<UTC timestamp>.jsonl` and, optionally, gzipped.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 10 * 1024 * 1024, max_age: Optional[float] = 86400, compress: bool = True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compress = compress
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        self._opened_at = 0.0
+
+    @classmethod
+    def from_env(cls, path: str) -> "JsonlLogWriter":
+        max_age = float(os.getenv("LOG_MAX_AGE", "86400"))
+        return cls(
+            path,
+            max_bytes=int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+            max_age=max_age if max_age > 0 else None,
+            compress=os.getenv("LOG_COMPRESS", "true").lower() in ("1", "true", "yes"),
+        )
+
+    def write(self, entry: Dict[str, Any]):
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            if self._file is None:
+                self._open()
+            elif self._should_rotate(len(line)):
+                self._rotate()
+            self._file.write(line)
+            self._file.flush()
+            self._size += len(line)
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+        self._opened_at = _first_entry_time(self.path) or datetime.now(timezone.utc).timestamp()
+        if self._should_rotate(0):
+            self._rotate()
+
+    def _should_rotate(self, incoming: int) -> bool:
+        if self._size == 0:
+            return False
+        if self._size + incoming > self.max_bytes:
+            return True
+        return self.max_age is not None and datetime.now(timezone.utc).timestamp() - self._opened_at > self.max_age
+
+    def _rotate(self):
+        self._file.close()
+        stem, ext = os.path.splitext(self.path)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        segment = f"{stem}-{stamp}{ext}"
+        os.replace(self.path, segment)
+        if self.compress:
+            with open(segment, "rb") as src, gzip.open(segment + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(segment)
+        self._file = open(self.path, "ab")
+        self._size = 0
+        self._opened_at = datetime.now(timezone.utc).timestamp()
+
+def _first_entry_time(path: str) -> Optional[float]:
+    try:
+        with open(path, "rb") as f:
+            first = f.readline()
+        return datetime.fromisoformat(json.loads(first)["timestamp"]).timestamp()
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def log_segments(path: str):
+    """Rotated segments oldest first, then the active file"""
+    stem, ext = os.path.splitext(path)
+    rotated = sorted(glob.glob(f"{glob.escape(stem)}-*{ext}") + glob.glob(f"{glob.escape(stem)}-*{ext}.gz"))
+    return rotated + ([path] if os.path.exists(path) else [])
+
+def iter_log_entries(path: str) -> Iterator[Dict[str, Any]]:
+    """Lazily yield every entry across rotated and active segments, one line at a time"""
+    for segment in log_segments(path):
+        opener = gzip.open if segment.endswith(".gz") else open
+        with opener(segment, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn line from an interrupted write
+                    continue
+
+def convert_json_log(json_path: str, writer: JsonlLogWriter) -> int:
+    """Copy a legacy JSON-array log into a JSONL log; the original is left untouched"""
+    with open(json_path) as f:
+        entries = json.load(f)
+    for entry in entries:
+        writer.write(entry)
+    return len(entries)
+
+if __name__ == "__main__":
+    # python scripts/jsonl_log.py convert logs/logs.json logs/logs.jsonl
+    # python scripts/jsonl_log.py cat logs/logs.jsonl
+    if len(sys.argv) == 4 and sys.argv[1] == "convert":
+        log_writer = JsonlLogWriter.from_env(sys.argv[3])
+        count = convert_json_log(sys.argv[2], log_writer)
+        log_writer.close()
+        print(f"Converted {count} entries to {sys.argv[3]}")
+    elif len(sys.argv) == 3 and sys.argv[1] == "cat":
+        for log_entry in iter_log_entries(sys.argv[2]):
+            print(json.dumps(log_entry, ensure_ascii=False))
+    else:
+        print("Usage: jsonl_log.py convert <logs.json> <logs.jsonl> | cat <logs.jsonl>")
+        sys.exit(1)
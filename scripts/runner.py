@@ -1,9 +1,10 @@
 import os
-import json
 from dotenv import load_dotenv
 from datetime import datetime, timezone
 from openai import OpenAI
 
+from scripts.jsonl_log import JsonlLogWriter, convert_json_log, log_segments
+
 # Load your OpenAI API key from .env
 load_dotenv()
 if not os.getenv("OPENAI_API_KEY"):
@@ -11,27 +12,27 @@ if not os.getenv("OPENAI_API_KEY"):
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-LOG_FILE = "logs/logs.json"
+LOG_FILE = "logs/logs.jsonl"
+LEGACY_LOG_FILE = "logs/logs.json"
+
+# Append-only, so each entry costs the same however large the log has grown
+log_writer = JsonlLogWriter.from_env(LOG_FILE)
+
+def migrate_legacy_log():
+    # Copied once, into a JSONL log that does not exist yet; the legacy file itself is never modified
+    if os.path.exists(LEGACY_LOG_FILE) and not log_segments(LOG_FILE):
+        count = convert_json_log(LEGACY_LOG_FILE, log_writer)
+        print(f"Migrated {count} entries from {LEGACY_LOG_FILE} to {LOG_FILE}")
 
 def log_prompt_response(prompt, response):
     try:
-        os.makedirs("logs", exist_ok=True)
         log_data = {
             "timestamp": datetime.now(timezone.utc).isoformat(),
             "prompt": prompt,
             "response": response
         }
 
-        if os.path.exists(LOG_FILE):
-            with open(LOG_FILE, "r") as f:
-                logs = json.load(f)
-        else:
-            logs = []
-
-        logs.append(log_data)
-
-        with open(LOG_FILE, "w") as f:
-            json.dump(logs, f, indent=2)
+        log_writer.write(log_data)
 
         print(f"Logged prompt-response pair at {log_data['timestamp']}")
     except Exception as e:
@@ -52,6 +53,7 @@ def run_prompt(prompt):
 
 if __name__ == "__main__":
     try:
+        migrate_legacy_log()
         user_input = input("Enter your prompt:\n> ")
         run_prompt(user_input)
     except KeyboardInterrupt:
@@ -0,0 +1,310 @@
+import os
+import re
+import sys
+import json
+import time
+import base64
+import logging
+import argparse
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from database import get_db
+from blob_store import blob_store
+from storage_writer import storage_writer
+
+logger = logging.getLogger("SearchIndex")
+
+# bm25 column weights: a match in the prompt counts for more than one in the response
+PROMPT_WEIGHT = 2.0
+RESPONSE_WEIGHT = 1.0
+
+SEARCH_FIELDS = ("all", "prompt", "response")
+SEARCH_MAX_LIMIT = 100
+
+# Characters of context on each side of the first match in a snippet
+SNIPPET_CONTEXT = 80
+
+# Runs in the same transaction as INSERT_PROMPT. The write path does not know the new row's id,
+# but (local_hash, timestamp) identifies it; NOT EXISTS keeps a repeated unit from indexing twice
+INDEX_PROOF = text("""
+    INSERT INTO proof_search (rowid, prompt, response)
+    SELECT p.id, :prompt, :response FROM prompts p
+    WHERE p.local_hash = :h AND p.timestamp = :t
+      AND NOT EXISTS (SELECT 1 FROM proof_search WHERE rowid = p.id)
+""")
+
+BACKFILL_ROW = text("""
+    INSERT INTO proof_search (rowid, prompt, response)
+    SELECT :id, :prompt, :response
+    WHERE NOT EXISTS (SELECT 1 FROM proof_search WHERE rowid = :id)
+""")
+
+CHECKPOINT = text("UPDATE search_index_state SET next_id = :n, updated_at = :ts WHERE id = 1")
+
+SEARCH_PAGE = """
+    SELECT p.id, p.local_hash, p.timestamp, p.model, p.blockchain_tx, p.merkle_root,
+           p.prompt, p.response, p.prompt_ref, p.response_ref, {score} AS score
+    FROM proof_search JOIN prompts p ON p.id = proof_search.rowid
+    WHERE proof_search MATCH :q {filters}
+    ORDER BY {order}
+    LIMIT :limit
+"""
+
+def index_entry(prompt: str, response: str, local_hash: str, timestamp: str) -> Dict[str, Any]:
+    """INDEX_PROOF parameters for a proof written in the same transaction"""
+    return {"prompt": prompt, "response": response, "h": local_hash, "t": timestamp}
+
+def parse_query(query: str) -> Tuple[str, List[Tuple[str, bool]]]:
+    """
+    Turn free text into an FTS5 query plus the terms to highlight.
+    Words are matched as-is (`word*` for a prefix) and "quoted text" as a phrase;
+    everything else is punctuation, so user input can never be an FTS5 syntax error.
+    """
+    parts, terms = [], []
+    for phrase, word, prefix in re.findall(r'"([^"]*)"|(\w+)(\*?)', query):
+        if phrase:
+            words = re.findall(r"\w+", phrase)
+            if words:
+                parts.append('"' + " ".join(words) + '"')
+                terms.extend((w, False) for w in words)
+        elif word:
+            parts.append(f'"{word}"' + prefix)
+            terms.append((word, bool(prefix)))
+    return " ".join(parts), terms
+
+def snippet(body: Optional[str], terms: List[Tuple[str, bool]], mark: Tuple[str, str] = ("<mark>", "</mark>")) -> Optional[str]:
+    """Window around the first matching term, with every match in it marked; None if nothing matches"""
+    if not body or not terms:
+        return None
+    pattern = re.compile(
+        "|".join(rf"\b{re.escape(term)}\w*" if prefix else rf"\b{re.escape(term)}\b" for term, prefix in terms),
+        re.IGNORECASE
+    )
+    first = pattern.search(body)
+    if not first:
+        return None
+    start = max(first.start() - SNIPPET_CONTEXT, 0)
+    end = min(first.end() + SNIPPET_CONTEXT, len(body))
+    window = pattern.sub(lambda m: f"{mark[0]}{m.group(0)}{mark[1]}", body[start:end])
+    return ("…" if start else "") + window + ("…" if end < len(body) else "")
+
+def encode_cursor(row: Dict[str, Any], order: str) -> str:
+    position = {"id": row["id"]} if order == "newest" else {"id": row["id"], "score": row["score"]}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+def decode_cursor(cursor: str, order: str) -> Dict[str, Any]:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return {"id": int(position["id"])} if order == "newest" else {"id": int(position["id"]), "score": float(position["score"])}
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor")
+
+def search_proofs(query: str, model: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+                  field: str = "all", order: str = "relevance", cursor: Optional[str] = None,
+                  limit: int = 20) -> Dict[str, Any]:
+    """
+    One page of proofs matching `query`, best bm25 score first (or newest first),
+    with a marked snippet of each body. Pass back `next_cursor` for the next page.
+    """
+    if field not in SEARCH_FIELDS:
+        raise ValueError(f"field must be one of {', '.join(SEARCH_FIELDS)}")
+    if order not in ("relevance", "newest"):
+        raise ValueError("order must be relevance or newest")
+    match, terms = parse_query(query)
+    if not match:
+        raise ValueError("Query has no searchable words")
+    if field != "all":
+        match = f"{field} : ({match})"
+
+    score = f"bm25(proof_search, {PROMPT_WEIGHT}, {RESPONSE_WEIGHT})"
+    params: Dict[str, Any] = {"q": match, "model": model, "since": since, "until": until, "limit": min(max(limit, 1), SEARCH_MAX_LIMIT)}
+    filters = []
+    if model:
+        filters.append("AND p.model = :model")
+    if since:
+        filters.append("AND p.timestamp >= :since")
+    if until:
+        filters.append("AND p.timestamp < :until")
+    # Keyset pagination on the sort key; ties on score are broken by id
+    position = decode_cursor(cursor, order) if cursor else None
+    if order == "newest":
+        if position:
+            filters.append("AND p.id < :after")
+            params["after"] = position["id"]
+        order_by = "p.id DESC"
+    else:
+        if position:
+            filters.append(f"AND ({score} > :score OR ({score} = :score AND p.id > :after))")
+            params.update(score=position["score"], after=position["id"])
+        order_by = f"{score}, p.id"
+
+    with get_db() as db:
+        rows = [
+            dict(row) for row in db.execute(
+                text(SEARCH_PAGE.format(score=score, filters=" ".join(filters), order=order_by)), params
+            ).mappings()
+        ]
+        # Only the page's bodies are decompressed, for the snippets
+        blob_store.fill_bodies(db, rows)
+
+    results = []
+    for row in rows:
+        tx = row["blockchain_tx"]
+        results.append({
+            "id": row["id"],
+            "local_hash": row["local_hash"],
+            "timestamp": row["timestamp"],
+            "model": row["model"],
+            "blockchain_tx": f"0x{tx.removeprefix('0x')}" if tx else None,
+            "merkle_root": row["merkle_root"],
+            "score": row["score"],
+            "prompt_snippet": snippet(row["prompt"], terms),
+            "response_snippet": snippet(row["response"], terms),
+        })
+    return {
+        "results": results,
+        "next_cursor": encode_cursor(rows[-1], order) if len(rows) == params["limit"] else None
+    }
+
+class SearchBackfill:
+    """
+    Indexes proofs stored before the search index existed, oldest first, in
+    small batches through the shared writer so live traffic keeps priority.
+    The range to cover (everything up to the newest id when the backfill was
+    first started) and the progress through it are kept in search_index_state,
+    so a restart carries on where it stopped. Newer proofs are indexed on insert.
+    """
+
+    def __init__(self, batch_size: int = 500, pause: float = 0.05):
+        self.batch_size = batch_size
+        self.pause = pause
+        self._next_id: Optional[int] = None
+        self._end_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls) -> "SearchBackfill":
+        return cls(
+            batch_size=int(os.getenv("SEARCH_BACKFILL_BATCH", "500")),
+            pause=float(os.getenv("SEARCH_BACKFILL_PAUSE", "0.05")),
+        )
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="search-backfill", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def remaining(self) -> Optional[int]:
+        """Proof ids left to backfill; 0 once done"""
+        if self._next_id is None or self._end_id is None:
+            return None
+        return max(self._end_id - self._next_id, 0)
+
+    def run_until_done(self):
+        self._load_state()
+        while self.remaining():
+            self._step()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self._next_id is None:
+                    self._load_state()
+                if not self.remaining():
+                    logger.info("🔎 Search index backfill complete")
+                    return
+                self._step()
+                self._stop.wait(self.pause)
+            except Exception as e:
+                logger.warning(f"Search backfill step failed: {str(e)}")
+                self._stop.wait(5)
+
+    def _load_state(self):
+        with get_db() as db:
+            state = db.execute(text("SELECT next_id, end_id FROM search_index_state WHERE id = 1")).fetchone()
+            if state is None:
+                end_id = db.execute(text("SELECT COALESCE(MAX(id), 0) FROM prompts")).scalar()
+        if state is None:
+            storage_writer.write([(
+                text("INSERT OR IGNORE INTO search_index_state (id, next_id, end_id, updated_at) VALUES (1, 0, :end, :ts)"),
+                {"end": end_id, "ts": datetime.utcnow().isoformat()}
+            )])
+            self._next_id, self._end_id = 0, end_id
+        else:
+            self._next_id, self._end_id = state.next_id, state.end_id
+        if self.remaining():
+            logger.info(f"🔎 Backfilling search index from proof id {self._next_id} to {self._end_id}")
+
+    def _step(self):
+        with get_db() as db:
+            rows = [
+                dict(row) for row in db.execute(
+                    text("""
+                        SELECT id, prompt, response, prompt_ref, response_ref FROM prompts
+                        WHERE id > :after AND id <= :end ORDER BY id LIMIT :n
+                    """),
+                    {"after": self._next_id, "end": self._end_id, "n": self.batch_size}
+                ).mappings()
+            ]
+            blob_store.fill_bodies(db, rows)
+        last_id = rows[-1]["id"] if rows else self._end_id
+        ops = [
+            (BACKFILL_ROW, {"id": row["id"], "prompt": row["prompt"] or "", "response": row["response"] or ""})
+            for row in rows
+        ]
+        ops.append((CHECKPOINT, {"n": last_id, "ts": datetime.utcnow().isoformat()}))
+        storage_writer.write(ops)
+        self._next_id = last_id
+
+def optimize_index():
+    """Merge the index's b-trees into one; worth running after a large backfill"""
+    with get_db() as db:
+        db.execute(text("INSERT INTO proof_search (proof_search) VALUES ('optimize')"))
+        db.commit()
+
+if __name__ == "__main__":
+    # python search_index.py backfill | optimize | search "merkle proof" --model gpt-4o
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)s | %(name)s | %(message)s')
+    parser = argparse.ArgumentParser(description="Maintain and query the proof search index")
+    commands = parser.add_subparsers(dest="command", required=True)
+    backfill = commands.add_parser("backfill", help="Index proofs stored before the search index existed")
+    backfill.add_argument("--batch-size", type=int, default=500)
+    commands.add_parser("optimize", help="Merge index segments after a large backfill")
+    search = commands.add_parser("search", help="Run a query against the index")
+    search.add_argument("query")
+    search.add_argument("--model")
+    search.add_argument("--since")
+    search.add_argument("--until")
+    search.add_argument("--field", choices=SEARCH_FIELDS, default="all")
+    search.add_argument("--order", choices=("relevance", "newest"), default="relevance")
+    search.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    from database import init_db
+    init_db()
+    if args.command == "backfill":
+        started = time.monotonic()
+        SearchBackfill(batch_size=args.batch_size).run_until_done()
+        print(f"Backfill finished in {time.monotonic() - started:.1f}s")
+    elif args.command == "optimize":
+        optimize_index()
+    else:
+        try:
+            page = search_proofs(args.query, model=args.model, since=args.since, until=args.until,
+                                 field=args.field, order=args.order, limit=args.limit)
+        except ValueError as e:
+            print(str(e), file=sys.stderr)
+            sys.exit(2)
+        print(json.dumps(page, indent=2, ensure_ascii=False))
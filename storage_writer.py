@@ -0,0 +1,128 @@
+import os
+import time
+import queue
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+from database import engine
+from metrics import DB_WRITE_BATCH, DB_WRITE_SECONDS
+
+logger = logging.getLogger("StorageWriter")
+
+# One unit of work: statements with their bound parameters, committed atomically
+WriteOps = List[Tuple[Any, Dict[str, Any]]]
+
+class StorageWriter:
+    """
+    Write-behind group commit for the hot write path.
+    Callers hand over a unit of work and wait on the returned future; a single
+    writer thread packs every unit that arrives within `flush_interval` (up to
+    `max_batch` units) into one transaction, running each statement once with
+    all of its parameter sets. Many requests share one commit and one fsync,
+    and a future only resolves after its transaction has committed.
+    """
+
+    def __init__(self, max_batch: int = 500, flush_interval: float = 0.005):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[Tuple[WriteOps, Future]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls) -> "StorageWriter":
+        return cls(
+            max_batch=int(os.getenv("STORAGE_FLUSH_MAX_BATCH", "500")),
+            flush_interval=float(os.getenv("STORAGE_FLUSH_INTERVAL", "0.005")),
+        )
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="storage-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Flush everything already submitted, then stop the writer thread"""
+        if self._thread:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, ops: WriteOps) -> Future:
+        future: Future = Future()
+        if self._thread is None:
+            # Not started (scripts, tests): commit inline
+            self._flush([(ops, future)])
+        else:
+            self._queue.put((ops, future))
+        return future
+
+    def write(self, ops: WriteOps):
+        """Blocking submit for worker threads; raises if the commit failed"""
+        self.submit(ops).result()
+
+    async def write_async(self, ops: WriteOps):
+        await asyncio.wrap_future(self.submit(ops))
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            unit = self._queue.get()
+            if unit is None:
+                break
+            batch = [unit]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                try:
+                    unit = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if unit is None:
+                    stopping = True
+                    break
+                batch.append(unit)
+            self._flush(batch)
+
+    def _flush(self, batch: List[Tuple[WriteOps, Future]]):
+        try:
+            self._commit(batch)
+            return
+        except Exception as e:
+            if len(batch) == 1:
+                logger.error(f"Write failed: {str(e)}")
+                batch[0][1].set_exception(e)
+                return
+            logger.warning(f"Group commit of {len(batch)} writes failed, retrying individually: {str(e)}")
+
+        # Isolate the bad unit so it does not fail everyone else's write
+        for unit in batch:
+            try:
+                self._commit([unit])
+            except Exception as e:
+                logger.error(f"Write failed: {str(e)}")
+                unit[1].set_exception(e)
+
+    def _commit(self, batch: List[Tuple[WriteOps, Future]]):
+        # Statements run in order of first appearance; units must not depend on each other's ordering
+        grouped: Dict[Any, List[Dict[str, Any]]] = {}
+        for ops, _ in batch:
+            for statement, params in ops:
+                grouped.setdefault(statement, []).append(params)
+
+        with DB_WRITE_SECONDS.time():
+            with engine.begin() as conn:
+                for statement, params in grouped.items():
+                    conn.execute(statement, params)
+        DB_WRITE_BATCH.observe(len(batch))
+
+        for _, future in batch:
+            future.set_result(None)
+
+# Shared by the API and the anchor worker; started and stopped with the app
+storage_writer = StorageWriter.from_env()
@@ -0,0 +1,124 @@
+import hashlib
+import unittest
+
+from merkle import (
+    build_merkle_tree, compute_merkle_root, hash_leaf, hash_node, merkle_proof, merkle_root
+)
+
+def proof_hashes(n):
+    return [hashlib.sha256(f"proof {i}".encode("utf-8")).digest() for i in range(n)]
+
+class MerkleTreeTest(unittest.TestCase):
+    def assert_round_trip(self, n):
+        hashes = proof_hashes(n)
+        levels = build_merkle_tree(hashes)
+        root = merkle_root(levels)
+        for index, proof_hash in enumerate(hashes):
+            with self.subTest(leaves=n, index=index):
+                self.assertEqual(compute_merkle_root(proof_hash, merkle_proof(levels, index)), root)
+
+    def test_single_leaf(self):
+        (h,) = proof_hashes(1)
+        levels = build_merkle_tree([h])
+        self.assertEqual(merkle_root(levels), hash_leaf(h))
+        # The root is the domain-separated leaf, never the raw proof hash
+        self.assertNotEqual(merkle_root(levels), h)
+        self.assertEqual(merkle_proof(levels, 0), [])
+        self.assertEqual(compute_merkle_root(h, []), merkle_root(levels))
+
+    def test_two_leaves(self):
+        a, b = proof_hashes(2)
+        levels = build_merkle_tree([a, b])
+        self.assertEqual(merkle_root(levels), hash_node(hash_leaf(a), hash_leaf(b)))
+        self.assertEqual(merkle_proof(levels, 0), [{"position": "right", "hash": hash_leaf(b).hex()}])
+        self.assertEqual(merkle_proof(levels, 1), [{"position": "left", "hash": hash_leaf(a).hex()}])
+        self.assert_round_trip(2)
+
+    def test_three_leaves_promotes_the_odd_leaf(self):
+        a, b, c = proof_hashes(3)
+        levels = build_merkle_tree([a, b, c])
+        self.assertEqual(
+            merkle_root(levels),
+            hash_node(hash_node(hash_leaf(a), hash_leaf(b)), hash_leaf(c))
+        )
+        # Promoted unchanged, so the last leaf has no sibling on the first level
+        self.assertEqual(len(merkle_proof(levels, 2)), 1)
+        self.assert_round_trip(3)
+
+    def test_odd_leaf_is_not_duplicated(self):
+        a, b, c = proof_hashes(3)
+        self.assertNotEqual(
+            merkle_root(build_merkle_tree([a, b, c])),
+            merkle_root(build_merkle_tree([a, b, c, c]))
+        )
+
+    def test_power_of_two_plus_one_leaves(self):
+        for n in (3, 5, 9, 17, 33):
+            self.assert_round_trip(n)
+
+    def test_interior_node_is_not_a_leaf(self):
+        levels = build_merkle_tree(proof_hashes(4))
+        # Without domain separation, the two children of a node hash as a leaf to that node,
+        # so their concatenation would verify as a proof under the same root
+        left, right = levels[0][0], levels[0][1]
+        forged = compute_merkle_root(left + right, [{"position": "right", "hash": levels[1][1].hex()}])
+        self.assertNotEqual(forged, merkle_root(levels))
+
+    def test_empty_tree_and_bad_index(self):
+        with self.assertRaises(ValueError):
+            build_merkle_tree([])
+        levels = build_merkle_tree(proof_hashes(3))
+        with self.assertRaises(IndexError):
+            merkle_proof(levels, 3)
+        with self.assertRaises(IndexError):
+            merkle_proof(levels, -1)
+
+class TamperedPathTest(unittest.TestCase):
+    def setUp(self):
+        self.hashes = proof_hashes(5)
+        self.levels = build_merkle_tree(self.hashes)
+        self.root = merkle_root(self.levels)
+        self.path = merkle_proof(self.levels, 1)
+
+    def test_valid_path(self):
+        self.assertEqual(compute_merkle_root(self.hashes[1], self.path), self.root)
+
+    def test_wrong_proof_hash(self):
+        self.assertNotEqual(compute_merkle_root(self.hashes[2], self.path), self.root)
+
+    def test_flipped_sibling_byte(self):
+        for step in range(len(self.path)):
+            with self.subTest(step=step):
+                path = [dict(s) for s in self.path]
+                sibling = bytearray.fromhex(path[step]["hash"])
+                sibling[0] ^= 1
+                path[step]["hash"] = sibling.hex()
+                self.assertNotEqual(compute_merkle_root(self.hashes[1], path), self.root)
+
+    def test_swapped_position(self):
+        for step in range(len(self.path)):
+            with self.subTest(step=step):
+                path = [dict(s) for s in self.path]
+                path[step]["position"] = "left" if path[step]["position"] == "right" else "right"
+                self.assertNotEqual(compute_merkle_root(self.hashes[1], path), self.root)
+
+    def test_truncated_or_extended_path(self):
+        self.assertNotEqual(compute_merkle_root(self.hashes[1], self.path[:-1]), self.root)
+        extra = self.path + [{"position": "right", "hash": self.root.hex()}]
+        self.assertNotEqual(compute_merkle_root(self.hashes[1], extra), self.root)
+
+    def test_path_taken_from_another_leaf(self):
+        self.assertNotEqual(compute_merkle_root(self.hashes[1], merkle_proof(self.levels, 0)), self.root)
+
+    def test_malformed_steps(self):
+        with self.assertRaises(ValueError):
+            compute_merkle_root(self.hashes[1], [{"position": "up", "hash": self.path[0]["hash"]}])
+        with self.assertRaises(ValueError):
+            compute_merkle_root(self.hashes[1], [{"position": "left", "hash": "abcd"}])
+
+    def test_0x_prefixed_siblings_are_accepted(self):
+        path = [{"position": s["position"], "hash": "0x" + s["hash"]} for s in self.path]
+        self.assertEqual(compute_merkle_root(self.hashes[1], path), self.root)
+
+if __name__ == "__main__":
+    unittest.main()